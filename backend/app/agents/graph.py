@@ -1,17 +1,22 @@
-from langgraph.graph import StateGraph, END
 from app.models.workflow import AgentState
 from app.agents.nodes import drafter_node, critic_node
+from app.agents.rules import PRE_CRITIC_PREFIX
 from app.core.logging import logger
+from app.core.metrics import timed
 
 def should_continue(state: AgentState):
     """
     Router logic: Decides whether to loop back or finish.
     """
-    critique = state.get("critique", "")
+    critique = state.get("critique") or ""
     count = state.get("revision_count", 0)
     
-    # Condition 1: Approved
-    if "APPROVE" in critique.upper():
+    # Condition 1: Approved. The critic records its parsed verdict; plain-text
+    # critiques without one fall back to the keyword (never for pre-critic feedback)
+    approved = state.get("approved")
+    if approved is None:
+        approved = not critique.startswith(PRE_CRITIC_PREFIX) and "APPROVE" in critique.upper()
+    if approved:
         logger.info("✅ Draft Approved!")
         return "end"
     
@@ -20,33 +25,69 @@ def should_continue(state: AgentState):
         logger.warning("⚠️ Max revisions reached. Stopping loop.")
         return "end"
     
-    # Condition 3: Needs revision
-    logger.info(f"🔄 Revision needed. Loop {count}/3. Feedback: {critique[:50]}...")
+    # Condition 3: Needs revision (of the flagged sections, if any were addressed)
+    sections = sorted({item["section"] for item in state.get("section_feedback") or []})
+    scope = f"sections {sections}" if sections else "full draft"
+    logger.info(f"🔄 Revision needed ({scope}). Loop {count}/3. Feedback: {critique[:50]}...")
     return "revise"
 
-# 1. Initialize Graph
-workflow = StateGraph(AgentState)
+def timed_node(name: str, node):
+    """
+    Wraps a node so each run is recorded as stage 'node_<name>'.
+    """
+    async def run(state: AgentState):
+        with timed(f"node_{name}"):
+            return await node(state)
+    run.__name__ = node.__name__
+    return run
+
+def build_workflow():
+    """
+    Builds and compiles the Draft -> Critique -> Revise graph.
+    langgraph is imported here so importing this module stays cheap.
+    """
+    from langgraph.graph import StateGraph, END
+
+    # 1. Initialize Graph
+    workflow = StateGraph(AgentState)
 
-# 2. Add Nodes
-workflow.add_node("drafter", drafter_node)
-workflow.add_node("critic", critic_node)
+    # 2. Add Nodes
+    workflow.add_node("drafter", timed_node("drafter", drafter_node))
+    workflow.add_node("critic", timed_node("critic", critic_node))
 
-# 3. Define Edges
-# Start -> Drafter
-workflow.set_entry_point("drafter")
+    # 3. Define Edges
+    # Start -> Drafter
+    workflow.set_entry_point("drafter")
 
-# Drafter -> Critic
-workflow.add_edge("drafter", "critic")
+    # Drafter -> Critic
+    workflow.add_edge("drafter", "critic")
 
-# Critic -> Conditional (Approve or Revise?)
-workflow.add_conditional_edges(
-    "critic",
-    should_continue,
-    {
-        "end": END,
-        "revise": "drafter"
-    }
-)
+    # Critic -> Conditional (Approve or Revise?)
+    workflow.add_conditional_edges(
+        "critic",
+        should_continue,
+        {
+            "end": END,
+            "revise": "drafter"
+        }
+    )
+
+    # 4. Compile
+    return workflow.compile()
+
+_workflow = None
+
+def get_workflow():
+    """
+    The compiled workflow, built once on first use.
+    """
+    global _workflow
+    if _workflow is None:
+        _workflow = build_workflow()
+    return _workflow
 
-# 4. Compile
-app = workflow.compile()
\ No newline at end of file
+def __getattr__(name: str):
+    # `from app.agents.graph import app` still works; it compiles on first access
+    if name == "app":
+        return get_workflow()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,59 +1,307 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from app.core.config import settings
+from app.core.http import get_http_client, get_async_http_client
 from app.models.workflow import AgentState
-from app.agents.prompts import DRAFTER_PROMPT, CRITIC_PROMPT
+from app.agents.prompts import (
+    CONTEXT_PROMPT, DRAFTER_PROMPT, SECTION_DRAFTER_PROMPT, CRITIC_PROMPT, ACCURACY_CRITIC_PROMPT
+)
+from app.agents.rules import check_draft, format_feedback
+from app.agents.sections import (
+    format_issues, number_sections, parse_critique, parse_rewrites, section_at, splice, split_sections
+)
+from app.services.embeddings import estimate_tokens
+from app.services.llm_cache import get_llm_cache, prompt_key
 from app.core.logging import logger
+from app.core.metrics import LLM_TOKENS
+from app.core.rate_limit import client_max_retries, get_rate_limiter
+from typing import Any, Dict, List, Optional
+import asyncio
+import time
+import weakref
 
-# Initialize LLM
-llm = ChatOpenAI(
-    api_key=settings.OPENAI_API_KEY,
-    model=settings.OPENAI_MODEL_ID,
-    temperature=0.2 # Low temperature for factual consistency
-)
+# Chat model, created on first use by get_llm() (tests replace it directly)
+llm = None
+
+def get_llm():
+    """
+    Returns the shared chat model, building it on the first call.
+    langchain_openai is imported here so importing the API stays fast.
+    """
+    global llm
+    if llm is None:
+        from langchain_openai import ChatOpenAI
+
+        llm = ChatOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            model=settings.OPENAI_MODEL_ID,
+            temperature=0.2, # Low temperature for factual consistency
+            timeout=settings.HTTP_READ_TIMEOUT,
+            base_url=settings.OPENAI_BASE_URL,
+            # 429s and transient errors are retried by the shared rate limiter
+            max_retries=client_max_retries(),
+            # Share one keep-alive connection pool with the embeddings client
+            http_client=get_http_client(),
+            http_async_client=get_async_http_client()
+        )
+    return llm
+
+class LatencyStats:
+    """
+    Running mean of LLM critic call durations.
+    Used to estimate the time saved when the pre-critic skips a call.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+critic_latency = LatencyStats()
+
+def build_messages(state: AgentState, node_prompt: str) -> List[Any]:
+    """
+    Stable prefix first (context + request, identical for every call of a
+    workflow), then the node's instructions and per-call content.
+    """
+    shared = CONTEXT_PROMPT.format(
+        context="\n".join(state.get("context", [])),
+        query=state["query"]
+    )
+    return [SystemMessage(content=shared), HumanMessage(content=node_prompt)]
+
+# Completion budget reserved per call against the tokens-per-minute limit
+# (settled with the reported usage afterwards)
+COMPLETION_TOKEN_RESERVE = 1000
+
+# Global cap on concurrent LLM calls when the rate limiter is off
+# (one semaphore per event loop; asyncio primitives are loop-bound)
+_llm_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+def llm_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _llm_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _llm_semaphores[loop] = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+    return semaphore
+
+def total_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+async def call_llm(model, messages: List[Any]):
+    """
+    One provider call, through the shared chat rate limiter (priority,
+    per-minute budgets, adaptive concurrency up to LLM_MAX_CONCURRENCY,
+    429 retries) or just the concurrency cap when it is disabled.
+    """
+    limiter = get_rate_limiter("chat")
+    if limiter is None:
+        async with llm_semaphore():
+            return await model.ainvoke(messages)
+
+    return await limiter.run(
+        lambda: model.ainvoke(messages),
+        tokens=sum(estimate_tokens(m.content) for m in messages) + COMPLETION_TOKEN_RESERVE,
+        usage=total_tokens
+    )
 
-def drafter_node(state: AgentState) -> AgentState:
+async def invoke_llm(messages: List[Any]):
     """
-    Generates or revises the technical draft.
+    llm.ainvoke() behind the persistent response cache, keyed by
+    (model, temperature, prompt hash). Hits carry llm_cache_hit metadata.
+    Calls that reach the provider go through the shared rate limiter.
+    """
+    model = get_llm()
+    cache = get_llm_cache()
+    if cache is None:
+        return await call_llm(model, messages)
+
+    key = prompt_key(
+        getattr(model, "model_name", settings.OPENAI_MODEL_ID),
+        getattr(model, "temperature", None),
+        messages
+    )
+    cached = await asyncio.to_thread(cache.get, key)
+    if cached is not None:
+        logger.info("♻️ LLM response cache hit.")
+        return AIMessage(content=cached, response_metadata={"llm_cache_hit": True})
+
+    response = await call_llm(model, messages)
+    await asyncio.to_thread(cache.set, key, response.content)
+    return response
+
+def is_cache_hit(response) -> bool:
+    return bool(getattr(response, "response_metadata", {}).get("llm_cache_hit"))
+
+def prompt_usage(node: str, messages: List[Any], response) -> Dict[str, Any]:
+    """
+    Prompt token count for one LLM call: provider-reported when available
+    (including tokens served from the prompt cache), otherwise estimated.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        details = usage.get("input_token_details") or {}
+        entry = {
+            "node": node,
+            "prompt_tokens": usage.get("input_tokens", 0),
+            "cached_tokens": details.get("cache_read", 0),
+            "completion_tokens": usage.get("output_tokens", 0),
+            "estimated": False
+        }
+    else:
+        entry = {
+            "node": node,
+            "prompt_tokens": sum(estimate_tokens(m.content) for m in messages),
+            "cached_tokens": 0,
+            "completion_tokens": estimate_tokens(response.content),
+            "estimated": True
+        }
+    entry["response_cache_hit"] = is_cache_hit(response)
+
+    # Cache hits cost no tokens
+    if not entry["response_cache_hit"]:
+        LLM_TOKENS.labels(node=node, kind="prompt").inc(entry["prompt_tokens"])
+        LLM_TOKENS.labels(node=node, kind="cached_prompt").inc(entry["cached_tokens"])
+        LLM_TOKENS.labels(node=node, kind="completion").inc(entry["completion_tokens"])
+    logger.info(f"🧾 {node} prompt: {entry['prompt_tokens']} tokens ({entry['cached_tokens']} cached).")
+    return entry
+
+async def drafter_node(state: AgentState) -> AgentState:
+    """
+    Generates the technical draft, then revises it. When the critique
+    addresses specific sections, only those are rewritten and spliced back.
     """
     logger.info("✍️ Drafter Agent is working...")
     
     # Format the prompt with current state
-    context_str = "\n".join(state.get("context", []))
     draft = state.get("draft", "")
     critique = state.get("critique", "")
+    sections = split_sections(draft) if draft else []
+    flagged = sorted({item["section"] for item in state.get("section_feedback") or []})
+
+    if settings.SECTION_REVISION_ENABLED and sections and flagged:
+        return await revise_sections(state, sections, flagged)
     
     formatted_prompt = DRAFTER_PROMPT.format(
-        context=context_str,
-        query=state["query"],
         current_draft=draft if draft else "None",
         critique=critique if critique else "None"
     )
+    messages = build_messages(state, formatted_prompt)
     
-    response = llm.invoke([HumanMessage(content=formatted_prompt)])
+    response = await invoke_llm(messages)
+    usage = prompt_usage("drafter", messages, response)
+    usage["revision_mode"] = "full"
     
     # Update state
     return {
         "draft": response.content,
-        "revision_count": state.get("revision_count", 0) + 1
+        "revision_count": state.get("revision_count", 0) + 1,
+        "prompt_tokens": state.get("prompt_tokens", []) + [usage]
     }
 
-def critic_node(state: AgentState) -> AgentState:
+async def revise_sections(state: AgentState, sections: List[str], flagged: List[int]) -> AgentState:
+    """
+    Rewrites only the flagged sections. Falls back to keeping the draft
+    unchanged for sections the reply does not cover.
+    """
+    feedback = "\n".join(
+        f"[S{item['section']}] {item['issue']}" for item in state.get("section_feedback") or []
+    )
+    formatted_prompt = SECTION_DRAFTER_PROMPT.format(
+        numbered_draft=number_sections(sections),
+        section_feedback=feedback
+    )
+    messages = build_messages(state, formatted_prompt)
+
+    response = await invoke_llm(messages)
+    rewrites = parse_rewrites(response.content, flagged)
+    if rewrites is None:
+        logger.warning("⚠️ Section revision returned no usable sections; keeping the draft.")
+        rewrites = {}
+    logger.info(f"🧩 Revised sections {sorted(rewrites)} of {len(sections)}.")
+
+    usage = prompt_usage("drafter", messages, response)
+    usage["revision_mode"] = "sections"
+    usage["sections"] = sorted(rewrites)
+    return {
+        "draft": splice(sections, rewrites),
+        "revision_count": state.get("revision_count", 0) + 1,
+        "prompt_tokens": state.get("prompt_tokens", []) + [usage]
+    }
+
+async def critic_node(state: AgentState) -> AgentState:
     """
     Reviews the draft against guidelines.
+    Mechanical rules are checked deterministically first. Their violations
+    skip the LLM for at most PRE_CRITIC_MAX_ROUNDS rounds; after that they
+    are advisory (merged into the LLM's feedback, never blocking approval),
+    so heuristic false positives cannot use up every revision before the
+    draft gets an accuracy review. Feedback is addressed to numbered
+    sections so the drafter can revise just those.
     """
     logger.info("🧐 Critic Agent is reviewing...")
     
-    context_str = "\n".join(state.get("context", []))
-    draft = state.get("draft", "")
+    draft = state.get("draft") or ""
+    sections = split_sections(draft)
+
+    prompt = CRITIC_PROMPT
+    violations = []
+    if settings.PRE_CRITIC_ENABLED:
+        # 1. Rule-based pre-critic: violations skip the LLM round trip
+        violations = check_draft(draft)
+        rule_rounds = state.get("rule_rounds", 0)
+        if violations and rule_rounds < settings.PRE_CRITIC_MAX_ROUNDS:
+            logger.info(f"📏 Pre-critic found {len(violations)} violations. Skipping LLM critique.")
+            return {
+                "critique": format_feedback(violations),
+                "approved": False,
+                "section_feedback": [
+                    {"section": section_at(draft, v.start), "issue": v.message} for v in violations
+                ],
+                "rule_rounds": rule_rounds + 1,
+                "llm_calls_saved": state.get("llm_calls_saved", 0) + 1,
+                "seconds_saved": state.get("seconds_saved", 0.0) + critic_latency.mean
+            }
+        if violations:
+            logger.info(f"📏 {len(violations)} style findings remain; passing them to the LLM critique as advisory.")
+        prompt = ACCURACY_CRITIC_PROMPT
     
-    formatted_prompt = CRITIC_PROMPT.format(
-        context=context_str,
-        draft=draft
-    )
+    # 2. LLM critique
+    formatted_prompt = prompt.format(draft=number_sections(sections))
+    messages = build_messages(state, formatted_prompt)
     
-    response = llm.invoke([HumanMessage(content=formatted_prompt)])
+    start = time.perf_counter()
+    response = await invoke_llm(messages)
+    if not is_cache_hit(response):
+        critic_latency.record(time.perf_counter() - start)
+
+    approved, issues = parse_critique(response.content, len(sections))
+    if approved:
+        critique = "APPROVE"
+    elif issues:
+        critique = format_issues(issues)
+    else:
+        # Unstructured feedback: the drafter redrafts in full
+        critique = response.content
+
+    if violations and not approved:
+        # Advisory style findings ride along with the accuracy revision
+        style_issues = [{"section": section_at(draft, v.start), "issue": v.message} for v in violations]
+        critique += "\nStyle (advisory):\n" + format_issues(style_issues)
+        if issues:
+            issues = issues + style_issues
     
     return {
-        "critique": response.content
-    }
\ No newline at end of file
+        "critique": critique,
+        "approved": approved,
+        "section_feedback": issues,
+        "prompt_tokens": state.get("prompt_tokens", []) + [prompt_usage("critic", messages, response)]
+    }
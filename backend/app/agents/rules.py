@@ -0,0 +1,142 @@
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+# Prefix of pre-critic feedback; the router never treats it as an approval,
+# even if a quoted excerpt happens to contain the word "approve".
+PRE_CRITIC_PREFIX = "STYLE CHECK FAILED"
+
+# Participles that read as adjectives in spec sheets ("is rated for 24 V")
+# or describe a state rather than an action ("the valve is closed")
+PASSIVE_ALLOWLIST = {
+    "based", "rated", "required", "located", "designed", "intended",
+    "equipped", "limited", "calibrated", "certified", "supported", "connected",
+    "closed", "sealed", "enclosed", "grounded", "earthed", "insulated", "shielded",
+    "damaged", "charged", "powered", "attached", "detached", "fixed",
+}
+
+IRREGULAR_PARTICIPLES = {
+    "built", "chosen", "done", "driven", "given", "held", "hidden", "known", "left", "made",
+    "put", "read", "run", "seen", "sent", "set", "shown", "taken", "written", "worn", "kept",
+    "found", "broken", "frozen",
+}
+
+# Most "-eed" words are not participles ("indeed", "exceed", "speed")
+EED_PARTICIPLES = {"agreed", "freed", "guaranteed", "decreed"}
+
+# A be-verb, an optional adverb, then the candidate participle
+PASSIVE_PATTERN = re.compile(
+    r"\b(?:am|is|are|was|were|be|been|being)\s+"
+    r"(?:(?:\w+ly|not|also|indeed|still|always|often|then|now)\s+)?(\w+)\b",
+    re.IGNORECASE
+)
+
+FLUFF_WORDS = (
+    "amazing", "revolutionary", "cutting-edge", "world-class", "best-in-class",
+    "game-changing", "game changer", "incredible", "unparalleled", "state-of-the-art",
+    "groundbreaking", "awesome", "unbeatable", "seamless", "seamlessly", "next-generation",
+)
+FLUFF_PATTERN = re.compile(r"\b(" + "|".join(re.escape(w) for w in FLUFF_WORDS) + r")\b", re.IGNORECASE)
+
+# Content that needs an explicit safety warning
+HAZARD_PATTERN = re.compile(
+    r"\b(mains|high voltage|electric(?:al)? shock|hazard\w*|"
+    r"flammable|explosive|corrosive|hot surface|pressuri[sz]ed)\b",
+    re.IGNORECASE
+)
+VOLTAGE_PATTERN = re.compile(r"\b(\d+(?:[.,]\d+)?)\s?V(AC|DC)?\b", re.IGNORECASE)
+# Extra-low voltage (IEC 61140: up to 50 V AC / 120 V DC) is no shock hazard,
+# so a 24 V supply does not call for a WARNING on its own
+ELV_LIMIT_AC = 50.0
+ELV_LIMIT_DC = 120.0
+WARNING_PATTERN = re.compile(r"\b(WARNING|CAUTION|DANGER)\b", re.IGNORECASE)
+
+
+@dataclass
+class RuleViolation:
+    rule: str
+    message: str
+    excerpt: str = ""
+    # Offset in the draft, used to address the violating section
+    start: int = 0
+
+
+def _excerpt(text: str, start: int, end: int, margin: int = 30) -> str:
+    return " ".join(text[max(0, start - margin):end + margin].split())
+
+
+def is_passive_participle(word: str) -> bool:
+    word = word.lower()
+    if word in PASSIVE_ALLOWLIST:
+        return False
+    if word in IRREGULAR_PARTICIPLES:
+        return True
+    if len(word) < 5 or not word.endswith("ed"):
+        return False
+    return not word.endswith("eed") or word in EED_PARTICIPLES
+
+
+def find_hazard(draft: str) -> Optional[re.Match]:
+    """
+    First mention of a hazard: hazardous terms, or a voltage above
+    extra-low voltage.
+    """
+    candidates = [HAZARD_PATTERN.search(draft)]
+    for match in VOLTAGE_PATTERN.finditer(draft):
+        value = float(match.group(1).replace(",", "."))
+        limit = ELV_LIMIT_DC if (match.group(2) or "").upper() == "DC" else ELV_LIMIT_AC
+        if value > limit:
+            candidates.append(match)
+            break
+    found = [match for match in candidates if match is not None]
+    return min(found, key=lambda match: match.start()) if found else None
+
+
+def check_draft(draft: str) -> List[RuleViolation]:
+    """
+    Deterministic checks for the mechanical criteria of the critic prompt:
+    passive voice, marketing fluff and missing safety warnings.
+    """
+    violations: List[RuleViolation] = []
+
+    for match in PASSIVE_PATTERN.finditer(draft):
+        if not is_passive_participle(match.group(1)):
+            continue
+        violations.append(RuleViolation(
+            rule="passive_voice",
+            message=f"Rewrite '{match.group(0)}' in the active voice.",
+            excerpt=_excerpt(draft, match.start(), match.end()),
+            start=match.start()
+        ))
+
+    for match in FLUFF_PATTERN.finditer(draft):
+        violations.append(RuleViolation(
+            rule="marketing_fluff",
+            message=f"Remove the marketing term '{match.group(0)}'.",
+            excerpt=_excerpt(draft, match.start(), match.end()),
+            start=match.start()
+        ))
+
+    hazard = find_hazard(draft)
+    if hazard and not WARNING_PATTERN.search(draft):
+        violations.append(RuleViolation(
+            rule="missing_safety_warning",
+            message=f"The draft mentions '{hazard.group(0)}' but has no explicit WARNING or CAUTION.",
+            excerpt=_excerpt(draft, hazard.start(), hazard.end()),
+            start=hazard.start()
+        ))
+
+    return violations
+
+
+def format_feedback(violations: List[RuleViolation]) -> str:
+    """
+    Critique text for the drafter, one numbered item per violation.
+    """
+    lines = [f"{PRE_CRITIC_PREFIX}: fix the following before the accuracy review."]
+    for i, violation in enumerate(violations, start=1):
+        line = f"{i}. [{violation.rule}] {violation.message}"
+        if violation.excerpt:
+            line += f' Context: "{violation.excerpt}"'
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,109 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Sections are blank-line separated blocks (a heading line stays with its paragraph)
+SECTION_BREAK = re.compile(r"\n[ \t]*\n\s*")
+# Marker the drafter puts before each rewritten section: "[S3]" on its own line
+SECTION_MARKER = re.compile(r"^\[S(\d+)\][ \t]*$", re.MULTILINE)
+
+
+def section_spans(draft: str) -> List[Tuple[int, int]]:
+    """
+    (start, end) offsets of every section of the draft.
+    """
+    spans = []
+    start = 0
+    for match in SECTION_BREAK.finditer(draft):
+        if draft[start:match.start()].strip():
+            spans.append((start, match.start()))
+        start = match.end()
+    if draft[start:].strip():
+        spans.append((start, len(draft.rstrip())))
+    return spans
+
+
+def split_sections(draft: str) -> List[str]:
+    return [draft[start:end].strip() for start, end in section_spans(draft)]
+
+
+def section_at(draft: str, offset: int) -> int:
+    """
+    1-based number of the section containing `offset` (the last one if past the end).
+    """
+    spans = section_spans(draft)
+    for number, (_, end) in enumerate(spans, start=1):
+        if offset < end:
+            return number
+    return max(len(spans), 1)
+
+
+def number_sections(sections: List[str]) -> str:
+    """
+    The draft as the critic and drafter see it: "[S1]\\n...\\n\\n[S2]\\n...".
+    """
+    return "\n\n".join(f"[S{number}]\n{text}" for number, text in enumerate(sections, start=1))
+
+
+def splice(sections: List[str], rewrites: Dict[int, str]) -> str:
+    """
+    Replaces sections by number; an empty rewrite removes the section.
+    """
+    revised = [rewrites.get(number, text).strip() for number, text in enumerate(sections, start=1)]
+    return "\n\n".join(text for text in revised if text)
+
+
+def parse_rewrites(response: str, flagged: List[int]) -> Optional[Dict[int, str]]:
+    """
+    Rewritten sections from the drafter's reply. Numbers that were not
+    flagged are ignored. None when the reply has no usable markers (a
+    single flagged section may be returned without its marker).
+    """
+    markers = list(SECTION_MARKER.finditer(response))
+    if not markers:
+        return {flagged[0]: response.strip()} if len(flagged) == 1 and response.strip() else None
+
+    rewrites = {}
+    for marker, following in zip(markers, markers[1:] + [None]):
+        number = int(marker.group(1))
+        end = following.start() if following else len(response)
+        if number in flagged:
+            rewrites[number] = response[marker.end():end].strip()
+    return rewrites or None
+
+
+def parse_critique(text: str, section_count: int) -> Tuple[bool, List[Dict[str, Any]]]:
+    """
+    (approved, section issues) from the critic's reply.
+    Expects {"verdict": "approve" | "revise", "issues": [{"section", "issue"}]};
+    a plain "APPROVE" or free-text feedback (no section addresses) also works.
+    """
+    start, end = text.find("{"), text.rfind("}")
+    try:
+        verdict = json.loads(text[start:end + 1]) if start != -1 and end > start else None
+    except json.JSONDecodeError:
+        verdict = None
+
+    if not isinstance(verdict, dict) or "verdict" not in verdict:
+        return "APPROVE" in text.upper(), []
+
+    issues = []
+    for item in verdict.get("issues") or []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            section = int(item.get("section"))
+        except (TypeError, ValueError):
+            continue
+        if 1 <= section <= section_count and item.get("issue"):
+            issues.append({"section": section, "issue": str(item["issue"])})
+
+    approved = str(verdict["verdict"]).lower() == "approve" and not issues
+    return approved, issues
+
+
+def format_issues(issues: List[Dict[str, Any]]) -> str:
+    """
+    Human-readable critique, one line per flagged section.
+    """
+    return "\n".join(f"S{item['section']}: {item['issue']}" for item in issues)
@@ -1,6 +1,6 @@
 import os
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Literal
+from typing import List, Literal, Optional
 
 class Settings(BaseSettings):
     """
@@ -14,14 +14,139 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "DocuForge"
     API_V1_STR: str = "/api/v1"
     ENVIRONMENT: Literal["dev", "production"] = "dev"
+    # Connect the vector store and build API clients in the background after
+    # startup (off: on the first readiness probe or request)
+    STARTUP_WARMUP: bool = True
     
     # OpenAI Settings
     OPENAI_API_KEY: str
     OPENAI_MODEL_ID: str = "gpt-4o-mini"
+    # Alternative endpoint (proxy, compatible server); None: api.openai.com
+    OPENAI_BASE_URL: Optional[str] = None
+
+    # Shared HTTP connection pool for OpenAI clients
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_READ_TIMEOUT: float = 60.0
+    HTTP_WRITE_TIMEOUT: float = 10.0
+    HTTP_POOL_TIMEOUT: float = 10.0
+    OPENAI_MAX_RETRIES: int = 2
+
+    # Shared OpenAI rate limiter: per-minute budgets per model family,
+    # priority queueing, AIMD concurrency and 429 backoff
+    OPENAI_RATE_LIMIT_ENABLED: bool = True
+    OPENAI_CHAT_RPM: int = 500
+    OPENAI_CHAT_TPM: int = 200000
+    OPENAI_EMBEDDING_RPM: int = 3000
+    OPENAI_EMBEDDING_TPM: int = 1000000
+    OPENAI_MIN_CONCURRENCY: int = 1
+    OPENAI_RATE_LIMIT_RETRIES: int = 6
+    OPENAI_BACKOFF_BASE: float = 0.5
+    OPENAI_BACKOFF_MAX: float = 20.0
+
+    # Embedding Pipeline Settings
+    EMBEDDING_BACKEND: Literal["openai", "fake"] = "openai"
+    EMBEDDING_MODEL_ID: str = "text-embedding-3-small"
+    EMBEDDING_MAX_BATCH_TOKENS: int = 50000
+    EMBEDDING_MAX_BATCH_SIZE: int = 256
+    EMBEDDING_MAX_CONCURRENCY: int = 4
+    EMBEDDING_QUERY_COALESCE_MS: float = 5.0
+
+    # Embedding Cache (SQLite, content-addressed)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = "data/embedding_cache.sqlite3"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 200000
+
+    # Ingestion: chunks embedded/upserted per rolling batch (bounds peak memory)
+    INGEST_BATCH_SIZE: int = 128
+    # Bulk ingestion: points per Qdrant upsert, upserts in flight, PDFs per group
+    INGEST_UPSERT_BATCH_SIZE: int = 512
+    INGEST_UPSERT_CONCURRENCY: int = 4
+    INGEST_BATCH_DOCUMENTS: int = 64
+
+    # PDF extraction process pool (0 = extract in a thread, no worker processes)
+    PDF_EXTRACT_WORKERS: int = 2
+    PDF_PAGES_PER_TASK: int = 8
+
+    # Per-source chunk manifest (enables incremental re-ingestion)
+    MANIFEST_PATH: str = "data/manifest.sqlite3"
+
+    # Near-duplicate chunks (MinHash LSH): skipped at ingest, referenced on the stored copy
+    DEDUP_ENABLED: bool = True
+    DEDUP_INDEX_PATH: str = "data/dedup_index.sqlite3"
+    DEDUP_THRESHOLD: float = 0.9
+
+    # Query Vector / Search Result Cache (in-process)
+    QUERY_CACHE_ENABLED: bool = True
+    QUERY_CACHE_TTL_SECONDS: float = 300.0
+    QUERY_CACHE_MAX_ENTRIES: int = 1024
+
+    # Lexical (BM25) index: identifier queries skip the embedding call
+    LEXICAL_INDEX_ENABLED: bool = True
+    LEXICAL_INDEX_PATH: str = "data/lexical_index.sqlite3"
+    LEXICAL_FASTPATH_MAX_TERMS: int = 6
+    # dense = vector search only; hybrid = BM25 + vector fused with RRF
+    SEARCH_MODE: Literal["dense", "hybrid"] = "dense"
+    HYBRID_CANDIDATES: int = 20
+    HYBRID_RRF_K: int = 60
     
+    # Background Jobs (in-process workers)
+    JOB_WORKERS: int = 2
+    JOB_MAX_RETAINED: int = 1000
+
+    # Concurrent LLM calls across all workflows (batch generation runs topics in parallel)
+    LLM_MAX_CONCURRENCY: int = 8
+    BATCH_GENERATE_MAX_TOPICS: int = 50
+
+    # Token budget for the packed context resent on every drafter/critic call
+    CONTEXT_TOKEN_BUDGET: int = 1500
+
+    # Persistent LLM response cache and semantic topic cache (cleared on KB writes)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_PATH: str = "data/llm_cache.sqlite3"
+    LLM_CACHE_MAX_ENTRIES: int = 10000
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 256
+
+    # Rule-based pre-critic (passive voice, fluff, safety warnings) before the LLM critic
+    PRE_CRITIC_ENABLED: bool = True
+    # Rounds in which rule violations alone send a draft back; afterwards they are advisory
+    PRE_CRITIC_MAX_ROUNDS: int = 1
+    # Revisions rewrite only the sections the critic flagged (off: full redrafts)
+    SECTION_REVISION_ENABLED: bool = True
+
+    # Streaming (SSE) keep-alive interval while the workflow is idle
+    SSE_HEARTBEAT_SECONDS: float = 15.0
+
+    # Vector store backend: Qdrant server, or embedded mmap index (no server)
+    VECTOR_BACKEND: Literal["qdrant", "mmap"] = "qdrant"
+    VECTOR_INDEX_PATH: str = "data/vector_index"
+    VECTOR_INDEX_QUANTIZATION: Literal["none", "int8"] = "none"
+
     # Qdrant Vector DB Settings
     QDRANT_HOST: str = "qdrant"
     QDRANT_PORT: int = 6333
+    # Local mode instead of a server: ":memory:" or a directory path
+    QDRANT_LOCATION: Optional[str] = None
+    QDRANT_COLLECTION: str = "vaisala_docs"
+    QDRANT_VECTOR_SIZE: int = 1536
+    # Keyword payload indexes created up front; other filtered fields get one on first use
+    QDRANT_PAYLOAD_INDEXES: List[str] = ["source", "type"]
+
+    # Qdrant collection tuning (applied when the collection is created)
+    QDRANT_HNSW_M: int = 16
+    QDRANT_HNSW_EF_CONSTRUCT: int = 100
+    QDRANT_ON_DISK_VECTORS: bool = False
+    QDRANT_QUANTIZATION: Literal["none", "int8"] = "none"
+    QDRANT_QUANTIZATION_ALWAYS_RAM: bool = True
+
+    # Qdrant search-time tuning
+    QDRANT_SEARCH_EF: int = 128
+    QDRANT_RESCORE: bool = True
+    QDRANT_OVERSAMPLING: float = 2.0
 
     # Configuration to read from .env file
     model_config = SettingsConfigDict(
@@ -0,0 +1,60 @@
+from typing import Optional
+
+import httpx
+
+from app.core.config import settings
+
+# One connection pool per process, shared by the chat and embeddings clients
+_sync_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    # Explicit per-phase timeouts instead of the SDK's 10-minute default
+    return httpx.Timeout(
+        connect=settings.HTTP_CONNECT_TIMEOUT,
+        read=settings.HTTP_READ_TIMEOUT,
+        write=settings.HTTP_WRITE_TIMEOUT,
+        pool=settings.HTTP_POOL_TIMEOUT
+    )
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Shared synchronous client (keep-alive pool, tuned timeouts).
+    """
+    global _sync_client
+    if _sync_client is None or _sync_client.is_closed:
+        _sync_client = httpx.Client(limits=_limits(), timeout=_timeout())
+    return _sync_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Shared asynchronous client used by the async LLM and embedding calls.
+    """
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(limits=_limits(), timeout=_timeout())
+    return _async_client
+
+
+async def close_http_clients():
+    """
+    Closes pooled connections on shutdown.
+    """
+    global _sync_client, _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    if _sync_client is not None:
+        _sync_client.close()
+        _sync_client = None
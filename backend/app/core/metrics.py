@@ -0,0 +1,117 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Buckets from 1 ms to ~2 min: covers local SQLite lookups up to long LLM calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "docuforge_stage_seconds",
+    "Time spent in each pipeline stage (split, embed, upsert, vector_search, pdf_extract, node_*).",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "docuforge_http_request_seconds",
+    "HTTP request latency by route.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "docuforge_llm_tokens_total",
+    "LLM tokens per graph node (kind: prompt, cached_prompt, completion).",
+    ["node", "kind"]
+)
+GENERATE_REVISIONS = Histogram(
+    "docuforge_generate_revisions",
+    "Drafter revisions per completed generate workflow.",
+    buckets=(1, 2, 3, 4, 5)
+)
+OPENAI_RETRIES = Counter(
+    "docuforge_openai_retries_total",
+    "OpenAI calls retried by the shared rate limiter (reason: throttled, transient).",
+    ["limiter", "reason"]
+)
+OPENAI_CONCURRENCY_LIMIT = Gauge(
+    "docuforge_openai_concurrency_limit",
+    "Current adaptive (AIMD) concurrency limit per OpenAI rate limiter.",
+    ["limiter"]
+)
+
+# Per-request stage totals, rendered as a Server-Timing header
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """
+    Records the duration of a block in the stage histogram and, inside an
+    HTTP request, in that request's Server-Timing totals.
+    Works in sync and async code (wrap only the awaited call).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage=stage).observe(seconds)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def render_metrics():
+    """
+    Prometheus text exposition: (body, content type).
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware: per-route latency histogram plus a Server-Timing header
+    listing the stages that ran before the response started.
+    (Streaming responses only report work done before the first byte.)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        status = {"code": 500}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                headers = list(message.get("headers", []))
+                header = server_timing_header(timings, time.perf_counter() - start)
+                headers.append((b"server-timing", header.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            route = scope.get("route")
+            REQUEST_SECONDS.labels(
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status["code"])
+            ).observe(time.perf_counter() - start)
@@ -0,0 +1,343 @@
+import asyncio
+import heapq
+import itertools
+import random
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+import httpx
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.core.metrics import OPENAI_CONCURRENCY_LIMIT, OPENAI_RETRIES, timed
+
+T = TypeVar("T")
+
+# Retry reasons (None: not retryable)
+THROTTLED = "throttled"
+TRANSIENT = "transient"
+
+# 429s arriving within this window count as one congestion signal: calls
+# already in flight were sent under the old limit
+DECREASE_COOLDOWN = 1.0
+
+# Embedding slots beyond the pipeline's document batches, kept for queries
+EMBEDDING_QUERY_HEADROOM = 2
+
+
+class Priority(IntEnum):
+    """
+    Waiting callers are served lowest value first.
+    """
+    INTERACTIVE = 0  # search query embeddings
+    STANDARD = 1     # single generate requests
+    BULK = 2         # ingestion, batch generation
+
+
+_priority: ContextVar[Priority] = ContextVar("openai_priority", default=Priority.STANDARD)
+
+
+@contextmanager
+def priority_scope(priority: Priority) -> Iterator[None]:
+    """
+    Sets the priority of OpenAI calls made in this context (e.g. one batch topic).
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> Priority:
+    return _priority.get()
+
+
+class TokenBucket:
+    """
+    Continuous-refill bucket holding up to one minute of budget, like the
+    provider's per-minute limits. Requests larger than the bucket wait for
+    a full bucket and take the level negative; later requests wait it out.
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Seconds until `amount` can be taken (0 if now).
+        """
+        self._refill()
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+    def adjust(self, delta: float):
+        """
+        Takes (negative) or returns (positive) budget.
+        """
+        self._refill()
+        self.level = min(self.capacity, self.level + delta)
+
+
+def classify_error(error: BaseException) -> Optional[str]:
+    """
+    THROTTLED for rate limits, TRANSIENT for timeouts, connection errors
+    and 5xx, None for errors a retry will not fix (including an exhausted quota).
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if not isinstance(status, int):
+        status = None
+
+    if status == 429:
+        return None if getattr(error, "code", None) == "insufficient_quota" else THROTTLED
+    if status in (408, 409) or (status is not None and status >= 500):
+        return TRANSIENT
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError)):
+        return TRANSIENT
+    # Only loaded once an OpenAI client has been used; never imported here
+    openai = sys.modules.get("openai")
+    if openai is not None and isinstance(error, openai.APIConnectionError):
+        return TRANSIENT
+    return None
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    Server-suggested delay in seconds (retry-after-ms or retry-after headers).
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value:
+            try:
+                return max(0.0, float(value) * scale)
+            except ValueError:
+                continue  # HTTP-date form; the API sends seconds
+    return None
+
+
+class RateLimiter:
+    """
+    Shared gate in front of one OpenAI model family (chat or embeddings).
+
+    - Requests-per-minute and tokens-per-minute token buckets.
+    - Callers wait in priority order (INTERACTIVE, STANDARD, BULK; FIFO within a class).
+    - AIMD concurrency: +1 slot per `limit` successful calls, halved on
+      a 429 (at most once per DECREASE_COOLDOWN), between min and max.
+    - 429s and transient errors are retried here with full-jitter
+      exponential backoff; a Retry-After header pauses every caller.
+
+    The SDK clients should not retry on their own (see client_max_retries).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+        max_retries: int = 6,
+        transient_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0
+    ):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(self.max_concurrency)
+        self.max_retries = max_retries
+        self.transient_retries = transient_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.in_flight = 0
+        self._waiting: List[Tuple[int, int]] = []  # heap of (priority, arrival)
+        self._wakeups: Dict[Tuple[int, int], asyncio.Future] = {}
+        self._arrivals = itertools.count()
+        self._paused_until = 0.0
+        self._last_decrease = float("-inf")
+        OPENAI_CONCURRENCY_LIMIT.labels(limiter=name).set(self.limit)
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        tokens: int = 0,
+        priority: Optional[Priority] = None,
+        usage: Optional[Callable[[T], Optional[int]]] = None
+    ) -> T:
+        """
+        Awaits `call()` once a slot and budget are free, retrying throttled
+        and transient failures. `tokens` is the estimated cost; `usage` may
+        return the actual count from the result to settle the difference.
+        Priority defaults to the context's (see priority_scope).
+        """
+        priority = current_priority() if priority is None else priority
+        retries = {THROTTLED: 0, TRANSIENT: 0}
+
+        while True:
+            with timed(f"rate_limit_wait_{self.name}"):
+                await self.acquire(tokens, priority)
+            try:
+                result = await call()
+            except BaseException as e:
+                reason = classify_error(e) if isinstance(e, Exception) else None
+                self._release(reason)
+                allowed = self.max_retries if reason == THROTTLED else self.transient_retries
+                if reason is None or retries[reason] >= allowed:
+                    raise
+
+                hint = retry_after(e) if reason == THROTTLED else None
+                if hint:
+                    # Everyone waits: more calls now would only extend the storm
+                    self._paused_until = max(self._paused_until, time.monotonic() + hint)
+                delay = self.backoff(retries[reason], hint)
+                retries[reason] += 1
+                OPENAI_RETRIES.labels(limiter=self.name, reason=reason).inc()
+                logger.warning(
+                    f"🚦 {self.name}: {reason} error ({e.__class__.__name__}), "
+                    f"retry {retries[reason]}/{allowed} in {delay:.2f}s."
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            self._release("ok")
+            if usage is not None:
+                actual = usage(result)
+                if actual is not None:
+                    self.tokens.adjust(tokens - actual)
+            return result
+
+    def backoff(self, attempt: int, hint: Optional[float] = None) -> float:
+        """
+        Full-jitter exponential delay; a server hint is a floor (plus jitter
+        so waiting callers do not return in lockstep).
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if hint is not None:
+            delay = max(delay, min(hint, self.backoff_max) + random.uniform(0, self.backoff_base))
+        return delay
+
+    async def acquire(self, tokens: int, priority: Priority):
+        ticket = (int(priority), next(self._arrivals))
+        heapq.heappush(self._waiting, ticket)
+        try:
+            while True:
+                delay = self._try_grant(ticket, tokens)
+                if delay == 0:
+                    return
+                waiter = asyncio.get_running_loop().create_future()
+                self._wakeups[ticket] = waiter
+                try:
+                    # None: until a slot frees up; otherwise until the budget refills
+                    await asyncio.wait_for(waiter, delay)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    self._wakeups.pop(ticket, None)
+        except BaseException:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._wake_head()
+            raise
+
+    def _try_grant(self, ticket: Tuple[int, int], tokens: int) -> Optional[float]:
+        """
+        0 when granted, else seconds to wait (None: wait to be woken).
+        """
+        if self._waiting[0] != ticket or self.in_flight >= int(self.limit):
+            return None
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+        if wait > 0:
+            return wait
+
+        self.requests.adjust(-1)
+        self.tokens.adjust(-tokens)
+        self.in_flight += 1
+        heapq.heappop(self._waiting)
+        # The next caller may fit as well
+        self._wake_head()
+        return 0.0
+
+    def _wake_head(self):
+        if self._waiting:
+            waiter = self._wakeups.get(self._waiting[0])
+            if waiter is not None and not waiter.done():
+                waiter.set_result(None)
+
+    def _release(self, outcome: Optional[str]):
+        self.in_flight -= 1
+        if outcome == "ok" and self.limit < self.max_concurrency:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            OPENAI_CONCURRENCY_LIMIT.labels(limiter=self.name).set(self.limit)
+        elif outcome == THROTTLED:
+            now = time.monotonic()
+            if now - self._last_decrease >= DECREASE_COOLDOWN:
+                self._last_decrease = now
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                OPENAI_CONCURRENCY_LIMIT.labels(limiter=self.name).set(self.limit)
+                logger.warning(f"🚦 {self.name}: rate limited, concurrency cut to {int(self.limit)}.")
+        self._wake_head()
+
+
+# One limiter per model family for the whole process
+_limiters: Dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(name: str) -> Optional[RateLimiter]:
+    """
+    Shared limiter for "chat" or "embeddings"; None when rate limiting is off.
+    """
+    if not settings.OPENAI_RATE_LIMIT_ENABLED:
+        return None
+    limiter = _limiters.get(name)
+    if limiter is None:
+        if name == "chat":
+            rpm, tpm = settings.OPENAI_CHAT_RPM, settings.OPENAI_CHAT_TPM
+            max_concurrency = settings.LLM_MAX_CONCURRENCY
+        else:
+            rpm, tpm = settings.OPENAI_EMBEDDING_RPM, settings.OPENAI_EMBEDDING_TPM
+            max_concurrency = settings.EMBEDDING_MAX_CONCURRENCY + EMBEDDING_QUERY_HEADROOM
+        limiter = _limiters[name] = RateLimiter(
+            name,
+            requests_per_minute=rpm,
+            tokens_per_minute=tpm,
+            max_concurrency=max_concurrency,
+            min_concurrency=settings.OPENAI_MIN_CONCURRENCY,
+            max_retries=settings.OPENAI_RATE_LIMIT_RETRIES,
+            transient_retries=settings.OPENAI_MAX_RETRIES,
+            backoff_base=settings.OPENAI_BACKOFF_BASE,
+            backoff_max=settings.OPENAI_BACKOFF_MAX
+        )
+    return limiter
+
+
+def client_max_retries() -> int:
+    """
+    Retries for the OpenAI SDK clients: none when the limiter retries,
+    otherwise nested retries multiply into 429 pile-ups.
+    """
+    return 0 if settings.OPENAI_RATE_LIMIT_ENABLED else settings.OPENAI_MAX_RETRIES
@@ -0,0 +1,78 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.logging import logger
+from app.core.metrics import timed
+
+Check = Callable[[], Awaitable[None]]
+
+
+class ReadinessTracker:
+    """
+    Warms up slow dependencies (vector store, API clients, the agent graph)
+    in the background after startup and reports readiness per component.
+    Checks that fail are retried on the next readiness probe.
+    """
+
+    def __init__(self):
+        self._checks: Dict[str, Check] = {}
+        self._status: Dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def register(self, name: str, check: Check):
+        self._checks[name] = check
+        self._status[name] = "pending"
+
+    def fail(self, name: str, error: Exception):
+        """
+        Marks a component that could not even be constructed.
+        """
+        self._status[name] = f"failed: {error}"
+
+    @property
+    def ready(self) -> bool:
+        return all(status == "ready" for status in self._status.values())
+
+    def start(self):
+        """
+        Runs every check in a background task; the server accepts traffic meanwhile.
+        """
+        self._task = asyncio.create_task(self._run_pending())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def check(self) -> Tuple[bool, Dict[str, str]]:
+        """
+        Current readiness. Once the warm-up task has finished, components
+        that are not ready are retried here.
+        """
+        if self._task is None or self._task.done():
+            await self._run_pending()
+        return self.ready, dict(self._status)
+
+    async def _run_pending(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            start = time.perf_counter()
+            pending = [name for name in self._checks if self._status[name] != "ready"]
+            for name in pending:
+                try:
+                    with timed(f"warmup_{name}"):
+                        await self._checks[name]()
+                    self._status[name] = "ready"
+                except Exception as e:
+                    logger.error(f"❌ Warm-up of '{name}' failed: {e}")
+                    self._status[name] = f"failed: {e}"
+
+            if pending and self.ready:
+                logger.info(f"✅ Ready: {', '.join(pending)} warmed up in {time.perf_counter() - start:.2f}s.")
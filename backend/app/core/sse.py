@@ -0,0 +1,38 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, Tuple
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """
+    Encodes one Server-Sent Event frame.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def sse_stream(
+    events: AsyncIterator[Tuple[str, Dict[str, Any]]],
+    heartbeat_interval: float = 15.0
+) -> AsyncIterator[str]:
+    """
+    Formats (event, data) pairs as SSE frames.
+    Emits a comment line whenever the source is idle for `heartbeat_interval`
+    seconds, so proxies don't close the connection during long LLM calls.
+    """
+    iterator = events.__aiter__()
+    pending = asyncio.ensure_future(iterator.__anext__())
+    try:
+        while True:
+            done, _ = await asyncio.wait({pending}, timeout=heartbeat_interval)
+            if not done:
+                yield ": keep-alive\n\n"
+                continue
+            try:
+                event, data = pending.result()
+            except StopAsyncIteration:
+                return
+            yield format_sse(event, data)
+            pending = asyncio.ensure_future(iterator.__anext__())
+    finally:
+        if not pending.done():
+            pending.cancel()
@@ -1,5 +1,47 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional, Dict, Any, Union
+import re
+
+FilterValue = Union[str, int, bool]
+
+# Filter keys become payload paths and SQL JSON paths, so keep them plain
+FILTER_KEY_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def normalize_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, List[FilterValue]]:
+    """
+    Validates metadata filters and returns {key: [allowed values]}.
+    A scalar matches exactly, a list matches any of its values; keys are ANDed.
+    """
+    normalized: Dict[str, List[FilterValue]] = {}
+    for key, value in (filters or {}).items():
+        if not FILTER_KEY_PATTERN.match(key):
+            raise ValueError(f"Invalid filter key '{key}'")
+        values = value if isinstance(value, list) else [value]
+        if not values:
+            raise ValueError(f"Filter '{key}' needs at least one value")
+        for item in values:
+            if not isinstance(item, (str, int, bool)):
+                raise ValueError(f"Filter '{key}' only supports string, integer or boolean values")
+        normalized[key] = values
+    return normalized
+
+
+class FilterableRequest(BaseModel):
+    """
+    Mixin for requests that can restrict retrieval by chunk metadata.
+    """
+    filters: Optional[Dict[str, Any]] = Field(
+        None,
+        description="Metadata filters, e.g. {'source': 'hmp155.pdf', 'type': ['pdf_upload', 'text']}."
+    )
+
+    @field_validator("filters")
+    @classmethod
+    def _check_filters(cls, value):
+        normalize_filters(value)
+        return value
+
 
 class IngestRequest(BaseModel):
     """
@@ -9,7 +51,13 @@ class IngestRequest(BaseModel):
     source_name: str = Field(..., description="Filename or origin of the document (e.g., 'sensor_specs_v1.pdf').")
     metadata: Optional[Dict[str, Any]] = Field(default_factory=dict, description="Arbitrary tags like version, author, date.")
 
-class SearchRequest(BaseModel):
+class BatchIngestRequest(BaseModel):
+    """
+    Schema for bulk-loading many documents in one call.
+    """
+    documents: List[IngestRequest] = Field(..., min_length=1, description="Documents to ingest; source names must be unique.")
+
+class SearchRequest(FilterableRequest):
     """
     Schema for testing semantic search.
     """
@@ -0,0 +1,30 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Literal, Optional
+from pydantic import BaseModel, Field
+
+JobStatus = Literal["queued", "running", "succeeded", "failed"]
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+class JobRecord(BaseModel):
+    """
+    State of a background job (e.g. one agent workflow run).
+    """
+    job_id: str
+    kind: str = Field(..., description="Job type, e.g. 'generate'.")
+    status: JobStatus = "queued"
+    payload: Dict[str, Any] = Field(default_factory=dict, description="Input parameters for the job.")
+    progress: Dict[str, Any] = Field(default_factory=dict, description="Latest progress report (stage, revision, ...).")
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class JobSubmitted(BaseModel):
+    """
+    Response returned immediately when a job is accepted.
+    """
+    job_id: str
+    status: JobStatus
@@ -1,5 +1,6 @@
-from typing import TypedDict, List, Optional
+from typing import TypedDict, List, Optional, Dict, Any
 from pydantic import BaseModel, Field
+from app.models.document import FilterableRequest
 
 class AgentState(TypedDict):
     """
@@ -13,15 +14,27 @@ class AgentState(TypedDict):
     # Internal State
     draft: Optional[str]      # The current content being written
     critique: Optional[str]   # The editor's feedback
+    approved: bool            # Critic verdict (read by the router)
+    section_feedback: List[Dict[str, Any]]  # Flagged sections: {"section": n, "issue": ...}
     revision_count: int       # Safety breaker to prevent infinite loops
+    rule_rounds: int          # Critic rounds decided by the rule-based pre-critic alone
+    llm_calls_saved: int      # Critic LLM calls skipped by the rule-based pre-critic
+    seconds_saved: float      # Estimated critic latency those skips saved
+    prompt_tokens: List[Dict[str, Any]]  # Per LLM call: node, prompt/cached token counts
     
     # Output
     final_doc: Optional[str]  # The approved text
 
 # --- NEW: Request Model for API ---
-class GenerateRequest(BaseModel):
+class GenerateRequest(FilterableRequest):
     """
     Schema for triggering the Agentic Workflow.
     """
     topic: str = Field(..., description="The subject to write about (e.g., 'HMP155 Power Requirements').")
-    tone: str = Field("technical", description="Desired tone: 'technical', 'marketing', or 'summary'.")
\ No newline at end of file
+    tone: str = Field("technical", description="Desired tone: 'technical', 'marketing', or 'summary'.")
+
+class BatchGenerateRequest(FilterableRequest):
+    """
+    Schema for generating a whole documentation set in one call.
+    """
+    topics: List[str] = Field(..., min_length=1, description="Topics to write, e.g. every section of a table of contents.")
\ No newline at end of file
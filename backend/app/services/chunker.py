@@ -0,0 +1,90 @@
+import re
+from typing import Iterator, List, Sequence, Tuple
+
+# (start, end) character offsets into the source text
+Span = Tuple[int, int]
+
+NON_SPACE = re.compile(r"\S")
+
+
+class OffsetChunker:
+    """
+    Single-pass text splitter with the size/overlap semantics of the
+    RecursiveCharacterTextSplitter it replaces (lengths in characters).
+
+    Yields (start, end) offsets into the original text instead of copies,
+    so chunk strings are only created when they are embedded and stored.
+    Each chunk ends at the strongest separator in its window (paragraph,
+    then line, then word, else a hard cut). Like the recursive splitter,
+    the overlap is made of whole pieces at that level: the next chunk
+    starts at the first such boundary in the last `chunk_overlap` chars.
+    Work per chunk is bounded by the window size: linear in the text.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        separators: Sequence[str] = ("\n\n", "\n", " ")
+    ):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = tuple(separators)
+
+    def spans(self, text: str) -> Iterator[Span]:
+        """
+        Chunk offsets, in order, with surrounding whitespace trimmed.
+        """
+        length = len(text)
+        start = self._skip_whitespace(text, 0)
+        while start < length:
+            limit = start + self.chunk_size
+            if limit >= length:
+                end, level = length, len(self.separators)
+            else:
+                end, level = self._break_before(text, start, limit)
+
+            trimmed = end
+            while trimmed > start and text[trimmed - 1].isspace():
+                trimmed -= 1
+            if trimmed > start:
+                yield start, trimmed
+
+            if end >= length:
+                break
+            start = self._skip_whitespace(text, self._overlap_start(text, start, end, level))
+
+    def split_text(self, text: str) -> List[str]:
+        """
+        Materialized chunks (drop-in for the LangChain splitter).
+        """
+        return [text[start:end] for start, end in self.spans(text)]
+
+    def _break_before(self, text: str, start: int, limit: int) -> Tuple[int, int]:
+        """
+        (end offset, separator level) of the chunk starting at `start`.
+        Level len(separators) means a hard cut.
+        """
+        # Breaks inside the overlap zone would not advance past the next chunk's start
+        floor = start + self.chunk_overlap + 1
+        for level, separator in enumerate(self.separators):
+            pos = text.rfind(separator, floor, limit + len(separator))
+            if pos != -1:
+                return pos, level
+        return limit, len(self.separators)
+
+    def _overlap_start(self, text: str, start: int, end: int, level: int) -> int:
+        floor = max(end - self.chunk_overlap, start + 1)
+        # Overlap never reaches back across a separator stronger than the break
+        for separator in self.separators[:level + 1]:
+            pos = text.find(separator, floor, end)
+            if pos != -1:
+                return pos + len(separator)
+        return floor if level == len(self.separators) else end
+
+    @staticmethod
+    def _skip_whitespace(text: str, pos: int) -> int:
+        match = NON_SPACE.search(text, pos)
+        return match.start() if match else len(text)
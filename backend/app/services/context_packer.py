@@ -0,0 +1,139 @@
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from app.services.embeddings import estimate_tokens
+
+# Sentence-ish units used for de-duplication across passages
+SENTENCE_PATTERN = re.compile(r"[^\n]+?(?:[.!?]+(?=\s|$)|(?=\n)|$)")
+
+
+@dataclass
+class Passage:
+    source: str
+    text: str
+    score: float
+
+    def render(self) -> str:
+        return f"Source ({self.source}): {self.text}"
+
+
+def find_overlap(left: str, right: str, min_overlap: int = 20, max_overlap: int = 600) -> int:
+    """
+    Length of the longest suffix of `left` that is a prefix of `right`
+    (0 if shorter than `min_overlap`). Finds the splitter's chunk overlap.
+    """
+    if len(left) < min_overlap or len(right) < min_overlap:
+        return 0
+
+    head = right[:min_overlap]
+    start = max(0, len(left) - max_overlap)
+    best = 0
+    pos = left.find(head, start)
+    while pos != -1:
+        length = len(left) - pos
+        if length <= len(right) and right.startswith(left[pos:]):
+            # Earliest match is the longest overlap
+            best = length
+            break
+        pos = left.find(head, pos + 1)
+    return best
+
+
+class ContextPacker:
+    """
+    Turns ranked search results into a compact context for the agent prompts:
+    merges adjacent chunks that share the splitter's overlap, drops repeated
+    sentences, and fits the result into a token budget (best passages first).
+    """
+
+    def __init__(self, max_tokens: int = 1500, min_overlap: int = 20):
+        self.max_tokens = max_tokens
+        self.min_overlap = min_overlap
+
+    def pack(self, results: List[Dict[str, Any]]) -> List[str]:
+        passages = self._merge_overlaps(results)
+        passages = self._dedupe(passages)
+        return [p.render() for p in self._fit_budget(passages)]
+
+    def _merge_overlaps(self, results: List[Dict[str, Any]]) -> List[Passage]:
+        """
+        Chains chunks of the same source whose ends overlap. The merged
+        passage keeps the best score of its parts.
+        """
+        passages: List[Passage] = []
+        for res in results:
+            content = (res.get("content") or "").strip()
+            if not content:
+                continue
+            passages.append(Passage(
+                source=res.get("source") or "unknown",
+                text=content,
+                score=res.get("score") or 0.0
+            ))
+
+        merged = True
+        while merged:
+            merged = False
+            for i, a in enumerate(passages):
+                for j, b in enumerate(passages):
+                    if i == j or a.source != b.source:
+                        continue
+                    combined = self._combine(a.text, b.text)
+                    if combined is None:
+                        continue
+                    passages[i] = Passage(a.source, combined, max(a.score, b.score))
+                    del passages[j]
+                    merged = True
+                    break
+                if merged:
+                    break
+        return sorted(passages, key=lambda p: p.score, reverse=True)
+
+    def _combine(self, left: str, right: str) -> Optional[str]:
+        if right in left:
+            return left
+        overlap = find_overlap(left, right, self.min_overlap)
+        if overlap:
+            return left + right[overlap:]
+        return None
+
+    @staticmethod
+    def _dedupe(passages: List[Passage]) -> List[Passage]:
+        """
+        Removes sentences already present in a higher-ranked passage.
+        """
+        seen = set()
+        unique: List[Passage] = []
+        for passage in passages:
+            sentences = [s for s in SENTENCE_PATTERN.findall(passage.text) if s.strip()]
+            kept = []
+            for sentence in sentences:
+                key = " ".join(sentence.lower().split())
+                if key not in seen:
+                    seen.add(key)
+                    kept.append(sentence.strip())
+            if len(kept) == len(sentences):
+                # Nothing repeated: keep the original formatting
+                unique.append(passage)
+            elif kept:
+                unique.append(Passage(passage.source, " ".join(kept), passage.score))
+        return unique
+
+    def _fit_budget(self, passages: List[Passage]) -> List[Passage]:
+        packed: List[Passage] = []
+        remaining = self.max_tokens
+        for passage in passages:
+            tokens = estimate_tokens(passage.render())
+            if tokens <= remaining:
+                packed.append(passage)
+                remaining -= tokens
+                continue
+
+            # Truncate the first passage that does not fit at a word boundary
+            room_chars = (remaining - estimate_tokens(f"Source ({passage.source}): ")) * 4
+            if room_chars > 200:
+                text = passage.text[:room_chars].rsplit(" ", 1)[0] + " ..."
+                packed.append(Passage(passage.source, text, passage.score))
+            break
+        return packed
@@ -0,0 +1,299 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+WORD = re.compile(r"\w+")
+# Standalone numbers (values, ranges, units like "10mA"), not digits inside
+# model names such as "HMP155"
+NUMBER = re.compile(r"(?<![\w.])[-+]?\d+(?:[.,]\d+)*")
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+# (MinHash signature, key of the chunk's numbers)
+Fingerprint = Tuple[np.ndarray, str]
+
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles; the share of equal signature
+    slots estimates the Jaccard similarity of two chunks. Permutations
+    are seeded, so signatures are stable across processes and restarts.
+    """
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        # a < 2^31 and hashes < 2^32 keep a * h + b inside 64 bits
+        self.a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+    def shingles(self, text: str) -> Set[str]:
+        words = WORD.findall(text.lower())
+        k = self.shingle_size
+        if len(words) <= k:
+            return {" ".join(words)} if words else set()
+        return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+    def signature(self, text: str) -> np.ndarray:
+        shingles = self.shingles(text)
+        if not shingles:
+            return np.full(self.num_perm, MAX_HASH, dtype=np.uint64)
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+            dtype=np.uint64,
+            count=len(shingles)
+        )
+        permuted = (hashes[:, None] * self.a + self.b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0)
+
+
+def number_key(text: str) -> str:
+    """
+    Digest of the chunk's numbers in order. Chunks are only merged when
+    these match: a spec table that differs in one value is not a duplicate.
+    """
+    return hashlib.blake2b(" ".join(NUMBER.findall(text)).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+
+class NearDuplicateIndex:
+    """
+    Persistent MinHash LSH index of stored chunks (SQLite), plus the
+    near-duplicate chunks that were not stored and reference them instead.
+
+    Signatures are split into `bands`; chunks sharing any band bucket are
+    candidates, confirmed when the estimated similarity reaches `threshold`
+    and their numbers match.
+
+    A stored chunk that its own source drops is kept ("retained") while
+    other sources still reference it, and removed with the last reference.
+    """
+
+    def __init__(self, path: str, threshold: float = 0.9, num_perm: int = 64, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.path = path
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm=num_perm)
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS signatures (
+                point_id TEXT PRIMARY KEY,
+                signature BLOB NOT NULL,
+                numbers TEXT NOT NULL,
+                retained INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS buckets (
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                point_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS buckets_lookup ON buckets (band, bucket);
+            CREATE INDEX IF NOT EXISTS buckets_point ON buckets (point_id);
+            CREATE TABLE IF NOT EXISTS refs (
+                duplicate_id TEXT PRIMARY KEY,
+                point_id TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS refs_point ON refs (point_id);
+            """
+        )
+        self._conn.commit()
+
+    # --- Fingerprints ---
+
+    def fingerprint(self, text: str) -> Fingerprint:
+        return self.hasher.signature(text), number_key(text)
+
+    def fingerprint_many(self, texts: List[str]) -> List[Fingerprint]:
+        return [self.fingerprint(text) for text in texts]
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, int]]:
+        keys = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            digest = hashlib.blake2b(chunk, digest_size=8).digest()
+            keys.append((band, int.from_bytes(digest, "little", signed=True)))
+        return keys
+
+    # --- Matching ---
+
+    def match(
+        self,
+        point_ids: List[str],
+        fingerprints: List[Fingerprint],
+        exclude: Optional[Set[str]] = None
+    ) -> List[Optional[str]]:
+        """
+        For each new chunk, the point it duplicates: a stored chunk, or an
+        earlier unmatched chunk of the same call. None when it is unique.
+        A chunk never matches its own point ID (re-adding a retained chunk)
+        nor stored points in exclude (e.g. the versions it replaces).
+        """
+        exclude = exclude or set()
+        pending: Dict[Tuple[int, int], List[int]] = {}
+        matches: List[Optional[str]] = []
+
+        with self._lock:
+            for i, (point_id, (signature, numbers)) in enumerate(zip(point_ids, fingerprints)):
+                keys = self._band_keys(signature)
+                best, best_score = None, self.threshold
+
+                for candidate_id, stored, stored_numbers in self._stored_candidates(keys):
+                    score = similarity(signature, stored)
+                    if candidate_id in exclude or candidate_id == point_id:
+                        continue
+                    if stored_numbers == numbers and score >= best_score:
+                        best, best_score = candidate_id, score
+
+                if best is None:
+                    for j in sorted({j for key in keys for j in pending.get(key, ())}):
+                        score = similarity(signature, fingerprints[j][0])
+                        if point_ids[j] != point_id and fingerprints[j][1] == numbers and score >= best_score:
+                            best, best_score = point_ids[j], score
+
+                matches.append(best)
+                if best is None:
+                    for key in keys:
+                        pending.setdefault(key, []).append(i)
+        return matches
+
+    def _stored_candidates(self, keys: List[Tuple[int, int]]) -> List[Tuple[str, np.ndarray, str]]:
+        clause = " OR ".join("(band = ? AND bucket = ?)" for _ in keys)
+        params = [value for key in keys for value in key]
+        rows = self._conn.execute(
+            f"SELECT point_id, signature, numbers FROM signatures WHERE point_id IN "
+            f"(SELECT DISTINCT point_id FROM buckets WHERE {clause})",
+            params
+        ).fetchall()
+        return [(pid, np.frombuffer(blob, dtype=np.uint64), numbers) for pid, blob, numbers in rows]
+
+    # --- Stored chunks ---
+
+    def add(self, point_ids: List[str], fingerprints: List[Fingerprint]):
+        """
+        Indexes chunks that were stored (re-adding one clears its retained flag).
+        """
+        with self._lock:
+            self._delete_signatures(point_ids)
+            self._conn.executemany(
+                "INSERT INTO signatures (point_id, signature, numbers) VALUES (?, ?, ?)",
+                [(pid, signature.tobytes(), numbers) for pid, (signature, numbers) in zip(point_ids, fingerprints)]
+            )
+            self._conn.executemany(
+                "INSERT INTO buckets (band, bucket, point_id) VALUES (?, ?, ?)",
+                [
+                    (band, bucket, pid)
+                    for pid, (signature, _) in zip(point_ids, fingerprints)
+                    for band, bucket in self._band_keys(signature)
+                ]
+            )
+            self._conn.commit()
+
+    def _delete_signatures(self, point_ids: List[str]):
+        for start in range(0, len(point_ids), 500):
+            batch = point_ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            self._conn.execute(f"DELETE FROM signatures WHERE point_id IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM buckets WHERE point_id IN ({placeholders})", batch)
+
+    # --- References ---
+
+    def add_references(self, references: List[Tuple[str, str, Dict[str, Any]]]):
+        """
+        Records (duplicate point ID, stored point ID, duplicate's metadata).
+        """
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO refs (duplicate_id, point_id, metadata) VALUES (?, ?, ?)",
+                [(dup, pid, json.dumps(metadata)) for dup, pid, metadata in references]
+            )
+            self._conn.commit()
+
+    def references(self, point_ids: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Metadata of every duplicate referencing each point (only points that have any).
+        """
+        point_ids = list(point_ids)
+        found: Dict[str, List[Dict[str, Any]]] = {}
+        with self._lock:
+            for start in range(0, len(point_ids), 500):
+                batch = point_ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for pid, metadata in self._conn.execute(
+                    f"SELECT point_id, metadata FROM refs WHERE point_id IN ({placeholders}) ORDER BY duplicate_id",
+                    batch
+                ):
+                    found.setdefault(pid, []).append(json.loads(metadata))
+        return found
+
+    def release(self, point_ids: List[str]) -> Tuple[List[str], Set[str]]:
+        """
+        Removes chunks that left their source. Returns (point IDs to delete
+        from the stores, stored points whose references changed).
+        Duplicates only drop their reference; stored chunks that are still
+        referenced are retained; retained chunks losing their last
+        reference are deleted as well.
+        """
+        with self._lock:
+            affected: Set[str] = set()
+            referenced: Set[str] = set()
+            for start in range(0, len(point_ids), 500):
+                batch = point_ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                affected.update(pid for (pid,) in self._conn.execute(
+                    f"SELECT DISTINCT point_id FROM refs WHERE duplicate_id IN ({placeholders})", batch
+                ))
+                self._conn.execute(f"DELETE FROM refs WHERE duplicate_id IN ({placeholders})", batch)
+                referenced.update(pid for (pid,) in self._conn.execute(
+                    f"SELECT DISTINCT point_id FROM refs WHERE point_id IN ({placeholders})", batch
+                ))
+
+            self._conn.executemany(
+                "UPDATE signatures SET retained = 1 WHERE point_id = ?", [(pid,) for pid in referenced]
+            )
+            orphaned = {
+                pid for pid in affected
+                if self._conn.execute("SELECT retained FROM signatures WHERE point_id = ?", (pid,)).fetchone() == (1,)
+                and self._conn.execute("SELECT 1 FROM refs WHERE point_id = ? LIMIT 1", (pid,)).fetchone() is None
+            }
+
+            to_delete = [pid for pid in point_ids if pid not in referenced]
+            to_delete += sorted(orphaned - set(to_delete))
+            self._delete_signatures(to_delete)
+            self._conn.commit()
+        return to_delete, affected - set(to_delete)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "indexed_chunks": self._conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0],
+                "duplicate_references": self._conn.execute("SELECT COUNT(*) FROM refs").fetchone()[0],
+                "retained_chunks": self._conn.execute(
+                    "SELECT COUNT(*) FROM signatures WHERE retained = 1"
+                ).fetchone()[0],
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,160 @@
+import hashlib
+import sqlite3
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.core.logging import logger
+
+
+def content_hash(text: str) -> str:
+    """
+    Stable SHA-256 hex digest of a chunk's text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed embedding cache backed by SQLite.
+
+    Keyed by (model name, SHA-256 of chunk text). Vectors are stored as packed
+    float32 blobs. When the entry count exceeds `max_entries`, the least
+    recently used rows are evicted.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200_000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_access INTEGER NOT NULL,
+                PRIMARY KEY (model, hash)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)"
+        )
+        self._conn.commit()
+
+        # Monotonic access clock for LRU ordering (survives restarts)
+        row = self._conn.execute("SELECT MAX(last_access) FROM embeddings").fetchone()
+        self._clock = row[0] or 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.api_calls_saved = 0
+        self._embed_seconds = 0.0
+        self._embedded_texts = 0
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Looks up vectors for `texts`. Returns None for every miss.
+        """
+        hashes = [content_hash(t) for t in texts]
+        found: Dict[str, List[float]] = {}
+
+        with self._lock:
+            unique = list(dict.fromkeys(hashes))
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    [model, *batch]
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = array("f", blob).tolist()
+
+            if found:
+                tick = self._tick()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model = ? AND hash = ?",
+                    [(tick, model, h) for h in found]
+                )
+                self._conn.commit()
+
+        results = [found.get(h) for h in hashes]
+        hits = sum(1 for r in results if r is not None)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """
+        Stores vectors and evicts least recently used rows over the size bound.
+        """
+        with self._lock:
+            tick = self._tick()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, hash, vector, last_access) VALUES (?, ?, ?, ?)",
+                [
+                    (model, content_hash(t), array("f", v).tobytes(), tick)
+                    for t, v in zip(texts, vectors)
+                ]
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+            logger.info(f"🧹 Evicted {overflow} embeddings from cache (LRU).")
+
+    def record_embedding(self, texts: int, seconds: float):
+        """
+        Records real embedding work so savings can be estimated.
+        """
+        self._embedded_texts += texts
+        self._embed_seconds += seconds
+
+    def record_api_calls_saved(self, calls: int):
+        self.api_calls_saved += calls
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        seconds_per_text = (
+            self._embed_seconds / self._embedded_texts if self._embedded_texts else 0.0
+        )
+        return {
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "api_calls_saved": self.api_calls_saved,
+            "estimated_seconds_saved": round(self.hits * seconds_per_text, 3),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
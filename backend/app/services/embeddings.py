@@ -0,0 +1,266 @@
+import asyncio
+import hashlib
+import math
+import re
+from abc import ABC, abstractmethod
+from typing import Any, Callable, List, Optional, Set, Tuple
+
+from app.core.logging import logger
+from app.core.rate_limit import Priority, RateLimiter
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token for English text).
+    Good enough for packing batches under the provider's request limits.
+    """
+    return len(text) // 4 + 1
+
+
+class BaseEmbedder(ABC):
+    """
+    Pluggable embedding backend.
+    Implementations only need to embed one batch; batching, concurrency
+    and request coalescing are handled by EmbeddingPipeline.
+    """
+
+    model_name: str = "unknown"
+
+    @abstractmethod
+    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        Returns one vector per input text, in order.
+        """
+
+
+class LangChainEmbedder(BaseEmbedder):
+    """
+    Adapter for LangChain `Embeddings` objects (e.g. OpenAIEmbeddings).
+    Uses the native async client, so no thread is tied up per request.
+    Pass `factory` instead of a model to build the client on first use.
+    """
+
+    def __init__(
+        self,
+        embeddings_model: Any = None,
+        model_name: str = "unknown",
+        factory: Optional[Callable[[], Any]] = None
+    ):
+        if embeddings_model is None and factory is None:
+            raise ValueError("LangChainEmbedder needs an embeddings model or a factory")
+        self._embeddings_model = embeddings_model
+        self._factory = factory
+        self.model_name = model_name
+
+    @property
+    def embeddings_model(self) -> Any:
+        if self._embeddings_model is None:
+            self._embeddings_model = self._factory()
+        return self._embeddings_model
+
+    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings_model.aembed_documents(texts)
+
+
+class FakeEmbedder(BaseEmbedder):
+    """
+    Deterministic local embedder for tests and benchmarks.
+    Uses feature hashing over word tokens, so texts sharing words get similar
+    vectors. An optional latency simulates the network round trip.
+    """
+
+    def __init__(self, dimensions: int = 1536, latency: float = 0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.model_name = f"fake-hashing-{dimensions}"
+        self.calls = 0
+
+    def _embed_one(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[bucket] += sign
+
+        norm = math.sqrt(sum(v * v for v in vector))
+        if norm == 0:
+            # Empty text still needs a valid (non-zero) vector for cosine distance
+            vector[0] = 1.0
+            return vector
+        return [v / norm for v in vector]
+
+    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self._embed_one(text) for text in texts]
+
+
+class EmbeddingPipeline:
+    """
+    Async, micro-batched front end for an embedder.
+
+    - Documents are packed into batches under a token budget and item cap.
+    - At most `max_concurrency` batches are in flight at once.
+    - Concurrent `embed_query` calls (e.g. from different requests) are
+      coalesced into a single batch within a short window.
+    - With a shared `limiter`, provider calls are budgeted and retried
+      there; query batches run as INTERACTIVE and skip the batch slots,
+      so bulk ingestion cannot starve searches.
+    """
+
+    def __init__(
+        self,
+        embedder: BaseEmbedder,
+        max_batch_tokens: int = 50_000,
+        max_batch_size: int = 256,
+        max_concurrency: int = 4,
+        coalesce_window: float = 0.005,
+        limiter: Optional[RateLimiter] = None,
+    ):
+        self.embedder = embedder
+        self.limiter = limiter
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.coalesce_window = coalesce_window
+
+        # Created lazily so the pipeline can be built outside a running loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pending_queries: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # The loop only keeps weak references to tasks; hold them until done
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def model_name(self) -> str:
+        return self.embedder.model_name
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def make_batches(self, texts: List[str]) -> List[List[int]]:
+        """
+        Groups text indices into batches bounded by token budget and size.
+        A single oversized text still gets its own batch.
+        """
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+
+        for idx, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if current and (
+                current_tokens + tokens > self.max_batch_tokens
+                or len(current) >= self.max_batch_size
+            ):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(idx)
+            current_tokens += tokens
+
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _embed_limited(self, texts: List[str], priority: Priority = Priority.BULK) -> List[List[float]]:
+        if priority == Priority.INTERACTIVE and self.limiter is not None:
+            vectors = await self._embed_batch(texts, priority)
+        else:
+            async with self._get_semaphore():
+                vectors = await self._embed_batch(texts, priority)
+        if len(vectors) != len(texts):
+            raise ValueError(
+                f"Embedder returned {len(vectors)} vectors for {len(texts)} texts"
+            )
+        return vectors
+
+    async def _embed_batch(self, texts: List[str], priority: Priority) -> List[List[float]]:
+        if self.limiter is None:
+            return await self.embedder.embed_batch(texts)
+        return await self.limiter.run(
+            lambda: self.embedder.embed_batch(texts),
+            tokens=sum(estimate_tokens(text) for text in texts),
+            priority=priority
+        )
+
+    async def embed_documents(self, texts: List[str], priority: Priority = Priority.BULK) -> List[List[float]]:
+        """
+        Embeds many texts using bounded, concurrent micro-batches.
+        Output order matches input order.
+        """
+        if not texts:
+            return []
+
+        batches = self.make_batches(texts)
+        results = await asyncio.gather(
+            *(self._embed_limited([texts[i] for i in batch], priority) for batch in batches)
+        )
+
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for batch, batch_vectors in zip(batches, results):
+            for idx, vector in zip(batch, batch_vectors):
+                vectors[idx] = vector
+
+        logger.debug(f"🧮 Embedded {len(texts)} texts in {len(batches)} batches.")
+        return vectors
+
+    async def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a single query. Calls arriving within the coalescing window
+        share one embedding request.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending_queries.append((text, future))
+
+        if len(self._pending_queries) >= self.max_batch_size:
+            self._flush_queries()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.coalesce_window, self._flush_queries)
+
+        return await future
+
+    def _flush_queries(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        pending, self._pending_queries = self._pending_queries, []
+        if pending:
+            task = asyncio.ensure_future(self._resolve_queries(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _resolve_queries(self, pending: List[Tuple[str, asyncio.Future]]):
+        """
+        Embeds one coalesced batch and settles every waiting future. Errors
+        (and cancellation) are handed to the waiters, never left on the task.
+        """
+        # Identical queries in the same window are embedded once
+        unique_texts = list(dict.fromkeys(text for text, _ in pending))
+
+        try:
+            vectors = await self._embed_limited(unique_texts, Priority.INTERACTIVE)
+        except BaseException as e:
+            for _, future in pending:
+                if future.done():
+                    continue
+                if isinstance(e, Exception):
+                    future.set_exception(e)
+                else:
+                    future.cancel()
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        by_text = dict(zip(unique_texts, vectors))
+        for text, future in pending:
+            if not future.done():
+                future.set_result(by_text[text])
+
+        if len(pending) > 1:
+            logger.debug(f"🧮 Coalesced {len(pending)} queries into one embedding call.")
@@ -0,0 +1,82 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from qdrant_client.http import models
+from qdrant_client.http.models import Filter, FieldCondition, MatchValue, MatchAny
+
+from app.models.document import FilterValue, normalize_filters
+
+# A near-duplicate chunk is stored once, under its first document; the other
+# documents containing it are listed in this keyword array, so a "source"
+# filter matches either field
+REFERENCE_SOURCES_FIELD = "reference_sources"
+
+
+def index_fields(key: str) -> List[str]:
+    """
+    Payload fields a filter on `key` reads (and that should be indexed).
+    """
+    return [key, REFERENCE_SOURCES_FIELD] if key == "source" else [key]
+
+
+def qdrant_filter(filters: Optional[Dict[str, Any]]) -> Optional[Filter]:
+    """
+    Translates metadata filters into a Qdrant `Filter` (None when empty).
+    """
+    normalized = normalize_filters(filters)
+    if not normalized:
+        return None
+
+    conditions = []
+    for key, values in normalized.items():
+        if len(values) == 1:
+            match = MatchValue(value=values[0])
+        else:
+            match = MatchAny(any=values)
+        fields = [FieldCondition(key=field, match=match) for field in index_fields(key)]
+        # Array fields match when any element does
+        conditions.append(fields[0] if len(fields) == 1 else Filter(should=fields))
+    return Filter(must=conditions)
+
+
+def payload_schema(values: List[FilterValue]) -> models.PayloadSchemaType:
+    """
+    Payload index type for a filtered field, inferred from its values.
+    """
+    if all(isinstance(v, bool) for v in values):
+        return models.PayloadSchemaType.BOOL
+    if all(isinstance(v, int) for v in values):
+        return models.PayloadSchemaType.INTEGER
+    return models.PayloadSchemaType.KEYWORD
+
+
+def sqlite_filter_clause(filters: Optional[Dict[str, Any]], column: str) -> Tuple[str, List[Any]]:
+    """
+    SQL condition (and parameters) matching filters against a JSON payload
+    column. Returns ("", []) when there is nothing to filter.
+    """
+    clauses, params = [], []
+    for key, values in normalize_filters(filters).items():
+        placeholders = ",".join("?" * len(values))
+        # SQLite's json_extract returns JSON booleans as 1/0
+        values = [int(v) if isinstance(v, bool) else v for v in values]
+        # Keys are validated identifiers, so they are safe inside the JSON path
+        clause = f"json_extract({column}, '$.{key}') IN ({placeholders})"
+        if key == "source":
+            clause = (
+                f"({clause} OR EXISTS (SELECT 1 FROM json_each({column}, '$.{REFERENCE_SOURCES_FIELD}') "
+                f"WHERE value IN ({placeholders})))"
+            )
+            params.extend(values)
+        clauses.append(clause)
+        params.extend(values)
+    return " AND ".join(clauses), params
+
+
+def filters_cache_key(filters: Optional[Dict[str, Any]]) -> Tuple:
+    """
+    Hashable, order-independent form of the filters for cache keys.
+    """
+    return tuple(sorted(
+        (key, tuple(sorted(map(repr, values))))
+        for key, values in normalize_filters(filters).items()
+    ))
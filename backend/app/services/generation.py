@@ -0,0 +1,279 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.core.metrics import GENERATE_REVISIONS, timed
+from app.core.rate_limit import Priority, priority_scope
+from app.agents.graph import get_workflow
+from app.agents.nodes import get_llm
+from app.models.workflow import AgentState
+from app.services.context_packer import ContextPacker
+from app.services.embedding_cache import content_hash
+from app.services.llm_cache import SemanticCache, get_llm_cache
+
+ProgressCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+NO_CONTEXT_FALLBACK = "No specific technical context found in database. Rely on general knowledge but be cautious."
+
+
+class GenerationService:
+    """
+    Retrieval + Draft -> Critique -> Revise workflow for a single topic.
+    Shared by the synchronous /generate endpoint and the background job API.
+    """
+
+    def __init__(self, ingestion_service, workflow=None):
+        self.ingestion_service = ingestion_service
+        # None: use the shared graph, compiled on the first run
+        self._workflow = workflow
+        # Every drafter/critic call resends the context, so keep it compact
+        self.context_packer = ContextPacker(max_tokens=settings.CONTEXT_TOKEN_BUDGET)
+
+        # Near-identical topics with the same context reuse the finished
+        # document. Both generation caches are dropped on knowledge-base writes.
+        self.semantic_cache: Optional[SemanticCache] = None
+        if settings.SEMANTIC_CACHE_ENABLED:
+            self.semantic_cache = SemanticCache(
+                threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+                max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES
+            )
+            ingestion_service.vector_db.add_write_listener(self.semantic_cache.clear)
+
+        llm_cache = get_llm_cache()
+        if llm_cache is not None:
+            ingestion_service.vector_db.add_write_listener(llm_cache.clear)
+
+    @property
+    def workflow(self):
+        if self._workflow is None:
+            self._workflow = get_workflow()
+        return self._workflow
+
+    async def warm_up(self):
+        """
+        Compiles the agent graph and builds the chat client ahead of the
+        first request. Called in the background after startup.
+        """
+        await asyncio.to_thread(lambda: self.workflow)
+        await asyncio.to_thread(get_llm)
+
+    async def retrieve_context(
+        self,
+        topic: str,
+        limit: int = 5,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[str]:
+        """
+        Grounding step: searches the knowledge base for the topic,
+        optionally restricted by metadata filters.
+        """
+        search_results = await self.ingestion_service.search_knowledge_base(
+            query=topic, limit=limit, filters=filters
+        )
+        return self._pack_context(topic, search_results)
+
+    async def retrieve_contexts(
+        self,
+        topics: List[str],
+        limit: int = 5,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[str]]:
+        """
+        Grounding step for many topics: one embedding call and one batched
+        vector query for all of them.
+        """
+        search_results = await self.ingestion_service.search_many(topics, limit=limit, filters=filters)
+        return [self._pack_context(topic, results) for topic, results in zip(topics, search_results)]
+
+    def _pack_context(self, topic: str, search_results: List[Dict[str, Any]]) -> List[str]:
+        # Merge overlapping chunks, drop repeats, fit the token budget
+        context_str_list = self.context_packer.pack(search_results)
+
+        if not context_str_list:
+            logger.warning(f"⚠️ No context found for topic: {topic}")
+            context_str_list = [NO_CONTEXT_FALLBACK]
+        return context_str_list
+
+    @staticmethod
+    def initial_state(topic: str, context: List[str]) -> AgentState:
+        return {
+            "query": topic,
+            "context": context,
+            "draft": None,
+            "critique": None,
+            "approved": False,
+            "section_feedback": [],
+            "revision_count": 0,
+            "rule_rounds": 0,
+            "llm_calls_saved": 0,
+            "seconds_saved": 0.0,
+            "prompt_tokens": [],
+            "final_doc": None
+        }
+
+    async def run(
+        self,
+        topic: str,
+        on_progress: Optional[ProgressCallback] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Runs retrieval and the agent graph without blocking the event loop.
+        `on_progress` is awaited after retrieval and after every graph node.
+        """
+        logger.info(f"🤖 Starting Agent Workflow for topic: {topic}")
+
+        with timed("retrieval"):
+            context = await self.retrieve_context(topic, filters=filters)
+        if on_progress:
+            await on_progress({"stage": "retrieval", "revision": 0, "context_chunks": len(context)})
+        return await self._run_workflow(topic, context, on_progress)
+
+    async def run_batch(
+        self,
+        topics: List[str],
+        filters: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Generates many topics (e.g. every section of a manual). Retrieval is
+        batched; the workflows then run concurrently, their LLM calls bounded
+        by the shared rate limiter at BULK priority (single requests go first).
+        Yields (topic index, result) as each topic finishes; a failed topic
+        yields {"topic", "error"} instead.
+        """
+        logger.info(f"📚 Starting batch generation for {len(topics)} topics")
+        with timed("retrieval"), priority_scope(Priority.BULK):
+            contexts = await self.retrieve_contexts(topics, filters=filters)
+
+        async def generate(index: int) -> Tuple[int, Dict[str, Any]]:
+            try:
+                with priority_scope(Priority.BULK):
+                    return index, await self._run_workflow(topics[index], contexts[index])
+            except Exception as e:
+                logger.error(f"❌ Batch topic '{topics[index]}' failed: {e}")
+                return index, {"topic": topics[index], "error": str(e)}
+
+        tasks = [asyncio.create_task(generate(i)) for i in range(len(topics))]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            # Client went away: stop the remaining workflows
+            for task in tasks:
+                task.cancel()
+
+    async def _run_workflow(
+        self,
+        topic: str,
+        context: List[str],
+        on_progress: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
+        """
+        Semantic cache lookup, then the Draft -> Critique -> Revise graph.
+        """
+        state = self.initial_state(topic, context)
+        cache_key, cached = await self._semantic_lookup(topic, context)
+        if cached is not None:
+            return cached
+
+        # astream() runs the graph natively on the event loop and reports each
+        # node's state update as it completes.
+        final_state: Dict[str, Any] = dict(state)
+        async for update in self.workflow.astream(state, stream_mode="updates"):
+            for node, delta in update.items():
+                final_state.update(delta or {})
+                if on_progress:
+                    await on_progress({"stage": node, "revision": final_state.get("revision_count", 0)})
+
+        return self._complete(cache_key, self._format_result(final_state, context))
+
+    async def stream_events(
+        self,
+        topic: str,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Runs the workflow and yields (event, data) pairs as it progresses:
+        retrieval, node_started, token, draft, critique and finally done.
+        """
+        with timed("retrieval"):
+            context = await self.retrieve_context(topic, filters=filters)
+        state = self.initial_state(topic, context)
+        yield "retrieval", {"context_chunks": len(context)}
+
+        cache_key, cached = await self._semantic_lookup(topic, context)
+        if cached is not None:
+            yield "done", cached
+            return
+
+        final_state: Dict[str, Any] = dict(state)
+        async for mode, chunk in self.workflow.astream(state, stream_mode=["tasks", "messages", "updates"]):
+            if mode == "tasks":
+                # Task events come in pairs; only the start carries 'input'
+                if "input" in chunk:
+                    yield "node_started", {"node": chunk["name"], "revision": final_state.get("revision_count", 0)}
+            elif mode == "messages":
+                message, metadata = chunk
+                if message.content:
+                    yield "token", {"node": metadata.get("langgraph_node"), "text": message.content}
+            elif mode == "updates":
+                for node, delta in chunk.items():
+                    final_state.update(delta or {})
+                    revision = final_state.get("revision_count", 0)
+                    if delta and "draft" in delta:
+                        yield "draft", {"revision": revision, "draft": delta["draft"]}
+                    if delta and "critique" in delta:
+                        yield "critique", {
+                            "revision": revision,
+                            "critique": delta["critique"],
+                            "sections": [item["section"] for item in delta.get("section_feedback") or []]
+                        }
+
+        yield "done", self._complete(cache_key, self._format_result(final_state, context))
+
+    async def _semantic_lookup(self, topic: str, context: List[str]) -> Tuple[Optional[Tuple], Optional[Dict[str, Any]]]:
+        """
+        Returns (cache key, cached result or None). The key is None when the
+        semantic cache is disabled.
+        """
+        if self.semantic_cache is None:
+            return None, None
+
+        topic_vector = await self.ingestion_service.embed_query(topic)
+        context_hash = content_hash("\n".join(context))
+        cached = self.semantic_cache.get(topic_vector, context_hash)
+        if cached is not None:
+            return None, {**cached, "cached": True}
+        return (topic_vector, context_hash), None
+
+    def _complete(self, cache_key: Optional[Tuple], result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Records metrics for a freshly generated result and caches it.
+        """
+        GENERATE_REVISIONS.observe(result["revisions"] or 0)
+        if cache_key is not None:
+            self.semantic_cache.set(*cache_key, result)
+        return result
+
+    @staticmethod
+    def _format_result(final_state: Dict[str, Any], context: List[str]) -> Dict[str, Any]:
+        # We return the draft and the last critique to show the 'thought process'
+        return {
+            "final_document": final_state.get("draft"),
+            "revisions": final_state.get("revision_count"),
+            "final_critique": final_state.get("critique"),
+            "used_context": len(context),
+            "cached": False,
+            # Savings from the rule-based pre-critic for this workflow
+            "pre_critic": {
+                "llm_calls_saved": final_state.get("llm_calls_saved", 0),
+                "seconds_saved": round(final_state.get("seconds_saved", 0.0), 3)
+            },
+            "prompt_tokens": final_state.get("prompt_tokens", []),
+            # Drafter output per revision: full drafts vs. section-only rewrites
+            "drafter_output_tokens": [
+                {"mode": usage.get("revision_mode", "full"), "completion_tokens": usage.get("completion_tokens", 0)}
+                for usage in final_state.get("prompt_tokens", []) if usage["node"] == "drafter"
+            ]
+        }
@@ -1,12 +1,45 @@
-from typing import List
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
+from typing import Any, Dict, List, Optional, Set, Tuple, AsyncIterator
 from app.core.config import settings
-from app.services.vector_db import VectorDBService
+from app.core.http import get_http_client, get_async_http_client
+from app.services.vector_db import AsyncVectorDBService, create_vector_store
+from app.services.chunker import OffsetChunker
+from app.services.embeddings import EmbeddingPipeline, LangChainEmbedder, FakeEmbedder
+from app.services.embedding_cache import EmbeddingCache
+from app.services.query_cache import TTLCache
+from app.services.manifest import SourceManifest, chunk_point_id, payload_hash
+from app.services.dedup import Fingerprint, NearDuplicateIndex
+from app.services.lexical_index import LexicalIndex, identifier_terms, is_identifier_query, reciprocal_rank_fusion
+from app.services.filters import REFERENCE_SOURCES_FIELD, filters_cache_key
+from app.services.pdf_extraction import PdfExtractor, spool_upload
 from app.core.logging import logger
+from app.core.metrics import timed
+from app.core.rate_limit import client_max_retries, current_priority, get_rate_limiter
 from fastapi import UploadFile
-import pypdf
-import io
+import asyncio
+import shutil
+import tempfile
+import time
+import zipfile
+import os
+
+def create_openai_embeddings():
+    """
+    OpenAI embeddings client. langchain_openai is imported here, on first
+    use, because importing it is the slowest part of process startup.
+    """
+    from langchain_openai import OpenAIEmbeddings
+
+    # We use text-embedding-3-small for cost/performance balance
+    return OpenAIEmbeddings(
+        api_key=settings.OPENAI_API_KEY,
+        model=settings.EMBEDDING_MODEL_ID,
+        base_url=settings.OPENAI_BASE_URL,
+        # 429s and transient errors are retried by the shared rate limiter
+        max_retries=client_max_retries(),
+        # Same pooled connections as the chat model
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client()
+    )
 
 class IngestionService:
     """
@@ -14,24 +47,104 @@ class IngestionService:
     Raw Text -> Chunking -> Embedding -> Vector DB Storage
     """
 
-    def __init__(self):
-        self.vector_db = VectorDBService()
+    def __init__(self, vector_db: Optional[AsyncVectorDBService] = None):
+        # Non-blocking vector store (Qdrant or the embedded mmap index,
+        # per VECTOR_BACKEND); the Qdrant collection is created on first use
+        self.vector_db = vector_db if vector_db is not None else create_vector_store()
+        self.manifest = SourceManifest(settings.MANIFEST_PATH)
+        
+        # Async embedding layer: token-budgeted batches, bounded concurrency,
+        # and query coalescing. The fake backend is for offline benchmarks.
+        # The OpenAI client is created on the first embedding call.
+        # OpenAI calls share the process-wide embeddings rate limiter.
+        if settings.EMBEDDING_BACKEND == "fake":
+            embedder = FakeEmbedder(dimensions=self.vector_db.vector_size)
+            limiter = None
+        else:
+            embedder = LangChainEmbedder(model_name=settings.EMBEDDING_MODEL_ID, factory=create_openai_embeddings)
+            limiter = get_rate_limiter("embeddings")
+
+        self.embedding_pipeline = EmbeddingPipeline(
+            embedder,
+            max_batch_tokens=settings.EMBEDDING_MAX_BATCH_TOKENS,
+            max_batch_size=settings.EMBEDDING_MAX_BATCH_SIZE,
+            max_concurrency=settings.EMBEDDING_MAX_CONCURRENCY,
+            coalesce_window=settings.EMBEDDING_QUERY_COALESCE_MS / 1000,
+            limiter=limiter
+        )
+
+        # Persistent cache so re-ingesting unchanged chunks costs no API calls
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        if settings.EMBEDDING_CACHE_ENABLED:
+            self.embedding_cache = EmbeddingCache(
+                path=settings.EMBEDDING_CACHE_PATH,
+                max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
+            )
+
+        # Hot-path caches for repeated queries. Query vectors never go stale;
+        # search results are dropped on every write to the vector DB.
+        self.query_vector_cache: Optional[TTLCache] = None
+        self.search_cache: Optional[TTLCache] = None
+        if settings.QUERY_CACHE_ENABLED:
+            self.query_vector_cache = TTLCache(
+                max_entries=settings.QUERY_CACHE_MAX_ENTRIES,
+                ttl=settings.QUERY_CACHE_TTL_SECONDS
+            )
+            self.search_cache = TTLCache(
+                max_entries=settings.QUERY_CACHE_MAX_ENTRIES,
+                ttl=settings.QUERY_CACHE_TTL_SECONDS
+            )
+            self.vector_db.add_write_listener(self.search_cache.clear)
+
+        # BM25 index maintained alongside the vector store. Identifier queries
+        # (part numbers, spec codes) are answered from it without embedding.
+        self.lexical_index: Optional[LexicalIndex] = None
+        if settings.LEXICAL_INDEX_ENABLED:
+            self.lexical_index = LexicalIndex(settings.LEXICAL_INDEX_PATH)
+            if self.search_cache is not None:
+                self.lexical_index.add_write_listener(self.search_cache.clear)
+
+        # MinHash LSH index of stored chunks: near-duplicates (boilerplate
+        # repeated across manuals) are recorded as references, not embedded
+        self.dedup_index: Optional[NearDuplicateIndex] = None
+        if settings.DEDUP_ENABLED:
+            self.dedup_index = NearDuplicateIndex(settings.DEDUP_INDEX_PATH, threshold=settings.DEDUP_THRESHOLD)
         
-        # Initialize OpenAI Embeddings
-        # We use text-embedding-3-small for cost/performance balance
-        self.embeddings_model = OpenAIEmbeddings(
-            api_key=settings.OPENAI_API_KEY,
-            model="text-embedding-3-small"
+        # CPU-bound PDF parsing runs in worker processes
+        self.pdf_extractor = PdfExtractor(
+            workers=settings.PDF_EXTRACT_WORKERS,
+            pages_per_task=settings.PDF_PAGES_PER_TASK
         )
         
         # Initialize Text Splitter
         # Chunk size 1000 is standard for technical docs (approx 2-3 paragraphs)
         # Overlap 200 ensures context isn't lost between cuts
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        # Single pass, returns offsets; chunk strings are sliced when consumed
+        self.chunker = OffsetChunker(chunk_size=1000, chunk_overlap=200)
+
+    async def warm_up(self):
+        """
+        Connects the vector store and builds the embeddings client ahead of
+        the first request. Called in the background after startup.
+        """
+        await self.vector_db.ensure_ready()
+        embedder = self.embedding_pipeline.embedder
+        if isinstance(embedder, LangChainEmbedder):
+            await asyncio.to_thread(lambda: embedder.embeddings_model)
+
+    async def close(self):
+        """
+        Releases worker processes, connections and local database handles.
+        """
+        self.pdf_extractor.shutdown()
+        await self.vector_db.close()
+        self.manifest.close()
+        if self.embedding_cache is not None:
+            self.embedding_cache.close()
+        if self.lexical_index is not None:
+            self.lexical_index.close()
+        if self.dedup_index is not None:
+            self.dedup_index.close()
 
     async def process_document(self, text: str, source_name: str, metadata: dict):
         """
@@ -39,82 +152,704 @@ class IngestionService:
         """
         logger.info(f"⚙️ Processing document: {source_name}")
 
-        # 1. Split Text
-        chunks = self.text_splitter.create_documents(
-            texts=[text], 
-            metadatas=[{"source": source_name, **metadata}]
+        # 1. Split Text (offsets only; every chunk shares one metadata dict)
+        with timed("split"):
+            spans = list(self.chunker.spans(text))
+        logger.info(f"✂️ Split document into {len(spans)} chunks.")
+
+        if not spans:
+            return {"status": "skipped", "reason": "Text was empty"}
+
+        chunk_metadata = {"source": source_name, **metadata}
+
+        async def chunk_stream():
+            for start, end in spans:
+                yield text[start:end], chunk_metadata
+
+        # 2-4. Diff, embed and store in rolling batches
+        return await self._ingest_chunks(source_name, chunk_stream())
+
+    async def _ingest_chunks(self, source_name: str, chunk_stream: AsyncIterator[Tuple[str, dict]]):
+        """
+        Embeds and upserts a stream of (content, metadata) chunks in rolling
+        batches, diffing against the source manifest. Memory is bounded by
+        INGEST_BATCH_SIZE rather than by document size.
+        """
+        previous = self.manifest.get_entries(source_name)
+        seen: Dict[str, str] = {}
+        batch: List[Tuple[str, str, dict]] = []
+        total = 0
+        counts = {"added": 0, "unchanged": 0, "updated": 0, "duplicates": 0}
+
+        async for content, metadata in chunk_stream:
+            total += 1
+            point_id = chunk_point_id(source_name, content)
+            # Identical chunks within one document collapse onto one point
+            if point_id in seen:
+                continue
+            seen[point_id] = payload_hash(metadata)
+            batch.append((point_id, content, metadata))
+
+            if len(batch) >= settings.INGEST_BATCH_SIZE:
+                for key, value in zip(counts, await self._store_batch(batch, previous, seen)):
+                    counts[key] += value
+                batch = []
+
+        if batch:
+            for key, value in zip(counts, await self._store_batch(batch, previous, seen)):
+                counts[key] += value
+
+        if total == 0:
+            return {"status": "skipped", "reason": "Text was empty"}
+
+        # Chunks that disappeared from the document
+        removed_ids = await self._delete_points(sorted(set(previous) - set(seen)))
+        self.manifest.replace(source_name, seen)
+
+        logger.info(
+            f"🧾 {source_name}: {counts['added']} new, {counts['unchanged']} unchanged, "
+            f"{counts['updated']} with new metadata, {counts['duplicates']} near-duplicates, "
+            f"{len(removed_ids)} removed chunks."
+        )
+        return {
+            "status": "success",
+            "chunks_processed": total,
+            **counts,
+            "removed": len(removed_ids)
+        }
+
+    async def _store_batch(
+        self,
+        batch: List[Tuple[str, str, dict]],
+        previous: Dict[str, Optional[str]],
+        hashes: Dict[str, str]
+    ) -> Tuple[int, int, int, int]:
+        """
+        Embeds and upserts the chunks of one batch that are not stored yet,
+        except near-duplicates of stored chunks, and refreshes the payload
+        of stored chunks whose metadata changed.
+        Returns (added, unchanged, updated, duplicates) counts.
+        """
+        # Trust the manifest only for points that really exist in Qdrant
+        stored_ids = await self.vector_db.existing_ids(
+            [point_id for point_id, _, _ in batch if point_id in previous]
         )
-        logger.info(f"✂️ Split document into {len(chunks)} chunks.")
+        stale = [item for item in batch if item[0] in stored_ids and previous[item[0]] != hashes[item[0]]]
+        await self._refresh_payloads(stale)
 
+        new_chunks = [item for item in batch if item[0] not in stored_ids]
+        # An edited chunk must not match the old version it replaces
+        unique, duplicates, fingerprints = await self._dedupe(new_chunks, exclude=set(previous))
+        if unique:
+            await self._embed_and_upsert(unique)
+        await self._record_duplicates(unique, fingerprints, duplicates)
+
+        # Unchanged chunks too, so an index added later gets backfilled
+        duplicate_ids = {duplicate_id for duplicate_id, _, _ in duplicates}
+        await self._index_lexical([item for item in batch if item[0] not in duplicate_ids])
+        return len(unique), len(stored_ids) - len(stale), len(stale), len(duplicates)
+
+    async def _refresh_payloads(self, chunks: List[Tuple[str, str, dict]]):
+        """
+        Rewrites the payload of stored (point_id, content, metadata) chunks
+        whose metadata changed; text and vector are unchanged, so nothing
+        is embedded. The lexical row is refreshed by _index_lexical.
+        """
         if not chunks:
-            return {"status": "skipped", "reason": "Text was empty"}
+            return
+        await self.vector_db.set_payloads(
+            {point_id: {"content": content, **metadata} for point_id, content, metadata in chunks},
+            overwrite=True
+        )
+        if self.dedup_index is not None:
+            # Overwriting dropped the near-duplicate references
+            await self._sync_references({point_id for point_id, _, _ in chunks})
 
-        # 2. Generate Embeddings
-        texts_content = [chunk.page_content for chunk in chunks]
-        
+    async def _dedupe(
+        self,
+        chunks: List[Tuple[str, str, dict]],
+        exclude: Optional[Set[str]] = None
+    ) -> Tuple[List[Tuple[str, str, dict]], List[Tuple[str, str, dict]], Dict[str, Fingerprint]]:
+        """
+        Splits new (point_id, content, metadata) chunks into the ones to embed
+        and near-duplicates of a stored (or earlier) chunk, returned as
+        (duplicate point_id, stored point_id, metadata). Also returns the
+        fingerprints of the chunks to embed, indexed once they are stored.
+        Stored points in exclude are never matched.
+        """
+        if self.dedup_index is None or not chunks:
+            return chunks, [], {}
+
+        point_ids = [point_id for point_id, _, _ in chunks]
+        with timed("dedup"):
+            fingerprints = await asyncio.to_thread(
+                self.dedup_index.fingerprint_many, [content for _, content, _ in chunks]
+            )
+            matches = await asyncio.to_thread(self.dedup_index.match, point_ids, fingerprints, exclude)
+        # Signatures can outlive their point (e.g. a failed upsert): trust stored points only
+        stored = await self.vector_db.existing_ids(sorted({match for match in matches if match is not None}))
+
+        unique, duplicates, unique_fingerprints = [], [], {}
+        for chunk, fingerprint, match in zip(chunks, fingerprints, matches):
+            if match is not None and (match in stored or match in unique_fingerprints):
+                duplicates.append((chunk[0], match, chunk[2]))
+            else:
+                unique.append(chunk)
+                unique_fingerprints[chunk[0]] = fingerprint
+        return unique, duplicates, unique_fingerprints
+
+    async def _record_duplicates(
+        self,
+        stored: List[Tuple[str, str, dict]],
+        fingerprints: Dict[str, Fingerprint],
+        duplicates: List[Tuple[str, str, dict]]
+    ):
+        """
+        Indexes the fingerprints of newly stored chunks and attaches each
+        near-duplicate's metadata as a reference on the point it duplicates.
+        """
+        if self.dedup_index is None:
+            return
+        stored_ids = [point_id for point_id, _, _ in stored]
+        await asyncio.to_thread(self.dedup_index.add, stored_ids, [fingerprints[pid] for pid in stored_ids])
+        if duplicates:
+            await asyncio.to_thread(self.dedup_index.add_references, duplicates)
+        # Upserts replace the payload, so re-added chunks get their references back too
+        await self._sync_references({point_id for _, point_id, _ in duplicates} | set(stored_ids))
+
+    async def _reference_fields(self, point_ids: Set[str], include_empty: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        Payload fields describing the near-duplicates of each point: their
+        metadata ("references") and, for source filters, their sources.
+        """
+        if self.dedup_index is None or not point_ids:
+            return {}
+        references = await asyncio.to_thread(self.dedup_index.references, point_ids)
+        fields = {}
+        for point_id in point_ids:
+            if include_empty or point_id in references:
+                refs = references.get(point_id, [])
+                fields[point_id] = {
+                    "references": refs,
+                    REFERENCE_SOURCES_FIELD: sorted({ref.get("source") for ref in refs} - {None}),
+                }
+        return fields
+
+    async def _sync_references(self, point_ids: Set[str], include_empty: bool = False):
+        """
+        Writes the current references into the payload of the given points,
+        in the vector store and the lexical index.
+        """
+        fields = await self._reference_fields(point_ids, include_empty)
+        if not fields:
+            return
+        await self.vector_db.set_payloads(fields)
+        if self.lexical_index is not None:
+            await asyncio.to_thread(self.lexical_index.set_payloads, fields)
+
+    async def _index_lexical(self, chunks: List[Tuple[str, str, dict]]):
+        """
+        Adds (point_id, content, metadata) chunks to the BM25 index.
+        """
+        if self.lexical_index is None or not chunks:
+            return
+        # Same reference fields as the vector payload, so source filters agree
+        references = await self._reference_fields({point_id for point_id, _, _ in chunks})
+        await asyncio.to_thread(
+            self.lexical_index.add,
+            [point_id for point_id, _, _ in chunks],
+            [
+                {"content": content, **metadata, **references.get(point_id, {})}
+                for point_id, content, metadata in chunks
+            ]
+        )
+
+    async def _delete_points(self, point_ids: List[str]) -> List[str]:
+        """
+        Removes points from the vector store and the lexical index.
+        Returns the given IDs that were removed (referenced points are kept).
+        """
+        if not point_ids:
+            return []
+        removed = point_ids
+        if self.dedup_index is not None:
+            # Near-duplicates only drop their reference; referenced points stay
+            to_delete, changed = await asyncio.to_thread(self.dedup_index.release, point_ids)
+            await self._sync_references(changed, include_empty=True)
+            deleted = set(to_delete)
+            removed = [point_id for point_id in point_ids if point_id in deleted]
+            point_ids = to_delete
+            if not point_ids:
+                return removed
+        await self.vector_db.delete_points(point_ids)
+        if self.lexical_index is not None:
+            await asyncio.to_thread(self.lexical_index.delete, point_ids)
+        return removed
+
+    async def _embed_and_upsert(self, chunks: List[Tuple[str, str, dict]], wait: bool = True):
+        """
+        Embeds (point_id, content, metadata) chunks and upserts them.
+        """
+        # Generate Embeddings (new chunks only)
         try:
-            vectors = self.embeddings_model.embed_documents(texts_content)
+            vectors = await self._embed_with_cache([content for _, content, _ in chunks])
         except Exception as e:
             logger.error(f"❌ OpenAI Embedding failed: {e}")
             raise e
 
-        # 3. Store in Qdrant
+        # Store in Qdrant
         # We store the text content in the payload so we can retrieve it later
-        payloads = [
-            {"content": chunk.page_content, **chunk.metadata}
-            for chunk in chunks
+        with timed("upsert"):
+            await self.vector_db.upsert_vectors(
+                vectors=vectors,
+                payloads=[{"content": content, **metadata} for _, content, metadata in chunks],
+                ids=[point_id for point_id, _, _ in chunks],
+                wait=wait
+            )
+
+    async def process_batch(self, documents: List[Tuple[str, str, dict]]) -> Dict[str, Any]:
+        """
+        Bulk ingestion of (text, source_name, metadata) documents.
+        Chunks from all documents are packed into shared embedding batches and
+        upserted in large pipelined batches without waiting for indexing.
+        """
+        start = time.perf_counter()
+        logger.info(f"📚 Processing batch of {len(documents)} documents.")
+
+        # 1. Split every document
+        chunked = []
+        with timed("split"):
+            for text, source_name, metadata in documents:
+                chunk_metadata = {"source": source_name, **metadata}
+                chunked.append((
+                    source_name,
+                    [(text[start:end], chunk_metadata) for start, end in self.chunker.spans(text)]
+                ))
+
+        results = await self._ingest_many(chunked)
+        return self._batch_summary(results, time.perf_counter() - start)
+
+    async def process_pdf_archive(self, file: UploadFile) -> Dict[str, Any]:
+        """
+        Bulk ingestion of every PDF inside a zip upload.
+        PDFs are extracted to temp files and ingested in groups of
+        INGEST_BATCH_DOCUMENTS to keep memory bounded.
+        """
+        start = time.perf_counter()
+        path = await spool_upload(file, suffix=".zip")
+        results: List[Dict[str, Any]] = []
+        try:
+            try:
+                archive = zipfile.ZipFile(path)
+            except zipfile.BadZipFile:
+                raise ValueError("Uploaded file is not a valid zip archive")
+
+            with archive:
+                members = [
+                    info for info in archive.infolist()
+                    if not info.is_dir() and info.filename.lower().endswith(".pdf")
+                ]
+                logger.info(f"🗜️ Archive {file.filename} contains {len(members)} PDFs.")
+
+                group_size = settings.INGEST_BATCH_DOCUMENTS
+                for offset in range(0, len(members), group_size):
+                    group = []
+                    for info in members[offset:offset + group_size]:
+                        group.append((info.filename, await self._read_archived_pdf(archive, info)))
+                    results.extend(await self._ingest_many(group))
+        finally:
+            os.unlink(path)
+
+        return self._batch_summary(results, time.perf_counter() - start)
+
+    async def _read_archived_pdf(self, archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> List[Tuple[str, dict]]:
+        fd, pdf_path = tempfile.mkstemp(suffix=".pdf", prefix="docuforge_")
+        try:
+            with os.fdopen(fd, "wb") as out, archive.open(info) as member:
+                shutil.copyfileobj(member, out)
+
+            chunks = []
+            async for page_number, page_text in self.pdf_extractor.iter_pages(pdf_path):
+                metadata = {"source": info.filename, "type": "pdf_upload", "page": page_number}
+                with timed("split"):
+                    spans = list(self.chunker.spans(page_text))
+                chunks.extend((page_text[start:end], metadata) for start, end in spans)
+            return chunks
+        finally:
+            os.unlink(pdf_path)
+
+    async def _ingest_many(self, documents: List[Tuple[str, List[Tuple[str, dict]]]]) -> List[Dict[str, Any]]:
+        """
+        Diffs several documents against their manifests, then embeds and
+        upserts all of their new chunks together.
+        """
+        sources = [source_name for source_name, _ in documents]
+        if len(set(sources)) != len(sources):
+            raise ValueError("Each document in a batch needs a unique source_name")
+
+        # 1. Deterministic IDs + manifest diff per document
+        plans = []
+        candidates: List[str] = []
+        for source_name, chunks in documents:
+            previous = self.manifest.get_entries(source_name)
+            chunks_by_id: Dict[str, Tuple[str, dict]] = {}
+            for content, metadata in chunks:
+                chunks_by_id.setdefault(chunk_point_id(source_name, content), (content, metadata))
+            hashes = {pid: payload_hash(metadata) for pid, (_, metadata) in chunks_by_id.items()}
+            plans.append((source_name, len(chunks), previous, chunks_by_id, hashes))
+            candidates.extend(pid for pid in chunks_by_id if pid in previous)
+
+        # One existence check for the whole batch
+        stored_ids = await self.vector_db.existing_ids(candidates)
+
+        # Stored chunks whose metadata changed only need a new payload
+        stale = [
+            (pid, content, metadata)
+            for _, _, previous, chunks_by_id, hashes in plans
+            for pid, (content, metadata) in chunks_by_id.items()
+            if pid in stored_ids and previous[pid] != hashes[pid]
         ]
-        
-        self.vector_db.upsert_vectors(vectors=vectors, payloads=payloads)
-        
-        return {"status": "success", "chunks_processed": len(chunks)}
-    
+        stale_ids = {pid for pid, _, _ in stale}
+        await self._refresh_payloads(stale)
+
+        # 2. Pack new chunks from all documents into shared batches
+        # (near-duplicates, e.g. boilerplate shared across the documents, are skipped)
+        new_chunks = [
+            (pid, content, metadata)
+            for _, _, _, chunks_by_id, _ in plans
+            for pid, (content, metadata) in chunks_by_id.items()
+            if pid not in stored_ids
+        ]
+        # Edited chunks must not match the old versions they replace
+        replaced = {
+            pid
+            for _, _, previous, chunks_by_id, _ in plans
+            for pid in previous
+            if pid not in chunks_by_id
+        }
+        unique, duplicates, fingerprints = await self._dedupe(new_chunks, exclude=replaced)
+        duplicate_ids = {duplicate_id for duplicate_id, _, _ in duplicates}
+        size = settings.INGEST_UPSERT_BATCH_SIZE
+        groups = [unique[i:i + size] for i in range(0, len(unique), size)]
+
+        # 3. Pipeline: each group embeds then upserts while others are in flight
+        semaphore = asyncio.Semaphore(settings.INGEST_UPSERT_CONCURRENCY)
+
+        async def run_group(group):
+            async with semaphore:
+                await self._embed_and_upsert(group, wait=False)
+
+        await asyncio.gather(*(run_group(group) for group in groups))
+        await self._record_duplicates(unique, fingerprints, duplicates)
+        await self._index_lexical([
+            (pid, content, metadata)
+            for _, _, _, chunks_by_id, _ in plans
+            for pid, (content, metadata) in chunks_by_id.items()
+            if pid not in duplicate_ids
+        ])
+
+        # 4. Remove stale chunks and record manifests
+        results = []
+        for source_name, total, previous, chunks_by_id, hashes in plans:
+            if total == 0:
+                results.append({"source_name": source_name, "status": "skipped", "reason": "Text was empty"})
+                continue
+
+            current_ids = set(chunks_by_id)
+            removed_ids = await self._delete_points(sorted(set(previous) - current_ids))
+            self.manifest.replace(source_name, hashes)
+
+            updated = len(current_ids & stale_ids)
+            unchanged = len(current_ids & stored_ids) - updated
+            duplicated = len(current_ids & duplicate_ids)
+            results.append({
+                "source_name": source_name,
+                "status": "success",
+                "chunks_processed": total,
+                "added": len(current_ids) - unchanged - updated - duplicated,
+                "unchanged": unchanged,
+                "updated": updated,
+                "duplicates": duplicated,
+                "removed": len(removed_ids)
+            })
+        return results
+
+    @staticmethod
+    def _batch_summary(results: List[Dict[str, Any]], seconds: float) -> Dict[str, Any]:
+        totals = {
+            key: sum(r.get(key, 0) for r in results)
+            for key in ("chunks_processed", "added", "unchanged", "updated", "duplicates", "removed")
+        }
+        return {
+            "status": "success",
+            "documents": results,
+            "totals": {"documents": len(results), **totals},
+            "throughput": {
+                "seconds": round(seconds, 3),
+                "documents_per_second": round(len(results) / seconds, 2) if seconds else None,
+                "chunks_per_second": round(totals["chunks_processed"] / seconds, 2) if seconds else None,
+            }
+        }
+
+    async def _embed_with_cache(self, texts: List[str]) -> List[List[float]]:
+        """
+        Serves vectors from the embedding cache and only embeds the misses.
+        """
+        if self.embedding_cache is None:
+            with timed("embed"):
+                return await self.embedding_pipeline.embed_documents(texts)
+
+        model = self.embedding_pipeline.model_name
+        vectors = await asyncio.to_thread(self.embedding_cache.get_many, model, texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+
+        # Every batch we no longer need to send is one API call saved
+        saved_calls = len(self.embedding_pipeline.make_batches(texts)) - len(
+            self.embedding_pipeline.make_batches([texts[i] for i in missing])
+        )
+        self.embedding_cache.record_api_calls_saved(saved_calls)
+
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            start = time.perf_counter()
+            with timed("embed"):
+                new_vectors = await self.embedding_pipeline.embed_documents(missing_texts)
+            self.embedding_cache.record_embedding(len(missing_texts), time.perf_counter() - start)
+
+            await asyncio.to_thread(self.embedding_cache.put_many, model, missing_texts, new_vectors)
+            for i, vector in zip(missing, new_vectors):
+                vectors[i] = vector
+
+        logger.info(f"🗃️ Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses.")
+        return vectors
+
     async def process_pdf(self, file: UploadFile):
         """
-        Reads a PDF file stream, extracts text, and ingests it.
+        Streams a PDF upload through the pipeline page by page.
+        The upload is spooled to disk, pages are extracted lazily, and chunks
+        (tagged with their page number) are embedded in rolling batches.
+        Point IDs depend on the text only; when pages shift (e.g. a page is
+        inserted), unchanged chunks keep their vector and get the new page
+        number through the manifest's payload hash.
         """
         logger.info(f"📄 Reading PDF: {file.filename}")
         
+        path = await spool_upload(file)
         try:
-            # Read file content into memory
-            content = await file.read()
-            pdf_file = io.BytesIO(content)
-            
-            # Parse PDF
-            reader = pypdf.PdfReader(pdf_file)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-                
-            logger.info(f"✅ Extracted {len(text)} characters from PDF.")
-            
-            # Reuse existing logic
-            return await self.process_document(
-                text=text,
-                source_name=file.filename,
-                metadata={"type": "pdf_upload"}
-            )
+            pages_read = 0
+
+            async def chunk_stream():
+                nonlocal pages_read
+                # Extraction runs in the process pool, pages arrive in order
+                async for page_number, page_text in self.pdf_extractor.iter_pages(path):
+                    pages_read += 1
+                    with timed("split"):
+                        spans = list(self.chunker.spans(page_text))
+                    metadata = {"source": file.filename, "type": "pdf_upload", "page": page_number}
+                    for start, end in spans:
+                        yield page_text[start:end], metadata
+
+            result = await self._ingest_chunks(file.filename, chunk_stream())
+            logger.info(f"✅ Streamed {pages_read} pages from PDF.")
+            return result
         except Exception as e:
             logger.error(f"❌ PDF Processing failed: {e}")
             raise e
+        finally:
+            os.unlink(path)
 
-    async def search_knowledge_base(self, query: str, limit: int = 3):
+    async def search_knowledge_base(self, query: str, limit: int = 3, filters: Optional[Dict[str, Any]] = None):
         """
         Converts query to vector -> searches Qdrant.
+        Identifier queries are answered from the BM25 index first; with
+        SEARCH_MODE=hybrid, lexical and dense results are fused (RRF).
+        `filters` restricts every path to chunks with matching metadata.
+        Repeated (query, limit, filters) are served from the search cache.
         """
-        # 1. Embed Query
-        query_vector = self.embeddings_model.embed_query(query)
-        
-        # 2. Search DB
-        results = self.vector_db.search(query_vector, limit)
-        
-        # 3. Format Response
-        formatted_results = [
-            {
-                "content": res.payload.get("content"),
-                "source": res.payload.get("source"),
-                "score": res.score
-            }
-            for res in results
-        ]
-        return formatted_results
\ No newline at end of file
+        cache_key = (query, limit, filters_cache_key(filters))
+        generation = None
+        if self.search_cache is not None:
+            cached = self.search_cache.get(cache_key)
+            if cached is not None:
+                return list(cached)
+            # Writes during the search below invalidate its result too
+            generation = self.search_cache.generation
+
+        # 1. Identifier fast path: exact-term BM25, no embedding round trip
+        formatted_results = await self._lexical_fast_path(query, limit, filters)
+
+        # 2. Dense (or hybrid) search
+        if formatted_results is None:
+            if settings.SEARCH_MODE == "hybrid" and self.lexical_index is not None:
+                formatted_results = await self._hybrid_search(query, limit, filters)
+            else:
+                query_vector = await self._embed_query_cached(query)
+                with timed("vector_search"):
+                    results = await self.vector_db.search(query_vector, limit, filters)
+                formatted_results = [self._format_match(res.payload, res.score) for res in results]
+
+        if self.search_cache is not None:
+            self.search_cache.set(cache_key, formatted_results, generation)
+        return list(formatted_results)
+
+    async def search_many(
+        self,
+        queries: List[str],
+        limit: int = 3,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        search_knowledge_base for many queries at once (e.g. every section
+        of a manual). Uncached queries are embedded in one call and searched
+        with one batched vector query. Results are returned in query order.
+        """
+        filters_key = filters_cache_key(filters)
+        results: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
+        generation = self.search_cache.generation if self.search_cache is not None else None
+
+        # 1. Search cache and identifier fast path, per query
+        computed: List[int] = []
+        for i, query in enumerate(queries):
+            if self.search_cache is not None:
+                cached = self.search_cache.get((query, limit, filters_key))
+                if cached is not None:
+                    results[i] = list(cached)
+                    continue
+            computed.append(i)
+            results[i] = await self._lexical_fast_path(query, limit, filters)
+
+        # 2. One embedding call and one batched vector query for the rest
+        pending = [i for i in computed if results[i] is None]
+        if pending:
+            hybrid = settings.SEARCH_MODE == "hybrid" and self.lexical_index is not None
+            candidates = max(limit, settings.HYBRID_CANDIDATES) if hybrid else limit
+
+            vectors = await self._embed_queries_cached([queries[i] for i in pending])
+            with timed("vector_search"):
+                dense_results = await self.vector_db.search_batch(vectors, candidates, filters)
+
+            if hybrid:
+                with timed("lexical_search"):
+                    lexical_hits = await asyncio.gather(*(
+                        asyncio.to_thread(self.lexical_index.search, queries[i], candidates, (), filters)
+                        for i in pending
+                    ))
+                for i, points, hits in zip(pending, dense_results, lexical_hits):
+                    results[i] = self._fuse(points, hits, limit)
+            else:
+                for i, points in zip(pending, dense_results):
+                    results[i] = [self._format_match(res.payload, res.score) for res in points]
+
+        if self.search_cache is not None:
+            for i in computed:
+                self.search_cache.set((queries[i], limit, filters_key), results[i], generation)
+        logger.info(f"🔍 Batch search: {len(queries)} queries, {len(pending)} embedded in one call.")
+        return [list(result) for result in results]
+
+    async def _lexical_fast_path(
+        self,
+        query: str,
+        limit: int,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Exact-term BM25 results for identifier queries (e.g. part numbers),
+        or None when the query is not one or nothing matched.
+        """
+        if self.lexical_index is None or not is_identifier_query(query, settings.LEXICAL_FASTPATH_MAX_TERMS):
+            return None
+
+        with timed("lexical_search"):
+            hits = await asyncio.to_thread(
+                self.lexical_index.search, query, limit, identifier_terms(query), filters
+            )
+        if not hits:
+            return None
+        logger.info(f"🔤 Lexical fast path answered '{query}' with {len(hits)} results.")
+        return [self._format_match(payload, score) for _, score, payload in hits]
+
+    async def _hybrid_search(self, query: str, limit: int, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Runs dense and BM25 retrieval concurrently and fuses the rankings
+        with reciprocal rank fusion. Scores are RRF scores.
+        """
+        candidates = max(limit, settings.HYBRID_CANDIDATES)
+
+        async def dense():
+            query_vector = await self._embed_query_cached(query)
+            with timed("vector_search"):
+                return await self.vector_db.search(query_vector, candidates, filters)
+
+        async def lexical():
+            with timed("lexical_search"):
+                return await asyncio.to_thread(self.lexical_index.search, query, candidates, (), filters)
+
+        dense_results, lexical_hits = await asyncio.gather(dense(), lexical())
+        return self._fuse(dense_results, lexical_hits, limit)
+
+    def _fuse(self, dense_results: List[Any], lexical_hits: List[Tuple[str, float, dict]], limit: int) -> List[Dict[str, Any]]:
+        """
+        Reciprocal rank fusion of dense points and BM25 hits.
+        """
+        payloads: Dict[str, dict] = {}
+        for point_id, _, payload in lexical_hits:
+            payloads[point_id] = payload
+        for res in dense_results:
+            payloads[str(res.id)] = res.payload
+
+        fused = reciprocal_rank_fusion(
+            [[str(res.id) for res in dense_results], [point_id for point_id, _, _ in lexical_hits]],
+            k=settings.HYBRID_RRF_K
+        )
+        return [self._format_match(payloads[point_id], score) for point_id, score in fused[:limit]]
+
+    @staticmethod
+    def _format_match(payload: dict, score: float) -> Dict[str, Any]:
+        match = {
+            "content": payload.get("content"),
+            "source": payload.get("source"),
+            "score": score
+        }
+        # Other sources containing (nearly) the same text
+        if payload.get("references"):
+            match["references"] = sorted({ref.get("source") for ref in payload["references"]} - {None})
+        return match
+
+    async def embed_query(self, query: str) -> List[float]:
+        """
+        Query embedding via the coalescing pipeline and the query vector cache.
+        """
+        return await self._embed_query_cached(query)
+
+    async def _embed_query_cached(self, query: str) -> List[float]:
+        if self.query_vector_cache is None:
+            with timed("embed_query"):
+                return await self.embedding_pipeline.embed_query(query)
+
+        vector = self.query_vector_cache.get(query)
+        if vector is None:
+            with timed("embed_query"):
+                vector = await self.embedding_pipeline.embed_query(query)
+            self.query_vector_cache.set(query, vector)
+        return vector
+
+    async def _embed_queries_cached(self, queries: List[str]) -> List[List[float]]:
+        """
+        Query vectors for many queries; the uncached ones share one
+        embedding call (micro-batched by the pipeline).
+        """
+        vectors: List[Optional[List[float]]] = [None] * len(queries)
+        if self.query_vector_cache is not None:
+            vectors = [self.query_vector_cache.get(query) for query in queries]
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            with timed("embed_query"):
+                new_vectors = await self.embedding_pipeline.embed_documents(
+                    [queries[i] for i in missing], priority=current_priority()
+                )
+            for i, vector in zip(missing, new_vectors):
+                vectors[i] = vector
+                if self.query_vector_cache is not None:
+                    self.query_vector_cache.set(queries[i], vector)
+        return vectors
\ No newline at end of file
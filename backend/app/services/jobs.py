@@ -0,0 +1,147 @@
+import asyncio
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.logging import logger
+from app.models.job import JobRecord, utcnow
+
+# A handler receives the job payload and a progress callback, returns the result
+ProgressCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+JobHandler = Callable[[Dict[str, Any], ProgressCallback], Awaitable[Dict[str, Any]]]
+
+
+class BaseJobQueue(ABC):
+    """
+    Pluggable job backend: a FIFO of job IDs plus storage for job records.
+    An external implementation (Redis, SQS, ...) only needs these methods.
+    """
+
+    @abstractmethod
+    async def enqueue(self, job: JobRecord):
+        """Persists the record and makes the job available to workers."""
+
+    @abstractmethod
+    async def dequeue(self) -> JobRecord:
+        """Waits for and returns the next queued job."""
+
+    @abstractmethod
+    async def save(self, job: JobRecord):
+        """Persists an updated record."""
+
+    @abstractmethod
+    async def load(self, job_id: str) -> Optional[JobRecord]:
+        """Returns the record, or None if unknown (or expired)."""
+
+
+class InMemoryJobQueue(BaseJobQueue):
+    """
+    Single-process backend with no external services.
+    Keeps at most `max_retained` records, dropping the oldest finished jobs first.
+    """
+
+    def __init__(self, max_retained: int = 1000):
+        self.max_retained = max_retained
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._records: "OrderedDict[str, JobRecord]" = OrderedDict()
+
+    async def enqueue(self, job: JobRecord):
+        await self.save(job)
+        await self._queue.put(job.job_id)
+
+    async def dequeue(self) -> JobRecord:
+        while True:
+            job_id = await self._queue.get()
+            job = self._records.get(job_id)
+            if job is not None:
+                return job
+
+    async def save(self, job: JobRecord):
+        self._records[job.job_id] = job
+        self._trim()
+
+    async def load(self, job_id: str) -> Optional[JobRecord]:
+        return self._records.get(job_id)
+
+    def _trim(self):
+        overflow = len(self._records) - self.max_retained
+        if overflow <= 0:
+            return
+        finished = [
+            job_id for job_id, job in self._records.items()
+            if job.status in ("succeeded", "failed")
+        ]
+        for job_id in finished[:overflow]:
+            del self._records[job_id]
+
+
+class JobManager:
+    """
+    Runs jobs from a queue backend on a fixed pool of in-process workers.
+    """
+
+    def __init__(self, queue: BaseJobQueue, workers: int = 2):
+        self.queue = queue
+        self.workers = workers
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def register(self, kind: str, handler: JobHandler):
+        self._handlers[kind] = handler
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"👷 Started {self.workers} job workers.")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, kind: str, payload: Dict[str, Any]) -> JobRecord:
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+
+        job = JobRecord(job_id=str(uuid.uuid4()), kind=kind, payload=payload)
+        await self.queue.enqueue(job)
+        logger.info(f"📥 Queued {kind} job {job.job_id}")
+        return job
+
+    async def get(self, job_id: str) -> Optional[JobRecord]:
+        return await self.queue.load(job_id)
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self.queue.dequeue()
+            await self._run(job)
+
+    async def _run(self, job: JobRecord):
+        job.status = "running"
+        job.started_at = utcnow()
+        await self.queue.save(job)
+
+        async def report(progress: Dict[str, Any]):
+            job.progress = progress
+            await self.queue.save(job)
+
+        try:
+            job.result = await self._handlers[job.kind](job.payload, report)
+            job.status = "succeeded"
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.error = "Job cancelled during shutdown"
+            raise
+        except Exception as e:
+            logger.error(f"❌ Job {job.job_id} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = utcnow()
+            await self.queue.save(job)
@@ -0,0 +1,203 @@
+import json
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.services.filters import sqlite_filter_clause
+
+# Same token rule as FTS5's unicode61 tokenizer (letters and digits; '_' splits)
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+# Part numbers and spec codes mix letters and digits: HMP155, PTU300, 4-20mA
+IDENTIFIER_PATTERN = re.compile(r"^(?=.*[a-z])(?=.*\d)[a-z\d]{3,}$")
+
+
+def query_terms(query: str) -> List[str]:
+    """
+    Lower-cased, de-duplicated query tokens in their original order.
+    """
+    return list(dict.fromkeys(TOKEN_PATTERN.findall(query.lower())))
+
+
+def identifier_terms(query: str) -> List[str]:
+    """
+    Tokens of the query that look like product or part identifiers.
+    """
+    return [term for term in query_terms(query) if IDENTIFIER_PATTERN.match(term)]
+
+
+def is_identifier_query(query: str, max_terms: int = 6) -> bool:
+    """
+    True for short queries that name at least one identifier, e.g.
+    "HMP155" or "PTU300 supply voltage". These are answered lexically.
+    """
+    terms = query_terms(query)
+    return 0 < len(terms) <= max_terms and bool(identifier_terms(query))
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuses several ranked ID lists: score(d) = sum(1 / (k + rank)).
+    Returns (id, score) pairs, best first.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over chunk text (SQLite FTS5), kept next to the
+    vector store. Answers exact-term queries without an embedding call.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._write_listeners: List[Callable[[], None]] = []
+
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY,
+                point_id TEXT UNIQUE NOT NULL,
+                payload TEXT NOT NULL
+            )
+            """
+        )
+        # rowid of the FTS table mirrors chunks.id
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(content, tokenize='unicode61')"
+        )
+        self._conn.commit()
+
+    def add_write_listener(self, callback: Callable[[], None]):
+        """
+        Registers a callback that runs after the index changes.
+        """
+        self._write_listeners.append(callback)
+
+    def _notify_write(self):
+        for callback in self._write_listeners:
+            callback()
+
+    def add(self, point_ids: List[str], payloads: List[Dict[str, Any]]) -> int:
+        """
+        Indexes chunks that are not in the index yet and refreshes the
+        payload of those that are (point IDs are content hashes, so an
+        existing ID already has the same text, but its metadata may differ).
+        Returns the number of chunks added.
+        """
+        added = updated = 0
+        with self._lock:
+            for point_id, payload in zip(point_ids, payloads):
+                encoded = json.dumps(payload)
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO chunks (point_id, payload) VALUES (?, ?)", (point_id, encoded)
+                )
+                if cursor.rowcount:
+                    self._conn.execute(
+                        "INSERT INTO chunks_fts (rowid, content) VALUES (?, ?)",
+                        (cursor.lastrowid, payload.get("content") or "")
+                    )
+                    added += 1
+                else:
+                    updated += self._conn.execute(
+                        "UPDATE chunks SET payload = ? WHERE point_id = ? AND payload != ?",
+                        (encoded, point_id, encoded)
+                    ).rowcount
+            self._conn.commit()
+
+        if added or updated:
+            self._notify_write()
+        return added
+
+    def set_payloads(self, payloads: Dict[str, Dict[str, Any]]):
+        """
+        Merges payload fields into indexed chunks (point ID -> fields),
+        e.g. the sources referencing a near-duplicate chunk.
+        """
+        if not payloads:
+            return
+        with self._lock:
+            for point_id, fields in payloads.items():
+                row = self._conn.execute("SELECT payload FROM chunks WHERE point_id = ?", (point_id,)).fetchone()
+                if row:
+                    self._conn.execute(
+                        "UPDATE chunks SET payload = ? WHERE point_id = ?",
+                        (json.dumps({**json.loads(row[0]), **fields}), point_id)
+                    )
+            self._conn.commit()
+        self._notify_write()
+
+    def delete(self, point_ids: List[str]):
+        if not point_ids:
+            return
+        with self._lock:
+            for start in range(0, len(point_ids), 500):
+                batch = point_ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                self._conn.execute(
+                    f"DELETE FROM chunks_fts WHERE rowid IN "
+                    f"(SELECT id FROM chunks WHERE point_id IN ({placeholders}))",
+                    batch
+                )
+                self._conn.execute(f"DELETE FROM chunks WHERE point_id IN ({placeholders})", batch)
+            self._conn.commit()
+        self._notify_write()
+
+    def search(
+        self,
+        query: str,
+        limit: int = 3,
+        required: Sequence[str] = (),
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """
+        BM25-ranked (point_id, score, payload) matches for any query term.
+        Terms in `required` must all appear in a match and `filters` restrict
+        matches by payload metadata. Higher scores are better.
+        """
+        terms = query_terms(query)
+        if not terms or limit <= 0:
+            return []
+
+        # Tokens are alphanumeric, so quoting them is enough to escape FTS syntax
+        match = " OR ".join(f'"{term}"' for term in terms)
+        if required:
+            match = " AND ".join(f'"{term}"' for term in required) + f" AND ({match})"
+
+        clause, params = sqlite_filter_clause(filters, "c.payload")
+        where = f"chunks_fts MATCH ? AND {clause}" if clause else "chunks_fts MATCH ?"
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT c.point_id, bm25(chunks_fts) AS rank, c.payload
+                FROM chunks_fts JOIN chunks c ON c.id = chunks_fts.rowid
+                WHERE {where}
+                ORDER BY rank
+                LIMIT ?
+                """,
+                (match, *params, limit)
+            ).fetchall()
+
+        # FTS5 reports BM25 as a negative number (lower is better)
+        return [(point_id, -rank, json.loads(payload)) for point_id, rank, payload in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
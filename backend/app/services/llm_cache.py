@@ -0,0 +1,219 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging import logger
+
+
+def prompt_key(model: str, temperature: Any, messages: List[Any]) -> str:
+    """
+    SHA-256 over (model, temperature, role + content of every message).
+    """
+    payload = json.dumps(
+        {
+            "model": str(model),
+            "temperature": str(temperature),
+            "messages": [[getattr(m, "type", ""), getattr(m, "content", str(m))] for m in messages],
+        },
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Persistent cache of LLM completions (SQLite), keyed by prompt_key().
+    LRU-bounded; cleared whenever the knowledge base changes so no answer
+    outlives the documents it was written from.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10_000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                last_access INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)"
+        )
+        self._conn.commit()
+
+        row = self._conn.execute("SELECT MAX(last_access) FROM responses").fetchone()
+        self._clock = row[0] or 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (self._tick(), key))
+            self._conn.commit()
+        self.hits += 1
+        return row[0]
+
+    def set(self, key: str, response: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, last_access) VALUES (?, ?, ?)",
+                (key, response, self._tick())
+            )
+            overflow = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,)
+                )
+            self._conn.commit()
+
+    def clear(self):
+        """
+        Drops every response. Registered as a knowledge-base write listener.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+        self.invalidations += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# One response cache per process, created on first use
+_llm_cache: Optional[LLMResponseCache] = None
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """
+    Shared LLM response cache, or None when LLM_CACHE_ENABLED is off.
+    """
+    global _llm_cache
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache(settings.LLM_CACHE_PATH, max_entries=settings.LLM_CACHE_MAX_ENTRIES)
+    return _llm_cache
+
+
+def close_llm_cache():
+    global _llm_cache
+    if _llm_cache is not None:
+        _llm_cache.close()
+        _llm_cache = None
+
+
+class SemanticCache:
+    """
+    In-process cache of finished workflow results, looked up by topic
+    embedding. A hit needs cosine similarity >= `threshold` to a cached topic
+    AND the same retrieved context (by hash). Cleared on knowledge-base writes.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 256):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        # key -> (normalized topic vector, context hash, result)
+        self._entries: "OrderedDict[int, Tuple[np.ndarray, str, Dict[str, Any]]]" = OrderedDict()
+        self._next_key = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        return array / (np.linalg.norm(array) or 1.0)
+
+    def get(self, topic_vector: List[float], context_hash: str) -> Optional[Dict[str, Any]]:
+        query = self._normalize(topic_vector)
+        best_key, best_score = None, self.threshold
+        for key, (vector, entry_hash, _) in self._entries.items():
+            if entry_hash != context_hash:
+                continue
+            score = float(vector @ query)
+            if score >= best_score:
+                best_key, best_score = key, score
+
+        if best_key is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(best_key)
+        self.hits += 1
+        logger.info(f"🧠 Semantic cache hit (similarity {best_score:.3f}).")
+        return self._entries[best_key][2]
+
+    def set(self, topic_vector: List[float], context_hash: str, result: Dict[str, Any]):
+        self._entries[self._next_key] = (self._normalize(topic_vector), context_hash, result)
+        self._next_key += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Drops every entry. Registered as a knowledge-base write listener.
+        """
+        if self._entries:
+            self._entries.clear()
+        self.invalidations += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
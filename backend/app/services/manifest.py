@@ -0,0 +1,90 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.services.embedding_cache import content_hash
+
+# Fixed namespace so chunk IDs are stable across processes and restarts
+CHUNK_NAMESPACE = uuid.UUID("6f1c2a52-8d1e-4f4b-9a57-2f0c1d3e9b10")
+
+
+def chunk_point_id(source_name: str, content: str) -> str:
+    """
+    Deterministic Qdrant point ID for a chunk of a given source.
+    Re-ingesting identical text yields the same ID, so upserts overwrite
+    instead of duplicating.
+    """
+    return str(uuid.uuid5(CHUNK_NAMESPACE, f"{source_name}\x00{content_hash(content)}"))
+
+
+def payload_hash(metadata: Dict[str, Any]) -> str:
+    """
+    Digest of a chunk's metadata (key order does not matter). Stored in the
+    manifest so a re-ingest with new metadata refreshes unchanged chunks.
+    """
+    encoded = json.dumps(metadata, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+class SourceManifest:
+    """
+    Records which point IDs belong to each source document, with the
+    payload hash each was stored with (SQLite). Used to diff a re-ingested
+    document against what is already stored.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS source_chunks (
+                source TEXT NOT NULL,
+                point_id TEXT NOT NULL,
+                payload_hash TEXT,
+                PRIMARY KEY (source, point_id)
+            )
+            """
+        )
+        # Manifests written before payload hashes were tracked: a NULL hash
+        # never matches, so those chunks get their payload refreshed once
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(source_chunks)")}
+        if "payload_hash" not in columns:
+            self._conn.execute("ALTER TABLE source_chunks ADD COLUMN payload_hash TEXT")
+        self._conn.commit()
+
+    def get_entries(self, source_name: str) -> Dict[str, Optional[str]]:
+        """
+        Point ID -> payload hash for every chunk of a source.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT point_id, payload_hash FROM source_chunks WHERE source = ?", (source_name,)
+            ).fetchall()
+        return dict(rows)
+
+    def replace(self, source_name: str, entries: Dict[str, str]):
+        """
+        Overwrites the manifest entry for a source (point ID -> payload hash).
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM source_chunks WHERE source = ?", (source_name,))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO source_chunks (source, point_id, payload_hash) VALUES (?, ?, ?)",
+                [(source_name, pid, digest) for pid, digest in entries.items()]
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,117 @@
+import os
+import asyncio
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+
+import pypdf
+from fastapi import UploadFile
+
+from app.core.metrics import timed
+
+# Read uploads in 1 MiB blocks so the whole file is never held in memory
+SPOOL_BLOCK_SIZE = 1024 * 1024
+
+
+async def spool_upload(file: UploadFile, suffix: str = ".pdf") -> str:
+    """
+    Copies an upload to a named temporary file and returns its path.
+    The caller is responsible for deleting the file.
+    """
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix="docuforge_")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                block = await file.read(SPOOL_BLOCK_SIZE)
+                if not block:
+                    break
+                out.write(block)
+    except Exception:
+        os.unlink(path)
+        raise
+    return path
+
+
+def iter_pdf_pages(path: str) -> Iterator[Tuple[int, str]]:
+    """
+    Lazily yields (page_number, text) for each page, 1-indexed.
+    Only one page's text is materialized at a time.
+    """
+    reader = pypdf.PdfReader(path)
+    for number, page in enumerate(reader.pages, start=1):
+        yield number, page.extract_text() or ""
+
+
+def count_pages(path: str) -> int:
+    return len(pypdf.PdfReader(path).pages)
+
+
+def extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    """
+    Extracts text for pages [start, stop) (0-indexed).
+    Top-level so it can be pickled into worker processes.
+    """
+    reader = pypdf.PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+class PdfExtractor:
+    """
+    Parallel PDF text extraction.
+
+    Page ranges are parsed in a ProcessPoolExecutor (pypdf is pure-Python and
+    CPU-bound) and yielded back in page order. Only a bounded window of
+    ranges is in flight, so memory stays flat for large manuals.
+    With `workers=0`, ranges run in a thread instead (no extra processes).
+    """
+
+    def __init__(self, workers: int = 2, pages_per_task: int = 8):
+        self.workers = workers
+        self.pages_per_task = max(1, pages_per_task)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        if self._executor is None:
+            # 'spawn' avoids forking a process that already runs threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def iter_pages(self, path: str) -> AsyncIterator[Tuple[int, str]]:
+        """
+        Yields (page_number, text) in order, 1-indexed.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        total = await asyncio.to_thread(count_pages, path)
+
+        ranges = [
+            (start, min(start + self.pages_per_task, total))
+            for start in range(0, total, self.pages_per_task)
+        ]
+        window = max(1, self.workers) * 2
+        pending: List[asyncio.Future] = []
+        next_range = 0
+
+        while next_range < len(ranges) or pending:
+            # Keep the pool busy without buffering the whole document
+            while next_range < len(ranges) and len(pending) < window:
+                start, stop = ranges[next_range]
+                pending.append(loop.run_in_executor(executor, extract_page_range, path, start, stop))
+                next_range += 1
+
+            start, _ = ranges[next_range - len(pending)]
+            with timed("pdf_extract"):
+                texts = await pending.pop(0)
+            for offset, text in enumerate(texts):
+                yield start + offset + 1, text
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
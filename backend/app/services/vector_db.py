@@ -1,93 +1,358 @@
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient
 from qdrant_client.http import models
-from qdrant_client.http.models import Filter, FieldCondition, MatchValue
 from app.core.config import settings
 from app.core.logging import logger
-from typing import List, Dict, Any, Optional
+from app.models.document import normalize_filters
+from app.services.filters import index_fields, qdrant_filter, payload_schema
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Callable, Set, Tuple
+import asyncio
 import uuid
 
-class VectorDBService:
+@dataclass
+class CollectionConfig:
     """
-    Service class for interacting with Qdrant Vector Database.
+    Tunable Qdrant collection and search settings.
+    Defaults come from the QDRANT_* environment settings.
     """
+    name: Optional[str] = None
+    vector_size: Optional[int] = None
+    hnsw_m: Optional[int] = None
+    hnsw_ef_construct: Optional[int] = None
+    search_ef: Optional[int] = None
+    on_disk_vectors: Optional[bool] = None
+    quantization: Optional[str] = None
+    quantization_always_ram: Optional[bool] = None
+    rescore: Optional[bool] = None
+    oversampling: Optional[float] = None
 
-    def __init__(self):
-        # Initialize the client
-        self.client = QdrantClient(
-            host=settings.QDRANT_HOST,
-            port=settings.QDRANT_PORT
-        )
-        self.collection_name = "vaisala_docs"
-        self.vector_size = 1536 
-        
-        self._ensure_collection_exists()
-
-    def _ensure_collection_exists(self):
-        try:
-            collections = self.client.get_collections()
-            exists = any(c.name == self.collection_name for c in collections.collections)
+    def __post_init__(self):
+        defaults = {
+            "name": settings.QDRANT_COLLECTION,
+            "vector_size": settings.QDRANT_VECTOR_SIZE,
+            "hnsw_m": settings.QDRANT_HNSW_M,
+            "hnsw_ef_construct": settings.QDRANT_HNSW_EF_CONSTRUCT,
+            "search_ef": settings.QDRANT_SEARCH_EF,
+            "on_disk_vectors": settings.QDRANT_ON_DISK_VECTORS,
+            "quantization": settings.QDRANT_QUANTIZATION,
+            "quantization_always_ram": settings.QDRANT_QUANTIZATION_ALWAYS_RAM,
+            "rescore": settings.QDRANT_RESCORE,
+            "oversampling": settings.QDRANT_OVERSAMPLING,
+        }
+        for field_name, value in defaults.items():
+            if getattr(self, field_name) is None:
+                setattr(self, field_name, value)
 
-            if not exists:
-                logger.info(f"📦 Collection '{self.collection_name}' not found. Creating...")
-                self.client.create_collection(
-                    collection_name=self.collection_name,
-                    vectors_config=models.VectorParams(
-                        size=self.vector_size,
-                        distance=models.Distance.COSINE
-                    )
+    def create_params(self) -> Dict[str, Any]:
+        """
+        Keyword arguments for `create_collection`.
+        """
+        params: Dict[str, Any] = {
+            "collection_name": self.name,
+            "vectors_config": models.VectorParams(
+                size=self.vector_size,
+                distance=models.Distance.COSINE,
+                on_disk=self.on_disk_vectors
+            ),
+            "hnsw_config": models.HnswConfigDiff(
+                m=self.hnsw_m,
+                ef_construct=self.hnsw_ef_construct
+            ),
+        }
+        if self.quantization == "int8":
+            params["quantization_config"] = models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8,
+                    always_ram=self.quantization_always_ram
                 )
-                logger.info(f"✅ Collection '{self.collection_name}' created successfully.")
-            else:
-                logger.info(f"✅ Connected to existing collection: '{self.collection_name}'")
-        except Exception as e:
-            logger.error(f"❌ Failed to initialize Qdrant collection: {e}")
-            raise e
+            )
+        return params
+
+    def search_params(self) -> models.SearchParams:
+        quantization = None
+        if self.quantization == "int8":
+            # Search the int8 copy, then rescore the oversampled candidates
+            # against the original float32 vectors.
+            quantization = models.QuantizationSearchParams(
+                rescore=self.rescore,
+                oversampling=self.oversampling
+            )
+        return models.SearchParams(hnsw_ef=self.search_ef, quantization=quantization)
+
+
+def _client_kwargs() -> Dict[str, Any]:
+    # QDRANT_LOCATION (":memory:" or a directory) selects Qdrant's local mode
+    if settings.QDRANT_LOCATION:
+        return {"location": settings.QDRANT_LOCATION}
+    return {"host": settings.QDRANT_HOST, "port": settings.QDRANT_PORT}
+
+
+class BaseVectorStore:
+    """
+    State shared by all vector store backends: collection config and
+    write listeners.
+    """
+
+    def __init__(self, config: Optional[CollectionConfig] = None):
+        self.config = config or CollectionConfig()
+        self.collection_name = self.config.name
+        self.vector_size = self.config.vector_size
+
+        # Callbacks fired after every write (used to invalidate read caches)
+        self._write_listeners: List[Callable[[], None]] = []
+        # Payload fields known to be indexed (created on first filtered use)
+        self._indexed_fields: Set[str] = set()
+
+    def add_write_listener(self, callback: Callable[[], None]):
+        """
+        Registers a callback that runs after the collection changes.
+        """
+        self._write_listeners.append(callback)
 
-    def upsert_vectors(self, vectors: List[List[float]], payloads: List[Dict[str, Any]]):
-        points = [
+    def _notify_write(self):
+        for callback in self._write_listeners:
+            callback()
+
+    def _missing_payload_indexes(self, filters: Optional[Dict[str, Any]]) -> List[Tuple[str, Any]]:
+        """
+        (field, schema) pairs for filtered fields that have no index yet.
+        """
+        return [
+            (field, payload_schema(values))
+            for key, values in normalize_filters(filters).items()
+            for field in index_fields(key)
+            if field not in self._indexed_fields
+        ]
+
+    @staticmethod
+    def _default_payload_indexes() -> List[Tuple[str, Any]]:
+        return [
+            (field, models.PayloadSchemaType.KEYWORD)
+            for key in settings.QDRANT_PAYLOAD_INDEXES
+            for field in index_fields(key)
+        ]
+
+    def _build_points(self, vectors, payloads, ids) -> List[models.PointStruct]:
+        # Callers should pass deterministic IDs; random ones are a fallback
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in vectors]
+
+        return [
             models.PointStruct(
-                id=str(uuid.uuid4()),
+                id=point_id,
                 vector=vector,
                 payload=payload
             )
-            for vector, payload in zip(vectors, payloads)
+            for point_id, vector, payload in zip(ids, vectors, payloads)
         ]
-        
-        self.client.upsert(
+
+
+class AsyncVectorDBService(BaseVectorStore):
+    """
+    Non-blocking Qdrant service built on AsyncQdrantClient. The collection
+    is created lazily on first use, so construction never blocks.
+    """
+
+    def __init__(self, config: Optional[CollectionConfig] = None, client: Optional[AsyncQdrantClient] = None):
+        super().__init__(config)
+        self.client = client or AsyncQdrantClient(**_client_kwargs())
+        self._ready = False
+        self._ready_lock: Optional[asyncio.Lock] = None
+
+    async def ensure_ready(self):
+        """
+        Creates the collection if needed (once per service).
+        """
+        if self._ready:
+            return
+        if self._ready_lock is None:
+            self._ready_lock = asyncio.Lock()
+
+        async with self._ready_lock:
+            if self._ready:
+                return
+            try:
+                if not await self.client.collection_exists(self.collection_name):
+                    logger.info(f"📦 Collection '{self.collection_name}' not found. Creating...")
+                    await self.client.create_collection(**self.config.create_params())
+                    logger.info(f"✅ Collection '{self.collection_name}' created successfully.")
+                else:
+                    logger.info(f"✅ Connected to existing collection: '{self.collection_name}'")
+            except Exception as e:
+                logger.error(f"❌ Failed to initialize Qdrant collection: {e}")
+                raise e
+            await self._ensure_payload_indexes(self._default_payload_indexes())
+            self._ready = True
+
+    async def _ensure_payload_indexes(self, fields: List[Tuple[str, Any]]):
+        """
+        Creates payload indexes so filtered searches stay fast as the
+        collection grows. A failure only costs speed, never correctness.
+        """
+        for field_name, schema in fields:
+            try:
+                await self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=schema
+                )
+                logger.info(f"🗂️ Payload index ready on '{field_name}'.")
+            except Exception as e:
+                logger.warning(f"⚠️ Could not create payload index on '{field_name}': {e}")
+            self._indexed_fields.add(field_name)
+
+    async def upsert_vectors(
+        self,
+        vectors: List[List[float]],
+        payloads: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None,
+        wait: bool = True
+    ):
+        """
+        Upserts points. With wait=False Qdrant acknowledges before indexing,
+        which lets bulk loads pipeline several batches.
+        """
+        await self.ensure_ready()
+        points = self._build_points(vectors, payloads, ids)
+
+        await self.client.upsert(
             collection_name=self.collection_name,
-            points=points
+            points=points,
+            wait=wait
         )
         logger.info(f"💾 Upserted {len(points)} chunks into Qdrant.")
+        self._notify_write()
+
+    async def delete_points(self, ids: List[str]):
+        """
+        Removes points by ID (e.g. chunks that disappeared from a document).
+        """
+        if not ids:
+            return
+
+        await self.ensure_ready()
+        await self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.PointIdsList(points=ids)
+        )
+        logger.info(f"🗑️ Deleted {len(ids)} stale chunks from Qdrant.")
+        self._notify_write()
+
+    async def set_payloads(self, payloads: Dict[str, Dict[str, Any]], overwrite: bool = False):
+        """
+        Merges payload fields into existing points (point ID -> fields),
+        e.g. the references of near-duplicate chunks. With `overwrite`, the
+        fields replace the whole payload (e.g. after a metadata change).
+        """
+        if not payloads:
+            return
+
+        await self.ensure_ready()
+        if overwrite:
+            operations = [
+                models.OverwritePayloadOperation(overwrite_payload=models.SetPayload(payload=payload, points=[point_id]))
+                for point_id, payload in payloads.items()
+            ]
+        else:
+            operations = [
+                models.SetPayloadOperation(set_payload=models.SetPayload(payload=payload, points=[point_id]))
+                for point_id, payload in payloads.items()
+            ]
+        await self.client.batch_update_points(collection_name=self.collection_name, update_operations=operations)
+        self._notify_write()
+
+    async def existing_ids(self, ids: List[str]) -> Set[str]:
+        """
+        Returns the subset of `ids` that are actually stored in the collection.
+        """
+        if not ids:
+            return set()
+
+        await self.ensure_ready()
+        points = await self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=ids,
+            with_payload=False,
+            with_vectors=False
+        )
+        return {str(point.id) for point in points}
 
-    def search(self, vector: List[float], limit: int = 3) -> List[Any]:
+    async def search(self, vector: List[float], limit: int = 3, filters: Optional[Dict[str, Any]] = None) -> List[Any]:
         """
         Search for similar vectors in the collection using query_points.
+        `filters` restricts results by payload metadata (see normalize_filters).
         """
+        await self.ensure_ready()
+        await self._ensure_payload_indexes(self._missing_payload_indexes(filters))
         try:
-            # Use query_points with vector query
-            results = self.client.query_points(
+            results = await self.client.query_points(
                 collection_name=self.collection_name,
                 query=vector,
+                query_filter=qdrant_filter(filters),
                 limit=limit,
+                search_params=self.config.search_params(),
                 with_payload=True,
                 with_vectors=False
             )
-            
-            # Return the raw points - ingestion.py expects objects with .payload attribute
             logger.info(f"🔍 Found {len(results.points)} results from vector search")
             return results.points
-            
+
         except Exception as e:
             logger.error(f"❌ Search failed: {e}")
             raise e
 
-    def _format_search_results(self, results):
-        """Format search results into a consistent structure."""
-        formatted_results = []
-        for result in results:
-            formatted_results.append({
-                "id": result.id,
-                "payload": result.payload,
-                "score": result.score
-            })
-        return formatted_results
\ No newline at end of file
+    async def search_batch(
+        self,
+        vectors: List[List[float]],
+        limit: int = 3,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Any]]:
+        """
+        One query_batch_points round trip for many query vectors.
+        Returns one result list per vector, in order.
+        """
+        if not vectors:
+            return []
+
+        await self.ensure_ready()
+        await self._ensure_payload_indexes(self._missing_payload_indexes(filters))
+        query_filter = qdrant_filter(filters)
+        requests = [
+            models.QueryRequest(
+                query=vector,
+                filter=query_filter,
+                limit=limit,
+                params=self.config.search_params(),
+                with_payload=True,
+                with_vector=False
+            )
+            for vector in vectors
+        ]
+        try:
+            responses = await self.client.query_batch_points(
+                collection_name=self.collection_name,
+                requests=requests
+            )
+            logger.info(f"🔍 Batched vector search for {len(vectors)} queries")
+            return [response.points for response in responses]
+
+        except Exception as e:
+            logger.error(f"❌ Batch search failed: {e}")
+            raise e
+
+    async def close(self):
+        await self.client.close()
+
+
+def create_vector_store():
+    """
+    Builds the async vector store selected by VECTOR_BACKEND.
+    """
+    if settings.VECTOR_BACKEND == "mmap":
+        # Imported lazily: the embedded index is optional and imports this module
+        from app.services.vector_index import MmapVectorIndex
+        return MmapVectorIndex(
+            path=settings.VECTOR_INDEX_PATH,
+            quantization=settings.VECTOR_INDEX_QUANTIZATION
+        )
+    return AsyncVectorDBService()
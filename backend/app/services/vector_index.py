@@ -0,0 +1,374 @@
+import asyncio
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+from qdrant_client.http import models
+
+from app.core.logging import logger
+from app.models.document import normalize_filters
+from app.services.filters import sqlite_filter_clause
+from app.services.vector_db import BaseVectorStore, CollectionConfig
+
+# Rows scored per block during search, bounds temporary memory
+SEARCH_BLOCK_ROWS = 65536
+# Queries scored together by search_batch (score matrix is queries x rows)
+SEARCH_BATCH_QUERIES = 32
+
+
+class MmapVectorIndex(BaseVectorStore):
+    """
+    Embedded vector store for single-node deployments (no Qdrant server).
+
+    Vectors live in a memory-mapped matrix on disk (float32, or int8 with a
+    per-row scale), payloads and ID mappings in a SQLite sidecar. Search is
+    exact cosine similarity via blocked matrix products and argpartition.
+    Reopening an index maps the files instead of loading them into RAM.
+
+    Implements the same async interface as AsyncVectorDBService.
+    """
+
+    def __init__(self, path: str, quantization: str = "none", config: Optional[CollectionConfig] = None):
+        super().__init__(config)
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+
+        self._db = sqlite3.connect(str(self.path / "payloads.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS points ("
+            "row INTEGER PRIMARY KEY, point_id TEXT UNIQUE NOT NULL, "
+            "payload TEXT NOT NULL, deleted INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.commit()
+
+        meta = dict(self._db.execute("SELECT key, value FROM meta").fetchall())
+        if meta:
+            # Existing index: its on-disk layout wins over the arguments
+            self.vector_size = int(meta["dim"])
+            self.quantization = meta["quantization"]
+        else:
+            self.quantization = quantization
+            self._db.executemany(
+                "INSERT INTO meta (key, value) VALUES (?, ?)",
+                [("dim", str(self.vector_size)), ("quantization", self.quantization)]
+            )
+            self._db.commit()
+
+        self._count = self._db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM points").fetchone()[0]
+        self._capacity = 0
+        self._vectors: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._map(max(self._count, 1024))
+
+        # Liveness mask (1 byte per row) is the only per-row state kept in RAM
+        self._alive = np.ones(self._capacity, dtype=bool)
+        self._alive[self._count:] = False
+        for (row,) in self._db.execute("SELECT row FROM points WHERE deleted = 1"):
+            self._alive[row] = False
+
+        logger.info(f"📂 Opened embedded vector index at {self.path} ({self._count} rows, {self.quantization}).")
+
+    # --- Storage ---
+
+    @property
+    def _vector_file(self) -> Path:
+        return self.path / ("vectors.i8" if self.quantization == "int8" else "vectors.f32")
+
+    def _map(self, capacity: int):
+        """
+        (Re)maps the vector files with room for `capacity` rows.
+        Growing only extends the files; existing rows are never copied.
+        """
+        dtype = np.int8 if self.quantization == "int8" else np.float32
+        self._resize_file(self._vector_file, capacity * self.vector_size * np.dtype(dtype).itemsize)
+        self._vectors = np.memmap(self._vector_file, dtype=dtype, mode="r+", shape=(capacity, self.vector_size))
+
+        if self.quantization == "int8":
+            scale_file = self.path / "scales.f32"
+            self._resize_file(scale_file, capacity * 4)
+            self._scales = np.memmap(scale_file, dtype=np.float32, mode="r+", shape=(capacity,))
+
+        self._capacity = capacity
+
+    @staticmethod
+    def _resize_file(path: Path, size: int):
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+
+    def _grow(self, needed: int):
+        if needed <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        self._vectors.flush()
+        self._map(capacity)
+
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self._alive)] = self._alive
+        self._alive = alive
+
+    def _write_rows(self, rows: np.ndarray, vectors: np.ndarray):
+        # Normalize once at write time so search is a plain dot product
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        if self.quantization == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._vectors[rows] = np.round(vectors / scales[:, None]).astype(np.int8)
+            self._scales[rows] = scales
+        else:
+            self._vectors[rows] = vectors
+
+    # --- Sync implementation (run in a worker thread) ---
+
+    def _upsert(self, vectors: List[List[float]], payloads: List[Dict[str, Any]], ids: List[str]):
+        with self._lock:
+            rows = []
+            assigned: Dict[str, int] = {}
+            for point_id in ids:
+                if point_id not in assigned:
+                    existing = self._db.execute("SELECT row FROM points WHERE point_id = ?", (point_id,)).fetchone()
+                    if existing:
+                        assigned[point_id] = existing[0]
+                    else:
+                        assigned[point_id] = self._count
+                        self._count += 1
+                rows.append(assigned[point_id])
+            self._grow(self._count)
+
+            row_array = np.asarray(rows, dtype=np.int64)
+            self._write_rows(row_array, np.asarray(vectors, dtype=np.float32))
+            self._alive[row_array] = True
+
+            self._db.executemany(
+                "INSERT OR REPLACE INTO points (row, point_id, payload, deleted) VALUES (?, ?, ?, 0)",
+                [(row, pid, json.dumps(payload)) for row, pid, payload in zip(rows, ids, payloads)]
+            )
+            self._vectors.flush()
+            if self._scales is not None:
+                self._scales.flush()
+            self._db.commit()
+
+    def _delete(self, ids: List[str]):
+        with self._lock:
+            rows: List[int] = []
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows.extend(r for (r,) in self._db.execute(
+                    f"SELECT row FROM points WHERE point_id IN ({placeholders})", batch
+                ))
+                # Tombstone only; rows are reused when the same ID is upserted again
+                self._db.execute(f"UPDATE points SET deleted = 1 WHERE point_id IN ({placeholders})", batch)
+            self._db.commit()
+            self._alive[rows] = False
+
+    def _set_payloads(self, payloads: Dict[str, Dict[str, Any]], overwrite: bool = False):
+        with self._lock:
+            for point_id, fields in payloads.items():
+                row = self._db.execute(
+                    "SELECT payload FROM points WHERE point_id = ? AND deleted = 0", (point_id,)
+                ).fetchone()
+                if row:
+                    payload = fields if overwrite else {**json.loads(row[0]), **fields}
+                    self._db.execute(
+                        "UPDATE points SET payload = ? WHERE point_id = ?", (json.dumps(payload), point_id)
+                    )
+            self._db.commit()
+
+    def _existing(self, ids: List[str]) -> Set[str]:
+        with self._lock:
+            found: Set[str] = set()
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                found.update(pid for (pid,) in self._db.execute(
+                    f"SELECT point_id FROM points WHERE deleted = 0 AND point_id IN ({placeholders})", batch
+                ))
+            return found
+
+    def _ensure_payload_indexes(self, filters: Optional[Dict[str, Any]]):
+        """
+        SQLite expression index per filtered payload key, the embedded
+        counterpart of a Qdrant payload index.
+        """
+        for key in normalize_filters(filters):
+            if key in self._indexed_fields:
+                continue
+            self._db.execute(
+                f"CREATE INDEX IF NOT EXISTS payload_{key} ON points (json_extract(payload, '$.{key}'))"
+            )
+            self._db.commit()
+            self._indexed_fields.add(key)
+
+    def _filtered_rows(self, filters: Optional[Dict[str, Any]]) -> np.ndarray:
+        self._ensure_payload_indexes(filters)
+        clause, params = sqlite_filter_clause(filters, "payload")
+        rows = [r for (r,) in self._db.execute(
+            f"SELECT row FROM points WHERE deleted = 0 AND {clause} ORDER BY row", params
+        )]
+        return np.asarray(rows, dtype=np.int64)
+
+    def _score_rows(self, queries: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        # Only the matching rows are read from disk
+        scores = np.empty((len(queries), len(rows)), dtype=np.float32)
+        for start in range(0, len(rows), SEARCH_BLOCK_ROWS):
+            block_rows = rows[start:start + SEARCH_BLOCK_ROWS]
+            block_scores = queries @ self._vectors[block_rows].T
+            if self.quantization == "int8":
+                block_scores *= self._scales[block_rows]
+            scores[:, start:start + len(block_rows)] = block_scores
+        return scores
+
+    def _search(
+        self,
+        vector: List[float],
+        limit: int,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[models.ScoredPoint]:
+        return self._search_many([vector], limit, filters)[0]
+
+    def _search_many(
+        self,
+        vectors: List[List[float]],
+        limit: int,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[models.ScoredPoint]]:
+        """
+        Top-`limit` matches for every query vector. All queries are scored
+        in the same pass, so each block of the matrix is read once.
+        """
+        with self._lock:
+            count = self._count
+            if count == 0 or limit <= 0 or not vectors:
+                return [[] for _ in vectors]
+
+            queries = np.asarray(vectors, dtype=np.float32)
+            queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+            if filters:
+                candidates = self._filtered_rows(filters)
+                scores = self._score_rows(queries, candidates)
+            else:
+                candidates = None
+                # Blocked scoring keeps temporaries small on very large indexes
+                scores = np.empty((len(queries), count), dtype=np.float32)
+                for start in range(0, count, SEARCH_BLOCK_ROWS):
+                    stop = min(start + SEARCH_BLOCK_ROWS, count)
+                    block_scores = queries @ self._vectors[start:stop].T
+                    if self.quantization == "int8":
+                        block_scores *= self._scales[start:stop]
+                    scores[:, start:stop] = block_scores
+                scores[:, ~self._alive[:count]] = -np.inf
+
+            alive = len(candidates) if candidates is not None else int(self._alive[:count].sum())
+            k = min(limit, alive)
+            if k == 0:
+                return [[] for _ in vectors]
+
+            ranked = []
+            for query_scores in scores:
+                top = np.argpartition(-query_scores, k - 1)[:k]
+                top = top[np.argsort(-query_scores[top])]
+                top_scores = [float(query_scores[i]) for i in top]
+                if candidates is not None:
+                    top = candidates[top]
+                ranked.append(([int(r) for r in top], top_scores))
+
+            rows = sorted({row for top, _ in ranked for row in top})
+            placeholders = ",".join("?" * len(rows))
+            stored = {
+                row: (pid, payload) for row, pid, payload in self._db.execute(
+                    f"SELECT row, point_id, payload FROM points WHERE row IN ({placeholders})", rows
+                )
+            }
+
+        return [
+            [
+                models.ScoredPoint(
+                    id=stored[row][0],
+                    version=0,
+                    score=score,
+                    payload=json.loads(stored[row][1])
+                )
+                for row, score in zip(top, top_scores)
+            ]
+            for top, top_scores in ranked
+        ]
+
+    # --- Async interface (matches AsyncVectorDBService) ---
+
+    async def ensure_ready(self):
+        return
+
+    async def upsert_vectors(
+        self,
+        vectors: List[List[float]],
+        payloads: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None,
+        wait: bool = True
+    ):
+        points = self._build_points(vectors, payloads, ids)
+        await asyncio.to_thread(
+            self._upsert,
+            [p.vector for p in points],
+            [p.payload for p in points],
+            [str(p.id) for p in points]
+        )
+        logger.info(f"💾 Upserted {len(points)} chunks into the embedded index.")
+        self._notify_write()
+
+    async def delete_points(self, ids: List[str]):
+        if not ids:
+            return
+        await asyncio.to_thread(self._delete, ids)
+        logger.info(f"🗑️ Deleted {len(ids)} stale chunks from the embedded index.")
+        self._notify_write()
+
+    async def set_payloads(self, payloads: Dict[str, Dict[str, Any]], overwrite: bool = False):
+        if not payloads:
+            return
+        await asyncio.to_thread(self._set_payloads, payloads, overwrite)
+        self._notify_write()
+
+    async def existing_ids(self, ids: List[str]) -> Set[str]:
+        if not ids:
+            return set()
+        return await asyncio.to_thread(self._existing, ids)
+
+    async def search(self, vector: List[float], limit: int = 3, filters: Optional[Dict[str, Any]] = None) -> List[Any]:
+        results = await asyncio.to_thread(self._search, vector, limit, filters)
+        logger.info(f"🔍 Found {len(results)} results from embedded index search")
+        return results
+
+    async def search_batch(
+        self,
+        vectors: List[List[float]],
+        limit: int = 3,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Any]]:
+        results = []
+        for start in range(0, len(vectors), SEARCH_BATCH_QUERIES):
+            group = vectors[start:start + SEARCH_BATCH_QUERIES]
+            results.extend(await asyncio.to_thread(self._search_many, group, limit, filters))
+        logger.info(f"🔍 Batched embedded index search for {len(vectors)} queries")
+        return results
+
+    async def close(self):
+        with self._lock:
+            self._vectors.flush()
+            if self._scales is not None:
+                self._scales.flush()
+            self._db.close()
+
+    def __len__(self) -> int:
+        return int(self._alive[:self._count].sum())
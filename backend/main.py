@@ -1,49 +1,114 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi import UploadFile, File
+from fastapi.responses import JSONResponse, StreamingResponse
 from contextlib import asynccontextmanager
-from typing import Dict, Any
+from typing import AsyncIterator, Dict, Any, Tuple
+import time
 
 from app.core.config import settings
 from app.core.logging import logger
-from app.models.document import IngestRequest, SearchRequest
-from app.models.workflow import GenerateRequest, AgentState
+from app.core.sse import sse_stream
+from app.core.http import close_http_clients
+from app.core.metrics import TimingMiddleware, render_metrics
+from app.core.readiness import ReadinessTracker
+from app.models.document import IngestRequest, BatchIngestRequest, SearchRequest
+from app.models.workflow import GenerateRequest, BatchGenerateRequest
+from app.models.job import JobRecord, JobSubmitted
 from app.services.ingestion import IngestionService
-from app.agents.graph import app as agent_workflow
+from app.services.generation import GenerationService
+from app.services.jobs import JobManager, InMemoryJobQueue
+from app.services.llm_cache import get_llm_cache, close_llm_cache
 
 # Global Service Instances
 ingestion_service = None
+generation_service = None
+job_manager = None
+readiness = ReadinessTracker()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Lifespan context manager.
-    Initializes services on startup.
+    Initializes services on startup. Nothing here waits on the network:
+    Qdrant, the OpenAI clients and the agent graph are warmed up in the
+    background (see /health/ready) or on first use.
     """
-    global ingestion_service
+    global ingestion_service, generation_service, job_manager, readiness
     
     logger.info(f"🚀 Starting {settings.PROJECT_NAME} in {settings.ENVIRONMENT} mode...")
+    readiness = ReadinessTracker()
     
-    # Initialize Logic Services (connects to Qdrant)
+    # Initialize Logic Services (cheap; connections are made lazily)
     try:
         ingestion_service = IngestionService()
-        logger.info("✅ Ingestion Service initialized (Knowledge Base connected).")
+        generation_service = GenerationService(ingestion_service)
+        readiness.register("knowledge_base", ingestion_service.warm_up)
+        readiness.register("agent_workflow", generation_service.warm_up)
+        logger.info("✅ Services initialized; warming up connections.")
     except Exception as e:
         logger.error(f"❌ Failed to initialize services: {e}")
+        readiness.fail("services", e)
         # We allow startup even if DB fails, for easier debugging of API layer
+
+    if settings.STARTUP_WARMUP:
+        readiness.start()
+
+    # Background workers for long-running agent workflows
+    job_manager = JobManager(
+        queue=InMemoryJobQueue(max_retained=settings.JOB_MAX_RETAINED),
+        workers=settings.JOB_WORKERS
+    )
+    job_manager.register("generate", run_generate_job)
+    job_manager.start()
     
     yield
     
     logger.info(f"🛑 Shutting down {settings.PROJECT_NAME}...")
+    await readiness.stop()
+    await job_manager.stop()
+    await close_http_clients()
+    close_llm_cache()
+    if ingestion_service:
+        await ingestion_service.close()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     lifespan=lifespan
 )
+# Per-route latency histograms and Server-Timing headers
+app.add_middleware(TimingMiddleware)
 
 @app.get("/health")
 async def health_check():
     return {"status": "active", "service": "DocuForge API"}
 
+@app.get("/health/live")
+async def liveness():
+    """
+    Liveness probe: the process is up and serving requests.
+    """
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """
+    Readiness probe: 200 once the knowledge base and the agent workflow are
+    warmed up, 503 (with per-component status) until then.
+    """
+    ready, components = await readiness.check()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "components": components}
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: per-stage latency, request latency, LLM tokens, revisions.
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 # --- Knowledge Base Endpoints ---
 
 @app.post("/api/v1/ingest")
@@ -83,6 +148,45 @@ async def ingest_file(file: UploadFile = File(...)):
         logger.error(f"File upload error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/v1/ingest/batch")
+async def ingest_batch(request: BatchIngestRequest):
+    """
+    Bulk-loads many text documents with cross-document embedding batches.
+    Returns per-document results and overall throughput.
+    """
+    if not ingestion_service:
+        raise HTTPException(status_code=503, detail="Ingestion service not initialized")
+
+    try:
+        return await ingestion_service.process_batch([
+            (doc.text, doc.source_name, doc.metadata or {})
+            for doc in request.documents
+        ])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Batch ingestion error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/v1/ingest/batch/file")
+async def ingest_batch_file(file: UploadFile = File(...)):
+    """
+    Bulk-loads every PDF inside a zip archive.
+    """
+    if not ingestion_service:
+        raise HTTPException(status_code=503, detail="Ingestion service not initialized")
+
+    if not file.filename.endswith(".zip"):
+        raise HTTPException(status_code=400, detail="Only zip archives of PDFs are supported")
+
+    try:
+        return await ingestion_service.process_pdf_archive(file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Batch file upload error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/api/v1/search")
 async def search_knowledge(request: SearchRequest):
     """
@@ -93,10 +197,30 @@ async def search_knowledge(request: SearchRequest):
         
     results = await ingestion_service.search_knowledge_base(
         query=request.query,
-        limit=request.limit
+        limit=request.limit,
+        filters=request.filters
     )
     return {"matches": results}
 
+@app.get("/api/v1/cache/stats")
+async def cache_stats():
+    """
+    Hit/miss counters for the retrieval caches and the generation (LLM, semantic) caches,
+    plus near-duplicate index counts.
+    """
+    if not ingestion_service:
+        raise HTTPException(status_code=503, detail="Ingestion service not initialized")
+
+    caches = {
+        "embedding_cache": ingestion_service.embedding_cache,
+        "query_vector_cache": ingestion_service.query_vector_cache,
+        "search_cache": ingestion_service.search_cache,
+        "dedup_index": ingestion_service.dedup_index,
+        "llm_cache": get_llm_cache(),
+        "semantic_cache": generation_service.semantic_cache if generation_service else None,
+    }
+    return {name: cache.stats() if cache is not None else None for name, cache in caches.items()}
+
 # --- Agentic Workflow Endpoint (NEW) ---
 
 @app.post("/api/v1/generate")
@@ -107,54 +231,161 @@ async def generate_documentation(request: GenerateRequest) -> Dict[str, Any]:
     2. Initializes the LangGraph state.
     3. Runs the Draft -> Critique -> Revise loop.
     4. Returns the final result.
+    For long generations prefer the job API below.
     """
-    if not ingestion_service:
+    if not generation_service:
         raise HTTPException(status_code=503, detail="Services not ready")
 
-    logger.info(f"🤖 Starting Agent Workflow for topic: {request.topic}")
-
-    # Step 1: Retrieve Context (Grounding)
-    # We blindly search for the topic to give the agent raw material
-    search_results = await ingestion_service.search_knowledge_base(query=request.topic, limit=5)
-    
-    # Flatten results into a list of strings
-    context_str_list = [
-        f"Source ({res['source']}): {res['content']}" 
-        for res in search_results
-    ]
-    
-    if not context_str_list:
-        logger.warning(f"⚠️ No context found for topic: {request.topic}")
-        context_str_list = ["No specific technical context found in database. Rely on general knowledge but be cautious."]
-
-    # Step 2: Initialize State
-    initial_state: AgentState = {
-        "query": request.topic,
-        "context": context_str_list,
-        "draft": None,
-        "critique": None,
-        "revision_count": 0,
-        "final_doc": None
-    }
-
-    # Step 3: Run the Graph
-    # invoke() is synchronous blocking in LangGraph (for now), but fast enough for this demo.
-    # For production with long chains, we would use a background task (Celery/Arq).
     try:
-        final_state = agent_workflow.invoke(initial_state)
+        return await generation_service.run(request.topic, filters=request.filters)
     except Exception as e:
         logger.error(f"❌ Agent Workflow Failed: {e}")
         raise HTTPException(status_code=500, detail=f"Agent workflow failed: {str(e)}")
 
-    # Step 4: Return Result
-    # We return the draft and the last critique to show the 'thought process'
-    return {
-        "final_document": final_state.get("draft"),
-        "revisions": final_state.get("revision_count"),
-        "final_critique": final_state.get("critique"),
-        "used_context": len(context_str_list)
+@app.post("/api/v1/generate/stream")
+async def stream_documentation(request: GenerateRequest):
+    """
+    Streaming variant of /generate (Server-Sent Events).
+    Emits per-node events as the Draft -> Critique -> Revise loop runs,
+    so clients see the first tokens long before the workflow finishes.
+    """
+    if not generation_service:
+        raise HTTPException(status_code=503, detail="Services not ready")
+
+    async def events():
+        try:
+            async for event, data in generation_service.stream_events(request.topic, filters=request.filters):
+                yield event, data
+        except Exception as e:
+            logger.error(f"❌ Agent Workflow Failed: {e}")
+            yield "error", {"detail": f"Agent workflow failed: {str(e)}"}
+
+    return StreamingResponse(
+        sse_stream(events(), heartbeat_interval=settings.SSE_HEARTBEAT_SECONDS),
+        media_type="text/event-stream",
+        # Disable proxy buffering so events are flushed immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# --- Batch Generation Endpoints ---
+
+def _check_batch(request: BatchGenerateRequest):
+    if not generation_service:
+        raise HTTPException(status_code=503, detail="Services not ready")
+    if len(request.topics) > settings.BATCH_GENERATE_MAX_TOPICS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BATCH_GENERATE_MAX_TOPICS} topics per batch"
+        )
+
+async def _batch_results(request: BatchGenerateRequest) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    ("result", {index, topic, ...}) per topic as it finishes, then ("done", totals).
+    """
+    start = time.perf_counter()
+    failed = 0
+    async for index, result in generation_service.run_batch(request.topics, filters=request.filters):
+        failed += "error" in result
+        yield "result", {"index": index, "topic": request.topics[index], **result}
+    yield "done", {
+        "topics": len(request.topics),
+        "succeeded": len(request.topics) - failed,
+        "failed": failed,
+        "seconds": round(time.perf_counter() - start, 3)
     }
 
+@app.post("/api/v1/generate/batch")
+async def generate_batch(request: BatchGenerateRequest) -> Dict[str, Any]:
+    """
+    Generates every topic of a documentation set. Retrieval for all topics
+    is one embedding call plus one batched vector query; the workflows run
+    concurrently under the global LLM concurrency limit.
+    Results are returned in topic order (per-topic failures carry "error").
+    """
+    _check_batch(request)
+
+    results = [None] * len(request.topics)
+    totals: Dict[str, Any] = {}
+    try:
+        async for event, data in _batch_results(request):
+            if event == "result":
+                results[data["index"]] = data
+            else:
+                totals = data
+    except Exception as e:
+        logger.error(f"❌ Batch Workflow Failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Batch workflow failed: {str(e)}")
+    return {"results": results, "totals": totals}
+
+@app.post("/api/v1/generate/batch/stream")
+async def stream_generate_batch(request: BatchGenerateRequest):
+    """
+    Streaming variant of /generate/batch (Server-Sent Events): one "result"
+    event per topic in completion order, then "done" with totals.
+    """
+    _check_batch(request)
+
+    async def events():
+        try:
+            async for event, data in _batch_results(request):
+                yield event, data
+        except Exception as e:
+            logger.error(f"❌ Batch Workflow Failed: {e}")
+            yield "error", {"detail": f"Batch workflow failed: {str(e)}"}
+
+    return StreamingResponse(
+        sse_stream(events(), heartbeat_interval=settings.SSE_HEARTBEAT_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# --- Background Job Endpoints ---
+
+async def run_generate_job(payload: Dict[str, Any], report) -> Dict[str, Any]:
+    """
+    Job handler: runs the agent workflow and streams progress into the job record.
+    """
+    if not generation_service:
+        raise RuntimeError("Services not ready")
+    return await generation_service.run(payload["topic"], on_progress=report, filters=payload.get("filters"))
+
+@app.post("/api/v1/generate/jobs", status_code=202, response_model=JobSubmitted)
+async def submit_generate_job(request: GenerateRequest):
+    """
+    Queues an agent workflow run and returns its job ID immediately.
+    """
+    if not generation_service:
+        raise HTTPException(status_code=503, detail="Services not ready")
+
+    job = await job_manager.submit("generate", request.model_dump())
+    return JobSubmitted(job_id=job.job_id, status=job.status)
+
+async def _get_job_or_404(job_id: str) -> JobRecord:
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/v1/generate/jobs/{job_id}")
+async def get_generate_job(job_id: str) -> Dict[str, Any]:
+    """
+    Reports job status and the latest progress (stage, revision).
+    """
+    job = await _get_job_or_404(job_id)
+    return job.model_dump(exclude={"result", "payload"})
+
+@app.get("/api/v1/generate/jobs/{job_id}/result")
+async def get_generate_job_result(job_id: str) -> Dict[str, Any]:
+    """
+    Returns the workflow output once the job has succeeded.
+    """
+    job = await _get_job_or_404(job_id)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"Agent workflow failed: {job.error}")
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is still {job.status}")
+    return job.result
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,59 @@
+"""
+Embedding pipeline benchmark (offline).
+
+Compares one-request-per-chunk embedding against the micro-batched,
+concurrent EmbeddingPipeline, using FakeEmbedder with simulated latency.
+
+Usage (from backend/):
+    python -m tests.benchmarks.bench_embeddings
+"""
+import os
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from app.services.embeddings import EmbeddingPipeline, FakeEmbedder
+
+LATENCY = 0.05  # Simulated round trip per embedding request (seconds)
+CHUNKS = [f"Chunk {i}: supply voltage 15 ... 30 VDC, probe HMP{i % 7}" * 10 for i in range(500)]
+
+
+async def run_serial() -> float:
+    embedder = FakeEmbedder(latency=LATENCY)
+    start = time.perf_counter()
+    for chunk in CHUNKS[:50]:
+        await embedder.embed_batch([chunk])
+    # Extrapolate: running all 500 serially would take 10x as long
+    return (time.perf_counter() - start) * (len(CHUNKS) / 50)
+
+
+async def run_pipeline() -> float:
+    pipeline = EmbeddingPipeline(FakeEmbedder(latency=LATENCY), max_batch_size=64, max_concurrency=4)
+    start = time.perf_counter()
+    await pipeline.embed_documents(CHUNKS)
+    return time.perf_counter() - start
+
+
+async def run_queries(concurrency: int = 100) -> tuple:
+    embedder = FakeEmbedder(latency=LATENCY)
+    pipeline = EmbeddingPipeline(embedder)
+    start = time.perf_counter()
+    await asyncio.gather(*(pipeline.embed_query(f"query {i}") for i in range(concurrency)))
+    return time.perf_counter() - start, embedder.calls
+
+
+async def main():
+    serial = await run_serial()
+    batched = await run_pipeline()
+    query_seconds, query_calls = await run_queries()
+
+    print(f"documents: serial ~{serial:.2f}s, pipeline {batched:.2f}s ({serial / batched:.1f}x)")
+    print(f"queries:   100 concurrent in {query_seconds:.3f}s using {query_calls} embedding call(s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""
+PDF extraction benchmark: pages/sec versus worker count.
+
+Builds a larger PDF by repeating the pages of the bundled HMP-X_Manual.pdf,
+then extracts it with PdfExtractor at several pool sizes (0 = one thread).
+Pool start-up is excluded by a warm-up pass.
+
+Usage (from backend/):
+    python -m tests.benchmarks.bench_pdf_extraction [pages] [workers ...]
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import pypdf
+
+from app.services.pdf_extraction import PdfExtractor
+
+MANUAL = Path(__file__).resolve().parents[3] / "HMP-X_Manual.pdf"
+
+
+def build_large_pdf(pages: int) -> str:
+    source = pypdf.PdfReader(str(MANUAL))
+    writer = pypdf.PdfWriter()
+    for i in range(pages):
+        writer.add_page(source.pages[i % len(source.pages)])
+
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, "wb") as out:
+        writer.write(out)
+    return path
+
+
+async def measure(path: str, workers: int) -> float:
+    extractor = PdfExtractor(workers=workers, pages_per_task=8)
+    try:
+        # Warm-up spawns the worker processes
+        async for _ in extractor.iter_pages(path):
+            pass
+        start = time.perf_counter()
+        pages = 0
+        async for _ in extractor.iter_pages(path):
+            pages += 1
+        return pages / (time.perf_counter() - start)
+    finally:
+        extractor.shutdown()
+
+
+async def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 240
+    worker_counts = [int(w) for w in sys.argv[2:]] or [0, 1, 2, 4]
+    path = build_large_pdf(pages)
+    try:
+        print(f"{pages}-page PDF, {os.cpu_count()} CPU(s)")
+        for workers in worker_counts:
+            rate = await measure(path, workers)
+            label = "thread" if workers == 0 else f"{workers} worker(s)"
+            print(f"  {label:<12} {rate:8.1f} pages/sec")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+"""
+Qdrant recall-versus-latency benchmark.
+
+Loads clustered random vectors into a fresh collection for each
+configuration (HNSW m / ef_construct, search ef, int8 quantization with
+rescoring), then reports recall@k against exact numpy ground truth and
+p50/p99 query latency.
+
+By default this runs against Qdrant's local in-memory mode, which always
+performs exact search (recall is 1.0 and HNSW settings are ignored). Point
+it at a real server with --url to tune the index.
+
+Usage (from backend/):
+    python -m tests.benchmarks.bench_qdrant_recall [--url http://localhost:6333] [--points 20000]
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+
+from app.services.vector_db import AsyncVectorDBService, CollectionConfig
+
+CONFIGS = [
+    {"hnsw_m": 16, "hnsw_ef_construct": 100, "search_ef": 32},
+    {"hnsw_m": 16, "hnsw_ef_construct": 100, "search_ef": 128},
+    {"hnsw_m": 32, "hnsw_ef_construct": 200, "search_ef": 128},
+    {"hnsw_m": 16, "hnsw_ef_construct": 100, "search_ef": 128, "quantization": "int8", "rescore": False},
+    {"hnsw_m": 16, "hnsw_ef_construct": 100, "search_ef": 128, "quantization": "int8", "rescore": True},
+]
+
+
+def make_dataset(points: int, queries: int, dim: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(64, dim))
+    data = centers[rng.integers(0, 64, points)] + 0.3 * rng.normal(size=(points, dim))
+    query = centers[rng.integers(0, 64, queries)] + 0.3 * rng.normal(size=(queries, dim))
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    query /= np.linalg.norm(query, axis=1, keepdims=True)
+    return data.astype(np.float32), query.astype(np.float32)
+
+
+async def run_config(client: AsyncQdrantClient, params: dict, data, queries, truth, k: int) -> dict:
+    config = CollectionConfig(name=f"bench_{uuid.uuid4().hex[:8]}", vector_size=data.shape[1], **params)
+    db = AsyncVectorDBService(config=config, client=client)
+    try:
+        ids = [str(uuid.uuid4()) for _ in range(len(data))]
+        for start in range(0, len(data), 1000):
+            await db.upsert_vectors(
+                vectors=data[start:start + 1000].tolist(),
+                payloads=[{"row": i} for i in range(start, min(start + 1000, len(data)))],
+                ids=ids[start:start + 1000]
+            )
+
+        latencies, hits = [], 0
+        for qi, vector in enumerate(queries):
+            started = time.perf_counter()
+            results = await db.search(vector.tolist(), limit=k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += len({r.payload["row"] for r in results} & set(truth[qi]))
+
+        return {
+            **params,
+            "recall": hits / (len(queries) * k),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+        }
+    finally:
+        await client.delete_collection(config.name)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Qdrant server URL (default: local in-memory mode)")
+    parser.add_argument("--points", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    client = AsyncQdrantClient(url=args.url) if args.url else AsyncQdrantClient(location=":memory:")
+    if not args.url:
+        warnings.filterwarnings("ignore", message="Local mode performs exact")
+        warnings.filterwarnings("ignore", message="Payload indexes have no effect")
+
+    data, queries = make_dataset(args.points, args.queries, args.dim)
+    # Exact top-k by cosine similarity (vectors are normalized)
+    truth = np.argsort(-(queries @ data.T), axis=1)[:, :args.k]
+
+    print(f"{'m':>3} {'efc':>4} {'ef':>4} {'quant':>5} {'rescore':>7} {'recall':>7} {'p50 ms':>7} {'p99 ms':>7}")
+    for params in CONFIGS:
+        row = await run_config(client, params, data, queries, truth, args.k)
+        print(
+            f"{row['hnsw_m']:>3} {row['hnsw_ef_construct']:>4} {row['search_ef']:>4} "
+            f"{row.get('quantization', 'none'):>5} {str(row.get('rescore', '-')):>7} "
+            f"{row['recall']:>7.3f} {row['p50_ms']:>7.2f} {row['p99_ms']:>7.2f}"
+        )
+    await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,150 @@
+"""
+Benchmark: drafter output per revision, full redraft vs. section-level revision.
+
+The critic flags one section of a six-section draft; the drafter then either
+rewrites the whole document (SECTION_REVISION_ENABLED=false) or only the
+flagged section. Output tokens dominate LLM latency and cost, so the report
+compares the drafter's completion tokens (and prompt tokens) per revision.
+
+Runs offline with a scripted fake chat model; token counts are the same
+estimates the app uses when the provider reports no usage.
+
+Usage (from backend/):
+    python -m tests.benchmarks.bench_revision [--output revision.json]
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+import tempfile
+import warnings
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+# Offline configuration; must be set before the app settings are imported
+DATA_DIR = tempfile.mkdtemp(prefix="docuforge_bench_revision_")
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.update({
+    "EMBEDDING_BACKEND": "fake",
+    "QDRANT_LOCATION": ":memory:",
+    "EMBEDDING_CACHE_PATH": os.path.join(DATA_DIR, "embedding_cache.sqlite3"),
+    "MANIFEST_PATH": os.path.join(DATA_DIR, "manifest.sqlite3"),
+    "LEXICAL_INDEX_PATH": os.path.join(DATA_DIR, "lexical_index.sqlite3"),
+    "DEDUP_INDEX_PATH": os.path.join(DATA_DIR, "dedup_index.sqlite3"),
+    "LLM_CACHE_ENABLED": "false",
+    "SEMANTIC_CACHE_ENABLED": "false",
+    "PDF_EXTRACT_WORKERS": "0",
+})
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from app.agents import nodes
+from app.agents.sections import split_sections
+from app.core.config import settings
+from app.services.generation import GenerationService
+from app.services.ingestion import IngestionService
+
+SECTIONS = [
+    "Overview\nThe HMP155 probe measures relative humidity and temperature in outdoor "
+    "and industrial environments. It is designed for long-term installation and "
+    "requires no routine maintenance beyond periodic calibration checks.",
+    "Mounting\nInstall the probe in a radiation shield, at least 1.5 m above ground. "
+    "Keep the filter pointing down so condensed water can drain, and route the cable "
+    "with a drip loop before it enters the enclosure.",
+    "Wiring\nConnect the brown wire to terminal 1 and the white wire to terminal 2. "
+    "The green wire is the RS-485 A line and the yellow wire the RS-485 B line. "
+    "Connect the cable shield to the enclosure ground only.",
+    "Power supply\nCAUTION: Disconnect the supply before wiring the probe. "
+    "The probe accepts 24 V DC only and draws up to 10 mA in normal operation. "
+    "Use a fused supply rated for the full cable length.",
+    "Analog outputs\nBoth outputs use a 4-20 mA scale by default. Channel 1 carries "
+    "relative humidity (0-100 %RH) and channel 2 carries temperature (-80 to +60 °C). "
+    "You can change the scaling over the serial line.",
+    "Calibration\nCheck the humidity reading against a reference every 12 months. "
+    "Adjust with the one-point procedure in the service menu and record the offset "
+    "in the maintenance log before returning the probe to service.",
+]
+DRAFT = "\n\n".join(SECTIONS)
+FLAGGED = 4
+REVISED_SECTION = (
+    "Power supply\nCAUTION: Disconnect the supply before wiring the probe. "
+    "The probe accepts 7-28 V DC and draws up to 10 mA in normal operation. "
+    "Use a fused supply rated for the full cable length."
+)
+CRITIQUE = json.dumps({
+    "verdict": "revise",
+    "issues": [{"section": FLAGGED, "issue": "The supply range is 7-28 V DC, not 24 V only."}]
+})
+
+
+def script(section_mode: bool, revisions: int) -> List[AIMessage]:
+    """
+    drafter (first draft), critic (flags S4), drafter (revision) ... critic (APPROVE).
+    """
+    sections = list(SECTIONS)
+    replies = [AIMessage(content=DRAFT)]
+    for revision in range(1, revisions):
+        replies.append(AIMessage(content=CRITIQUE))
+        sections[FLAGGED - 1] = REVISED_SECTION
+        replies.append(AIMessage(content=f"[S{FLAGGED}]\n{REVISED_SECTION}" if section_mode else "\n\n".join(sections)))
+    replies.append(AIMessage(content="APPROVE"))
+    return replies
+
+
+async def run_mode(generation: GenerationService, section_mode: bool, revisions: int) -> Dict[str, Any]:
+    settings.SECTION_REVISION_ENABLED = section_mode
+    nodes.llm = GenericFakeChatModel(messages=iter(script(section_mode, revisions)))
+
+    result = await generation.run("HMP155 installation and power supply")
+    assert len(split_sections(result["final_document"])) == len(SECTIONS)
+    assert "7-28 V" in result["final_document"]
+
+    drafter_calls = [usage for usage in result["prompt_tokens"] if usage["node"] == "drafter"]
+    # The first draft is identical in both modes; compare the revisions
+    revision_calls = drafter_calls[1:]
+    return {
+        "revisions": len(revision_calls),
+        "first_draft_completion_tokens": drafter_calls[0]["completion_tokens"],
+        "completion_tokens_per_revision": round(
+            sum(call["completion_tokens"] for call in revision_calls) / len(revision_calls), 1
+        ),
+        "prompt_tokens_per_revision": round(
+            sum(call["prompt_tokens"] for call in revision_calls) / len(revision_calls), 1
+        ),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--revisions", type=int, default=2, help="Drafter calls per run, first draft included")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+
+    service = IngestionService()
+    generation = GenerationService(service)
+    full = await run_mode(generation, section_mode=False, revisions=args.revisions)
+    sections = await run_mode(generation, section_mode=True, revisions=args.revisions)
+    await service.close()
+
+    results = {
+        "sections_in_draft": len(SECTIONS),
+        "flagged_sections": 1,
+        "full_redraft": full,
+        "section_revision": sections,
+        "completion_token_reduction": round(
+            1 - sections["completion_tokens_per_revision"] / full["completion_tokens_per_revision"], 3
+        ),
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+"""
+Benchmark: API process startup (cold import and first requests).
+
+Every run starts a fresh interpreter, so nothing is cached between runs.
+Each child process measures, from its own start:
+- import_main: `import main` (settings, routes, services modules)
+- lifespan: app startup until the server would accept traffic
+- first_live: first /health/live response
+- ready: first 200 from /health/ready (vector store, clients and graph warmed up)
+- first_search: first /api/v1/search response after that
+
+Runs offline: fake embeddings and Qdrant's in-memory local mode.
+
+Usage (from backend/):
+    python -m tests.benchmarks.bench_startup [--runs 5] [--output startup.json]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+BACKEND = Path(__file__).resolve().parents[2]
+
+CHILD = r"""
+import json, time
+start = time.perf_counter()
+timings = {}
+
+import main
+timings["import_main"] = time.perf_counter() - start
+
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    timings["lifespan"] = time.perf_counter() - start
+    client.get("/health/live")
+    timings["first_live"] = time.perf_counter() - start
+    while client.get("/health/ready").status_code != 200:
+        time.sleep(0.005)
+    timings["ready"] = time.perf_counter() - start
+    client.post("/api/v1/search", json={"query": "power supply", "limit": 3})
+    timings["first_search"] = time.perf_counter() - start
+
+print(json.dumps(timings))
+"""
+
+
+def run_once(data_dir: str) -> Dict[str, float]:
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-benchmark"),
+        "EMBEDDING_BACKEND": "fake",
+        "QDRANT_LOCATION": ":memory:",
+        "EMBEDDING_CACHE_PATH": os.path.join(data_dir, "embedding_cache.sqlite3"),
+        "MANIFEST_PATH": os.path.join(data_dir, "manifest.sqlite3"),
+        "LEXICAL_INDEX_PATH": os.path.join(data_dir, "lexical_index.sqlite3"),
+        "DEDUP_INDEX_PATH": os.path.join(data_dir, "dedup_index.sqlite3"),
+        "LLM_CACHE_PATH": os.path.join(data_dir, "llm_cache.sqlite3"),
+        "PDF_EXTRACT_WORKERS": "0",
+    }
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=BACKEND, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    # Logs go to stdout too; the timings are the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(runs: List[Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    return {
+        name: {
+            "median_ms": round(statistics.median(run[name] for run in runs) * 1000, 1),
+            "max_ms": round(max(run[name] for run in runs) * 1000, 1),
+        }
+        for name in runs[0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    runs = []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory(prefix="docuforge_startup_") as data_dir:
+            runs.append(run_once(data_dir))
+
+    results = {"runs": args.runs, "startup": summarize(runs)}
+    print(json.dumps(results, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
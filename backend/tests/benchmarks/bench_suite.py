@@ -0,0 +1,347 @@
+"""
+End-to-end offline benchmark suite: chunking, ingestion, search, generation.
+
+Runs with no network access: FakeEmbedder (deterministic feature hashing),
+a scripted fake chat model, and Qdrant's in-memory local mode. Results are
+written to a JSON file; pass --compare with a previous file to print the
+relative change of every metric.
+
+Measures:
+- chunking: characters and chunks/sec splitting the bundled HMP-X manual
+  (repeated into one long document), OffsetChunker vs the LangChain
+  RecursiveCharacterTextSplitter it replaced
+- ingest: chunks/sec through IngestionService.process_batch
+- dedup: product-variant manuals sharing boilerplate, ingested with and
+  without near-duplicate elimination (points stored, texts embedded,
+  distinct passages in the top-k for a boilerplate query)
+- search: p50/p99 latency of search_knowledge_base at several collection sizes
+- generate: wall-clock per revision of the Draft -> Critique -> Revise loop
+
+Vectors are 256-dimensional (not 1536) so large collections fit in memory;
+compare runs made with the same settings.
+
+Usage (from backend/):
+    python -m tests.benchmarks.bench_suite [--output bench.json] [--compare old.json]
+                                           [--sizes 1000 5000 20000] [--queries 200]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import platform
+import argparse
+import tempfile
+import subprocess
+import warnings
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+# Offline configuration; must be set before the app settings are imported
+DATA_DIR = tempfile.mkdtemp(prefix="docuforge_bench_")
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.update({
+    "EMBEDDING_BACKEND": "fake",
+    "QDRANT_LOCATION": ":memory:",
+    "QDRANT_VECTOR_SIZE": "256",
+    "EMBEDDING_CACHE_PATH": os.path.join(DATA_DIR, "embedding_cache.sqlite3"),
+    "MANIFEST_PATH": os.path.join(DATA_DIR, "manifest.sqlite3"),
+    "LEXICAL_INDEX_PATH": os.path.join(DATA_DIR, "lexical_index.sqlite3"),
+    "DEDUP_INDEX_PATH": os.path.join(DATA_DIR, "dedup_index.sqlite3"),
+    # Measure the real work, not cache hits
+    "QUERY_CACHE_ENABLED": "false",
+    "LLM_CACHE_ENABLED": "false",
+    "SEMANTIC_CACHE_ENABLED": "false",
+    "PDF_EXTRACT_WORKERS": "0",
+})
+
+import numpy as np
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.agents import nodes
+from app.agents.graph import app as agent_workflow
+from app.core.config import settings
+from app.services.embeddings import FakeEmbedder
+from app.services.generation import GenerationService
+from app.services.ingestion import IngestionService
+from app.services.pdf_extraction import iter_pdf_pages
+from app.services.vector_db import AsyncVectorDBService, CollectionConfig
+
+MANUAL = Path(__file__).resolve().parents[3] / "HMP-X_Manual.pdf"
+
+# Drafts pass the rule-based pre-critic, so every critique is a scripted LLM reply
+DRAFT = (
+    "CAUTION: Disconnect the 24 V supply before wiring the probe. "
+    "Connect the brown wire to terminal 1 and the white wire to terminal 2. "
+    "The probe is rated for -40 to +80 °C."
+)
+FEEDBACK = "The operating temperature range does not match the context. Use -40 to +60 °C."
+
+QUERIES = [
+    "power supply requirements for the humidity probe",
+    "how to calibrate the dewpoint sensor",
+    "operating temperature range",
+    "analog output wiring and scaling",
+]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def bench_chunking(service: IngestionService, copies: int = 200, repeat: int = 3) -> Dict[str, Any]:
+    # The manual is short, so split it repeated into one long document
+    pages = [text for _, text in iter_pdf_pages(str(MANUAL))]
+    text = "\n\n".join(pages * copies)
+
+    # The LangChain splitter used before OffsetChunker, same size/overlap
+    recursive = RecursiveCharacterTextSplitter(
+        chunk_size=service.chunker.chunk_size,
+        chunk_overlap=service.chunker.chunk_overlap,
+        separators=["\n\n", "\n", " ", ""]
+    )
+    splitters = {
+        "offset_spans": lambda: list(service.chunker.spans(text)),
+        "offset_split_text": lambda: service.chunker.split_text(text),
+        "recursive_create_documents": lambda: recursive.create_documents([text], [{"source": "manual.pdf"}]),
+    }
+
+    results: Dict[str, Any] = {"document_chars": len(text)}
+    for name, split in splitters.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            chunks = split()
+        seconds = time.perf_counter() - start
+        results[name] = {
+            "chunks_per_run": len(chunks),
+            "chars_per_second": round(len(text) * repeat / seconds, 1),
+            "chunks_per_second": round(len(chunks) * repeat / seconds, 1),
+        }
+
+    results["speedup_vs_recursive"] = round(
+        results["offset_spans"]["chars_per_second"] / results["recursive_create_documents"]["chars_per_second"], 2
+    )
+    return results
+
+
+async def bench_ingest(service: IngestionService, documents: int = 200) -> Dict[str, Any]:
+    batch = [
+        (
+            " ".join(f"Document {d} section {s}: HMP{d % 9} supply {s % 30} VDC, output 4-20 mA." for s in range(40)),
+            f"bench/doc_{d}.txt",
+            {"type": "benchmark"},
+        )
+        for d in range(documents)
+    ]
+    start = time.perf_counter()
+    result = await service.process_batch(batch)
+    seconds = time.perf_counter() - start
+
+    chunks = result["totals"]["chunks_processed"]
+    return {
+        "documents": documents,
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "chunks_per_second": round(chunks / seconds, 1),
+    }
+
+
+# Safety chapter every variant manual repeats, only the model name changes
+# (several chunks long, so each variant adds near-duplicate chunks)
+BOILERPLATE = [
+    "Safety. Only qualified personnel may install, connect or service the {model}. Follow the local "
+    "electrical codes, disconnect all power before opening the enclosure, and make sure that the supply "
+    "cannot be switched on accidentally while you work on the equipment or on its wiring. Do not modify "
+    "the unit and use only accessories approved by the manufacturer.",
+    "Electrostatic discharge. The electronics are sensitive to static electricity. Touch a grounded "
+    "surface before handling the circuit boards, hold boards by their edges, and store spare parts in "
+    "antistatic bags. Never touch the component leads or connector pins with bare hands.",
+    "Warranty. The manufacturer warrants the instrument against defects in materials and workmanship "
+    "under normal use. The warranty does not cover damage caused by improper installation, unauthorized "
+    "modification, misuse, accidents, or operation outside the environmental limits given in this manual. "
+    "Contact technical support before returning a unit for repair.",
+    "Disposal. Recycle packaging and worn parts according to local regulations. The instrument contains "
+    "electronic components and must not be discarded with household waste; return it to an authorized "
+    "collection point at the end of its service life. Remove the backup battery first where fitted.",
+    "Cleaning. Wipe the housing with a soft cloth moistened with water or mild detergent. Do not use "
+    "solvents, abrasive cleaners or pressurized water, and do not let liquid enter the connectors or the "
+    "sensor opening. Let the unit dry completely before you reconnect the power supply.",
+]
+
+
+async def bench_dedup(variants: int = 40, limit: int = 5) -> Dict[str, Any]:
+    documents = []
+    for v in range(variants):
+        model = f"HMX{100 + v}"
+        specifics = [
+            f"Specifications of the {model}: supply voltage {7 + v % 5}-{24 + v % 4} V DC, output scaling "
+            f"option {v}, cable length {v + 2} m, operating range -{20 + v} to +{60 + v} degrees." for _ in range(2)
+        ]
+        text = "\n\n".join(p.format(model=model) for p in BOILERPLATE + specifics)
+        documents.append((text, f"bench/variant_{v}.txt", {"type": "benchmark"}))
+
+    saved = {
+        name: getattr(settings, name)
+        for name in ("DEDUP_ENABLED", "MANIFEST_PATH", "LEXICAL_INDEX_PATH", "DEDUP_INDEX_PATH", "EMBEDDING_CACHE_ENABLED")
+    }
+    results: Dict[str, Any] = {"documents": variants}
+    for mode, enabled in (("without_dedup", False), ("with_dedup", True)):
+        settings.DEDUP_ENABLED = enabled
+        settings.MANIFEST_PATH = os.path.join(DATA_DIR, f"manifest_{mode}.sqlite3")
+        settings.LEXICAL_INDEX_PATH = os.path.join(DATA_DIR, f"lexical_{mode}.sqlite3")
+        settings.DEDUP_INDEX_PATH = os.path.join(DATA_DIR, f"dedup_{mode}.sqlite3")
+        settings.EMBEDDING_CACHE_ENABLED = False
+        service = IngestionService()
+
+        start = time.perf_counter()
+        summary = await service.process_batch(documents)
+        seconds = time.perf_counter() - start
+
+        matches = await service.search_knowledge_base("warranty exclusions and disposal of the instrument", limit=limit)
+        results[mode] = {
+            "chunks": summary["totals"]["chunks_processed"],
+            "points_stored": summary["totals"]["added"],
+            "duplicates_skipped": summary["totals"]["duplicates"],
+            "seconds": round(seconds, 3),
+            "distinct_passages_in_top_k": len({m["content"][:60] for m in matches}),
+        }
+        await service.close()
+
+    for name, value in saved.items():
+        setattr(settings, name, value)
+    results["points_saved"] = round(
+        1 - results["with_dedup"]["points_stored"] / results["without_dedup"]["points_stored"], 3
+    )
+    return results
+
+
+async def bench_search(sizes: List[int], queries: int) -> Dict[str, Any]:
+    results = {}
+    embedder = FakeEmbedder(dimensions=int(os.environ["QDRANT_VECTOR_SIZE"]))
+
+    for size in sizes:
+        vector_db = AsyncVectorDBService(config=CollectionConfig(name=f"bench_{size}"))
+        service = IngestionService(vector_db=vector_db)
+
+        for start in range(0, size, 1000):
+            texts = [f"Chunk {i}: probe HMP{i % 50} humidity {i % 100} %RH wiring" for i in range(start, min(start + 1000, size))]
+            await vector_db.upsert_vectors(
+                await embedder.embed_batch(texts),
+                [{"content": t, "source": f"bench_{i % 20}.pdf"} for i, t in enumerate(texts)],
+                wait=True
+            )
+
+        # Warm-up, then measure one query at a time
+        await service.search_knowledge_base(QUERIES[0], limit=5)
+        latencies = []
+        for i in range(queries):
+            start = time.perf_counter()
+            await service.search_knowledge_base(f"{QUERIES[i % len(QUERIES)]} {i}", limit=5)
+            latencies.append(time.perf_counter() - start)
+
+        results[str(size)] = {
+            "queries": queries,
+            "p50_ms": percentile(latencies, 50),
+            "p99_ms": percentile(latencies, 99),
+        }
+        await service.close()
+    return results
+
+
+async def bench_generate(service: IngestionService, runs: int = 5, revisions: int = 2) -> Dict[str, Any]:
+    generation = GenerationService(service, agent_workflow)
+    per_revision = []
+
+    for _ in range(runs):
+        # drafter, critic (feedback) ... drafter, critic (APPROVE)
+        script = []
+        for revision in range(revisions):
+            script += [AIMessage(content=DRAFT), AIMessage(content="APPROVE" if revision == revisions - 1 else FEEDBACK)]
+        nodes.llm = GenericFakeChatModel(messages=iter(script))
+
+        start = time.perf_counter()
+        result = await generation.run("HMP155 wiring and power supply")
+        seconds = time.perf_counter() - start
+        per_revision.append(seconds / result["revisions"])
+
+    return {
+        "runs": runs,
+        "revisions_per_run": revisions,
+        "seconds_per_revision_p50": round(float(np.median(per_revision)), 4),
+        "seconds_per_revision_max": round(max(per_revision), 4),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]):
+    old, new = flatten(previous["results"]), flatten(current["results"])
+    print(f"\nChange vs {previous['meta']['commit']} ({previous['meta']['timestamp']}):")
+    for name, value in new.items():
+        if name in old and old[name]:
+            change = (value - old[name]) / old[name] * 100
+            print(f"  {name:45s} {old[name]:>12} -> {value:>12}  ({change:+.1f}%)")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", default=None, help="Previous results file to diff against")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    # Local mode warns that search params are ignored; expected here
+    warnings.filterwarnings("ignore", category=UserWarning)
+
+    service = IngestionService()
+    results = {
+        "chunking": bench_chunking(service),
+        "ingest": await bench_ingest(service),
+        "dedup": await bench_dedup(),
+        "search": await bench_search(args.sizes, args.queries),
+        "generate": await bench_generate(service),
+    }
+    await service.close()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "vector_size": int(os.environ["QDRANT_VECTOR_SIZE"]),
+        },
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(json.dumps(results, indent=2))
+    print(f"\nWrote {args.output}")
+
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,7 +1,12 @@
 import sys
 import os
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from unittest.mock import MagicMock, AsyncMock, patch
+from langchain_core.messages import AIMessage
 from typing import Generator
 
 # Add project root to path
@@ -14,10 +19,22 @@ from app.core.config import settings
 
 # 1. Override Settings
 @pytest.fixture(scope="session", autouse=True)
-def test_settings():
+def test_settings(tmp_path_factory):
     settings.ENVIRONMENT = "test"
     settings.OPENAI_API_KEY = "sk-fake-key"
     settings.QDRANT_HOST = "localhost"
+    # Keep on-disk caches out of the working tree
+    data_dir = tmp_path_factory.mktemp("data")
+    settings.EMBEDDING_CACHE_PATH = str(data_dir / "embedding_cache.sqlite3")
+    settings.MANIFEST_PATH = str(data_dir / "manifest.sqlite3")
+    settings.LEXICAL_INDEX_PATH = str(data_dir / "lexical_index.sqlite3")
+    settings.LLM_CACHE_PATH = str(data_dir / "llm_cache.sqlite3")
+    settings.DEDUP_INDEX_PATH = str(data_dir / "dedup_index.sqlite3")
+    # Mocked LLM responses differ per test; generation caches are opted into explicitly
+    settings.LLM_CACHE_ENABLED = False
+    settings.SEMANTIC_CACHE_ENABLED = False
+    # Extract in-process so the pypdf mock applies
+    settings.PDF_EXTRACT_WORKERS = 0
 
 # 2. Mock External Dependencies (Qdrant, OpenAI, AND pypdf)
 @pytest.fixture(autouse=True)
@@ -25,27 +42,36 @@ def mock_external_deps():
     """
     Patches all external libraries.
     """
-    with patch("app.services.vector_db.QdrantClient") as mock_qdrant, \
-         patch("app.services.ingestion.OpenAIEmbeddings") as mock_embed, \
-         patch("app.agents.nodes.ChatOpenAI") as mock_llm, \
-         patch("app.services.ingestion.pypdf.PdfReader") as mock_pdf: # <--- NEW PATCH
+    with patch("app.services.vector_db.AsyncQdrantClient") as mock_async_qdrant, \
+         patch("langchain_openai.OpenAIEmbeddings") as mock_embed, \
+         patch("app.agents.nodes.llm") as mock_llm, \
+         patch("app.services.pdf_extraction.pypdf.PdfReader") as mock_pdf: # <--- NEW PATCH
         
-        # --- Setup Qdrant Mock ---
-        mock_client_instance = mock_qdrant.return_value
-        # Mock 'search' return
-        mock_client_instance.query_points.return_value.points = [
+        # --- Setup Qdrant Mocks ---
+        search_points = [
             MagicMock(payload={"content": "Test Content", "source": "test.pdf"}, score=0.9)
         ]
-        # Mock 'collection exists' check
-        mock_client_instance.get_collections.return_value.collections = []
+
+        # The services use the async client; every method is awaitable
+        mock_async_instance = AsyncMock()
+        mock_async_qdrant.return_value = mock_async_instance
+        mock_async_instance.query_points.return_value.points = search_points
+        mock_async_instance.query_batch_points.side_effect = lambda collection_name, requests: [
+            MagicMock(points=search_points) for _ in requests
+        ]
+        mock_async_instance.collection_exists.return_value = False
+        mock_async_instance.retrieve.return_value = []
         
         # --- Setup OpenAI Embeddings Mock ---
-        # Return a list of floats (vector)
-        mock_embed.return_value.embed_documents.return_value = [[0.1] * 1536]
-        mock_embed.return_value.embed_query.return_value = [0.1] * 1536
+        # The client is built lazily (create_openai_embeddings), so patch the library
+        # Return one vector (list of floats) per input text
+        mock_embed.return_value.aembed_documents = AsyncMock(
+            side_effect=lambda texts: [[0.1] * 1536 for _ in texts]
+        )
         
         # --- Setup LLM Mock ---
-        mock_llm.return_value.invoke.return_value.content = "Mocked LLM Response"
+        # The nodes await llm.ainvoke(); the module-level client is replaced directly
+        mock_llm.ainvoke = AsyncMock(return_value=AIMessage(content="Mocked LLM Response"))
 
         # --- Setup PDF Mock (NEW) ---
         # When PdfReader is called, return an object with a 'pages' attribute
@@ -54,7 +80,7 @@ def mock_external_deps():
         mock_pdf.return_value.pages = [mock_page]
         
         yield {
-            "qdrant": mock_client_instance,
+            "qdrant": mock_async_instance,
             "embed": mock_embed,
             "llm": mock_llm,
             "pdf": mock_pdf
@@ -64,4 +90,86 @@ def mock_external_deps():
 @pytest.fixture
 def client() -> Generator[TestClient, None, None]:
     with TestClient(app) as c:
-        yield c
\ No newline at end of file
+        yield c
+
+# 4. Local fake OpenAI API (embeddings + chat completions) that answers 429s
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """
+    Returns 429 (with retry-after-ms) for the first `throttle_first` requests
+    and whenever more than `max_active` requests are in flight at once.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeOpenAIHandler)
+        self.base_url = f"http://127.0.0.1:{self.server_address[1]}/v1"
+        self.lock = threading.Lock()
+        self.throttle_first = 0
+        self.max_active = 1000
+        self.latency = 0.0
+        self.retry_after_ms = 10
+        self.active = 0
+        self.requests = 0
+        self.throttled = 0
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests += 1
+            server.active += 1
+            throttle = server.throttle_first > 0 or server.active > server.max_active
+            if server.throttle_first > 0:
+                server.throttle_first -= 1
+            if throttle:
+                server.throttled += 1
+        try:
+            if throttle:
+                error = {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+                self._send(429, error, {"retry-after-ms": str(server.retry_after_ms)})
+                return
+
+            time.sleep(server.latency)
+            if self.path.endswith("/embeddings"):
+                data = [
+                    {"object": "embedding", "index": i, "embedding": [0.1, 0.2, 0.3]}
+                    for i in range(len(body["input"]))
+                ]
+                payload = {"object": "list", "data": data, "model": body["model"],
+                           "usage": {"prompt_tokens": 1, "total_tokens": 1}}
+            else:
+                payload = {
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": 0, "model": body["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": "APPROVE"}}],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11}
+                }
+            self._send(200, payload)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_openai_server() -> Generator[FakeOpenAIServer, None, None]:
+    server = FakeOpenAIServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -1,6 +1,15 @@
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import patch
+import io
+import json
+import time
+import zipfile
+from unittest.mock import AsyncMock, patch
+from langchain_core.messages import AIMessage
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from app.core.config import settings
+from app.core.readiness import ReadinessTracker
+from app.services.ingestion import IngestionService
 
 class TestAPI:
     
@@ -9,6 +18,28 @@ class TestAPI:
         assert response.status_code == 200
         assert response.json()["status"] == "active"
 
+    def test_liveness_and_readiness(self, client: TestClient):
+        assert client.get("/health/live").json() == {"status": "alive"}
+
+        # Warm-up runs in the background; the probe retries once it is done
+        for _ in range(100):
+            response = client.get("/health/ready")
+            if response.status_code == 200:
+                break
+            time.sleep(0.02)
+
+        assert response.status_code == 200
+        assert response.json()["components"] == {"knowledge_base": "ready", "agent_workflow": "ready"}
+
+    def test_readiness_reports_failed_component(self, client: TestClient, mock_external_deps):
+        mock_external_deps["qdrant"].collection_exists.side_effect = ConnectionError("qdrant down")
+        with patch("main.readiness", ReadinessTracker()) as tracker:
+            tracker.register("knowledge_base", IngestionService().warm_up)
+            response = client.get("/health/ready")
+
+        assert response.status_code == 503
+        assert response.json()["components"]["knowledge_base"] == "failed: qdrant down"
+
     def test_ingest_text(self, client: TestClient):
         # This now runs the REAL IngestionService logic!
         payload = {
@@ -21,12 +52,76 @@ class TestAPI:
         # Verify it actually "processed" chunks
         assert response.json()["chunks_processed"] > 0
 
+    def test_reingest_hits_embedding_cache(self, client: TestClient):
+        payload = {"text": "Cached spec sheet.", "source_name": "cached.txt"}
+        client.post("/api/v1/ingest", json=payload)
+        before = client.get("/api/v1/cache/stats").json()["embedding_cache"]["hits"]
+
+        client.post("/api/v1/ingest", json=payload)
+        stats = client.get("/api/v1/cache/stats").json()["embedding_cache"]
+        assert stats["hits"] == before + 1
+
+    def test_ingest_batch_packs_documents_together(self, client: TestClient, mock_external_deps):
+        payload = {"documents": [
+            {"text": f"Batch spec number {i}.", "source_name": f"batch_{i}.txt"}
+            for i in range(3)
+        ]}
+        response = client.post("/api/v1/ingest/batch", json=payload)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [d["source_name"] for d in data["documents"]] == ["batch_0.txt", "batch_1.txt", "batch_2.txt"]
+        assert data["totals"]["added"] == 3
+        assert "chunks_per_second" in data["throughput"]
+        # Chunks from all three documents share one embedding call
+        embed_calls = mock_external_deps["embed"].return_value.aembed_documents.call_args_list
+        assert [len(c.args[0]) for c in embed_calls] == [3]
+
+    def test_ingest_batch_rejects_duplicate_sources(self, client: TestClient):
+        doc = {"text": "Same.", "source_name": "dup.txt"}
+        response = client.post("/api/v1/ingest/batch", json={"documents": [doc, doc]})
+        assert response.status_code == 400
+
+    def test_ingest_batch_zip_of_pdfs(self, client: TestClient):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("manuals/a.pdf", b"%PDF-1.4 fake a")
+            archive.writestr("manuals/b.pdf", b"%PDF-1.4 fake b")
+            archive.writestr("README.txt", b"ignored")
+
+        files = {"file": ("manuals.zip", buffer.getvalue(), "application/zip")}
+        response = client.post("/api/v1/ingest/batch/file", files=files)
+
+        assert response.status_code == 200
+        assert [d["source_name"] for d in response.json()["documents"]] == ["manuals/a.pdf", "manuals/b.pdf"]
+
     def test_search_knowledge(self, client: TestClient):
         payload = {"query": "voltage", "limit": 1}
         response = client.post("/api/v1/search", json=payload)
         assert response.status_code == 200
         assert len(response.json()["matches"]) > 0
 
+    def test_search_with_filters(self, client: TestClient, mock_external_deps):
+        payload = {"query": "power requirements", "limit": 2, "filters": {"source": "hmp155.pdf"}}
+        response = client.post("/api/v1/search", json=payload)
+        assert response.status_code == 200
+        query_filter = mock_external_deps["qdrant"].query_points.call_args.kwargs["query_filter"]
+        assert [c.match.value for c in query_filter.must[0].should] == ["hmp155.pdf", "hmp155.pdf"]
+
+        bad = {"query": "power requirements", "filters": {"source": {"$ne": "x"}}}
+        assert client.post("/api/v1/search", json=bad).status_code == 422
+
+    def test_repeated_search_is_cached(self, client: TestClient, mock_external_deps):
+        payload = {"query": "power requirements", "limit": 2}
+        client.post("/api/v1/search", json=payload)
+        client.post("/api/v1/search", json=payload)
+        assert mock_external_deps["qdrant"].query_points.call_count == 1
+
+        # Any write to the knowledge base invalidates cached results
+        client.post("/api/v1/ingest", json={"text": "New spec.", "source_name": "new.txt"})
+        client.post("/api/v1/search", json=payload)
+        assert mock_external_deps["qdrant"].query_points.call_count == 2
+
     def test_ingest_pdf_upload(self, client: TestClient):
         files = {'file': ('test.pdf', b'%PDF-1.4 fake content', 'application/pdf')}
         response = client.post("/api/v1/ingest/file", files=files)
@@ -45,4 +140,92 @@ class TestAPI:
         response = client.post("/api/v1/generate", json=payload)
         assert response.status_code == 200
         data = response.json()
-        assert "final_document" in data
\ No newline at end of file
+        assert "final_document" in data
+
+    def test_metrics_expose_stage_histograms(self, client: TestClient):
+        ingest = client.post("/api/v1/ingest", json={"text": "Metrics spec.", "source_name": "metrics.txt"})
+        assert "split;dur=" in ingest.headers["server-timing"]
+        assert "total;dur=" in ingest.headers["server-timing"]
+
+        generate = client.post("/api/v1/generate", json={"topic": "Wiring Guide"})
+        assert "node_drafter;dur=" in generate.headers["server-timing"]
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        body = response.text
+        assert 'docuforge_stage_seconds_count{stage="split"}' in body
+        assert 'docuforge_stage_seconds_count{stage="node_critic"}' in body
+        assert 'route="/api/v1/ingest"' in body
+        assert "docuforge_generate_revisions_count" in body
+        assert 'docuforge_llm_tokens_total{kind="prompt",node="drafter"}' in body
+
+    def test_generate_batch_returns_results_in_topic_order(self, client: TestClient, mock_external_deps):
+        topics = ["Power supply", "Analog outputs", "Calibration"]
+        response = client.post("/api/v1/generate/batch", json={"topics": topics})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [r["topic"] for r in data["results"]] == topics
+        assert all(r["final_document"] == "Mocked LLM Response" for r in data["results"])
+        assert data["totals"]["succeeded"] == 3 and data["totals"]["failed"] == 0
+        assert mock_external_deps["qdrant"].query_batch_points.call_count == 1
+
+    def test_generate_batch_stream_emits_result_per_topic(self, client: TestClient):
+        response = client.post("/api/v1/generate/batch/stream", json={"topics": ["Wiring", "Mounting"]})
+
+        assert response.status_code == 200
+        events = [frame.split("\n")[0][len("event: "):] for frame in response.text.strip().split("\n\n")]
+        assert events == ["result", "result", "done"]
+
+    def test_generate_batch_rejects_too_many_topics(self, client: TestClient):
+        topics = [f"Topic {i}" for i in range(settings.BATCH_GENERATE_MAX_TOPICS + 1)]
+        assert client.post("/api/v1/generate/batch", json={"topics": topics}).status_code == 400
+        assert client.post("/api/v1/generate/batch", json={"topics": []}).status_code == 422
+
+    @patch("app.agents.nodes.llm")
+    def test_generate_job_lifecycle(self, mock_llm, client: TestClient):
+        mock_llm.ainvoke = AsyncMock(return_value=AIMessage(content="APPROVE"))
+
+        response = client.post("/api/v1/generate/jobs", json={"topic": "Wiring Guide"})
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        # Workers run on the app's event loop; poll until done
+        for _ in range(100):
+            status = client.get(f"/api/v1/generate/jobs/{job_id}").json()
+            if status["status"] in ("succeeded", "failed"):
+                break
+            time.sleep(0.02)
+
+        assert status["status"] == "succeeded"
+        assert status["progress"]["stage"] == "critic"
+        result = client.get(f"/api/v1/generate/jobs/{job_id}/result").json()
+        assert result["final_document"] == "APPROVE"
+
+    def test_unknown_job_returns_404(self, client: TestClient):
+        assert client.get("/api/v1/generate/jobs/missing").status_code == 404
+
+
+    def test_generate_stream_emits_node_events(self, client: TestClient):
+        fake_llm = GenericFakeChatModel(messages=iter([
+            AIMessage(content="Connect the brown wire."),
+            AIMessage(content="APPROVE"),
+        ]))
+
+        with patch("app.agents.nodes.llm", fake_llm):
+            response = client.post("/api/v1/generate/stream", json={"topic": "Wiring Guide"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+
+        events = [
+            (frame.split("\n")[0][len("event: "):], json.loads(frame.split("\n")[1][len("data: "):]))
+            for frame in response.text.strip().split("\n\n")
+        ]
+        names = [name for name, _ in events]
+        assert names[0] == "retrieval"
+        assert ("node_started", {"node": "drafter", "revision": 0}) in events
+        assert "token" in names
+        assert ("critique", {"revision": 1, "critique": "APPROVE", "sections": []}) in events
+        assert events[-1][0] == "done"
+        assert events[-1][1]["final_document"] == "Connect the brown wire."
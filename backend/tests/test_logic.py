@@ -1,7 +1,51 @@
+import io
+import os
+import sys
+import asyncio
+import subprocess
 import pytest
-from unittest.mock import MagicMock, patch
+import httpx
+import pypdf
+import numpy as np
+from pathlib import Path
+from pypdf import PdfReader as RealPdfReader
+from fastapi import UploadFile
+from unittest.mock import AsyncMock, MagicMock, patch
 from app.agents.graph import should_continue
-from app.services.vector_db import VectorDBService
+from app.agents.rules import check_draft, format_feedback
+from app.agents.sections import parse_critique, parse_rewrites, section_at, splice, split_sections
+from qdrant_client import AsyncQdrantClient as RealAsyncQdrantClient
+from app.services.vector_db import AsyncVectorDBService, CollectionConfig, create_vector_store
+from app.services.vector_index import MmapVectorIndex
+from app.services.embeddings import EmbeddingPipeline, FakeEmbedder
+from app.services.embedding_cache import EmbeddingCache
+from app.services.query_cache import TTLCache
+from app.services.manifest import chunk_point_id
+from app.services.lexical_index import LexicalIndex, is_identifier_query, reciprocal_rank_fusion
+from app.services.dedup import MinHasher, NearDuplicateIndex, number_key, similarity
+from app.services.filters import qdrant_filter
+from app.services.context_packer import ContextPacker, find_overlap
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from app.services.chunker import OffsetChunker
+from app.services.llm_cache import LLMResponseCache, SemanticCache, prompt_key
+from app.services.generation import GenerationService
+from app.agents.graph import app as agent_workflow
+from app.agents import nodes
+from langchain_core.messages import AIMessage
+import app.services.llm_cache as llm_cache_module
+from app.models.document import normalize_filters
+from app.services.ingestion import IngestionService
+from app.core.config import settings
+from app.core import metrics
+from app.core.readiness import ReadinessTracker
+from prometheus_client import REGISTRY
+from app.services.pdf_extraction import PdfExtractor, iter_pdf_pages
+from app.services.jobs import JobManager, InMemoryJobQueue
+from app.models.job import JobRecord
+from app.core.sse import sse_stream
+from app.core.http import get_http_client, get_async_http_client
+from app.core import rate_limit
+from app.core.rate_limit import Priority, RateLimiter, TokenBucket, classify_error, retry_after, priority_scope
 
 class TestGraphLogic:
     """Targeting app/agents/graph.py"""
@@ -16,6 +60,17 @@ class TestGraphLogic:
         state = {"critique": "Too passive.", "revision_count": 0}
         assert should_continue(state) == "revise"
 
+    def test_pre_critic_feedback_is_never_approval(self):
+        """Quoted draft text containing 'approved' must not end the loop."""
+        state = {"critique": format_feedback(check_draft("It was approved.")), "revision_count": 1}
+        assert should_continue(state) == "revise"
+
+    def test_structured_verdict_overrides_keyword(self):
+        """A parsed 'revise' verdict wins even if the feedback says 'approved'."""
+        state = {"critique": "S2: Use the approved 24 V range.", "approved": False, "revision_count": 1}
+        assert should_continue(state) == "revise"
+        assert should_continue({**state, "critique": "APPROVE", "approved": True}) == "end"
+
     def test_should_continue_max_retries(self):
         """If max retries reached, force end."""
         state = {"critique": "Still bad.", "revision_count": 3}
@@ -24,30 +79,1228 @@ class TestGraphLogic:
 class TestVectorDBLogic:
     """Targeting app/services/vector_db.py"""
 
-    def test_ensure_collection_creates_if_missing(self):
+    @pytest.mark.asyncio
+    async def test_ensure_collection_creates_if_missing(self, mock_external_deps):
         """Test the initialization logic when collection is missing."""
-        with patch("app.services.vector_db.QdrantClient") as MockClient:
-            # Setup: Collection list is empty
-            mock_instance = MockClient.return_value
-            mock_instance.get_collections.return_value.collections = []
-            
-            # Run
-            db = VectorDBService()
-            
-            # Assert create_collection was called
-            mock_instance.create_collection.assert_called_once()
-
-    def test_ensure_collection_skips_if_exists(self):
+        # Setup: Collection does not exist (conftest default)
+        mock_instance = mock_external_deps["qdrant"]
+
+        # Run
+        db = AsyncVectorDBService()
+        await db.ensure_ready()
+
+        # Assert create_collection was called
+        mock_instance.create_collection.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_ensure_collection_skips_if_exists(self, mock_external_deps):
         """Test the initialization logic when collection exists."""
-        with patch("app.services.vector_db.QdrantClient") as MockClient:
-            # Setup: Collection exists
-            mock_instance = MockClient.return_value
-            mock_collection = MagicMock()
-            mock_collection.name = "vaisala_docs"
-            mock_instance.get_collections.return_value.collections = [mock_collection]
-            
-            # Run
-            db = VectorDBService()
-            
-            # Assert create_collection was NOT called
-            mock_instance.create_collection.assert_not_called()
\ No newline at end of file
+        # Setup: Collection exists
+        mock_instance = mock_external_deps["qdrant"]
+        mock_instance.collection_exists.return_value = True
+
+        # Run
+        db = AsyncVectorDBService()
+        await db.ensure_ready()
+
+        # Assert create_collection was NOT called
+        mock_instance.create_collection.assert_not_called()
+
+class TestEmbeddingPipeline:
+    """Targeting app/services/embeddings.py"""
+
+    def test_batches_respect_token_budget(self):
+        pipeline = EmbeddingPipeline(FakeEmbedder(dimensions=8), max_batch_tokens=10, max_batch_size=100)
+        # Each text is ~6 tokens, so only one fits per batch
+        batches = pipeline.make_batches(["x" * 20, "y" * 20, "z" * 20])
+        assert batches == [[0], [1], [2]]
+
+    def test_batches_respect_size_cap(self):
+        pipeline = EmbeddingPipeline(FakeEmbedder(dimensions=8), max_batch_size=2)
+        assert pipeline.make_batches(["a", "b", "c"]) == [[0, 1], [2]]
+
+    @pytest.mark.asyncio
+    async def test_embed_documents_preserves_order(self):
+        embedder = FakeEmbedder(dimensions=8)
+        pipeline = EmbeddingPipeline(embedder, max_batch_size=2)
+        texts = ["alpha", "beta", "gamma", "delta", "epsilon"]
+
+        vectors = await pipeline.embed_documents(texts)
+
+        expected = await embedder.embed_batch(texts)
+        assert vectors == expected
+        assert embedder.calls == 3 + 1  # 3 pipeline batches + the direct call above
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded(self):
+        in_flight, peak = 0, 0
+
+        class SlowEmbedder(FakeEmbedder):
+            async def embed_batch(self, texts):
+                nonlocal in_flight, peak
+                in_flight += 1
+                peak = max(peak, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+                return await super().embed_batch(texts)
+
+        pipeline = EmbeddingPipeline(SlowEmbedder(dimensions=8), max_batch_size=1, max_concurrency=2)
+        await pipeline.embed_documents([f"text {i}" for i in range(6)])
+        assert peak == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_queries_are_coalesced(self):
+        embedder = FakeEmbedder(dimensions=8)
+        pipeline = EmbeddingPipeline(embedder, coalesce_window=0.01)
+
+        results = await asyncio.gather(
+            pipeline.embed_query("HMP155 power"),
+            pipeline.embed_query("PTU300 voltage"),
+            pipeline.embed_query("HMP155 power"),
+        )
+
+        assert embedder.calls == 1
+        assert results[0] == results[2]
+        assert results[0] != results[1]
+
+    @pytest.mark.asyncio
+    async def test_coalesced_failure_reaches_every_waiter(self):
+        class FailingEmbedder(FakeEmbedder):
+            async def embed_batch(self, texts):
+                await asyncio.sleep(0.01)
+                raise RuntimeError("embedding backend down")
+
+        pipeline = EmbeddingPipeline(FailingEmbedder(dimensions=8), coalesce_window=0.001)
+        first = asyncio.ensure_future(pipeline.embed_query("HMP155 power"))
+        second = asyncio.ensure_future(pipeline.embed_query("PTU300 voltage"))
+        await asyncio.sleep(0.005)
+        # The flush task is referenced while in flight, released once done
+        assert len(pipeline._tasks) == 1
+
+        results = await asyncio.wait_for(asyncio.gather(first, second, return_exceptions=True), 1)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert not pipeline._tasks
+
+
+class TestEmbeddingCache:
+    """Targeting app/services/embedding_cache.py"""
+
+    def test_hits_and_misses(self, tmp_path):
+        cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+        cache.put_many("model-a", ["hello"], [[0.5, 0.25]])
+
+        assert cache.get_many("model-a", ["hello", "world"]) == [[0.5, 0.25], None]
+        # Same text under a different model is a separate entry
+        assert cache.get_many("model-b", ["hello"]) == [None]
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 2
+
+    def test_lru_eviction(self, tmp_path):
+        cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+        cache.put_many("m", ["a", "b"], [[1.0], [2.0]])
+        cache.get_many("m", ["a"])  # 'a' is now more recent than 'b'
+        cache.put_many("m", ["c"], [[3.0]])
+
+        assert len(cache) == 2
+        assert cache.get_many("m", ["a", "b", "c"]) == [[1.0], None, [3.0]]
+
+    def test_persists_across_reopen(self, tmp_path):
+        path = str(tmp_path / "cache.sqlite3")
+        cache = EmbeddingCache(path)
+        cache.put_many("m", ["persisted"], [[0.125]])
+        cache.close()
+
+        assert EmbeddingCache(path).get_many("m", ["persisted"]) == [[0.125]]
+
+
+class TestQueryCache:
+    """Targeting app/services/query_cache.py"""
+
+    def test_ttl_expiry(self):
+        now = [0.0]
+        cache = TTLCache(ttl=10, clock=lambda: now[0])
+        cache.set("q", [1])
+
+        assert cache.get("q") == [1]
+        now[0] = 11
+        assert cache.get("q") is None
+
+    def test_lru_bound(self):
+        cache = TTLCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+
+    @pytest.mark.asyncio
+    async def test_write_during_search_is_not_cached(self, mock_external_deps):
+        service = IngestionService()
+        real_search = service.vector_db.search
+
+        async def search_then_write(*args, **kwargs):
+            results = await real_search(*args, **kwargs)
+            # An ingest lands while the search is in flight
+            service.search_cache.clear()
+            return results
+
+        service.vector_db.search = search_then_write
+        await service.search_knowledge_base("supply voltage range")
+
+        assert len(service.search_cache) == 0
+        service.vector_db.search = real_search
+        await service.search_knowledge_base("supply voltage range")
+        assert len(service.search_cache) == 1
+
+    @pytest.mark.asyncio
+    async def test_upsert_invalidates_search_cache(self):
+        db = AsyncVectorDBService()
+        cache = TTLCache()
+        db.add_write_listener(cache.clear)
+        cache.set(("voltage", 3), ["stale"])
+
+        await db.upsert_vectors(vectors=[[0.1]], payloads=[{"content": "new"}])
+
+        assert cache.get(("voltage", 3)) is None
+
+
+def local_ingestion_service(tmp_path, monkeypatch) -> IngestionService:
+    """
+    IngestionService on real local stores: mmap vectors, fake embedder and
+    temp SQLite sidecars, with the search cache off.
+    """
+    monkeypatch.setattr(settings, "EMBEDDING_BACKEND", "fake")
+    monkeypatch.setattr(settings, "EMBEDDING_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "QUERY_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "DEDUP_INDEX_PATH", str(tmp_path / "dedup.sqlite3"))
+    monkeypatch.setattr(settings, "LEXICAL_INDEX_PATH", str(tmp_path / "lexical.sqlite3"))
+    monkeypatch.setattr(settings, "MANIFEST_PATH", str(tmp_path / "manifest.sqlite3"))
+    return IngestionService(vector_db=MmapVectorIndex(str(tmp_path / "vectors")))
+
+
+class TestIncrementalIngestion:
+    """Targeting app/services/manifest.py and IngestionService.process_document"""
+
+    def test_chunk_ids_are_deterministic(self):
+        assert chunk_point_id("a.pdf", "text") == chunk_point_id("a.pdf", "text")
+        assert chunk_point_id("a.pdf", "text") != chunk_point_id("b.pdf", "text")
+        assert chunk_point_id("a.pdf", "text") != chunk_point_id("a.pdf", "other")
+
+    @pytest.mark.asyncio
+    async def test_reingest_only_touches_changed_chunks(self, mock_external_deps):
+        qdrant = mock_external_deps["qdrant"]
+        # Every ID we ask about is stored
+        qdrant.retrieve.side_effect = lambda collection_name, ids, **kwargs: [MagicMock(id=i) for i in ids]
+        service = IngestionService()
+
+        intro, wiring, specs = ("Intro " * 150).strip(), ("Wiring " * 130).strip(), ("Specs " * 150).strip()
+
+        first = await service.process_document(f"{intro}\n\n{wiring}", "incremental.pdf", {})
+        assert (first["added"], first["unchanged"], first["removed"]) == (2, 0, 0)
+
+        second = await service.process_document(f"{intro}\n\n{specs}", "incremental.pdf", {})
+        assert (second["added"], second["unchanged"], second["removed"]) == (1, 1, 1)
+
+        deleted = qdrant.delete.call_args.kwargs["points_selector"].points
+        assert deleted == [chunk_point_id("incremental.pdf", wiring)]
+        upserted = qdrant.upsert.call_args.kwargs["points"]
+        assert [p.id for p in upserted] == [chunk_point_id("incremental.pdf", specs)]
+
+    @pytest.mark.asyncio
+    async def test_reingest_with_new_metadata_refreshes_payloads(self, tmp_path, monkeypatch):
+        service = local_ingestion_service(tmp_path, monkeypatch)
+        embedder = service.embedding_pipeline.embedder
+        text = "The HMP155 probe accepts 7-28 V DC supply."
+
+        await service.process_document(text, "a.txt", {"version": "1", "draft": True})
+        calls = embedder.calls
+        result = await service.process_document(text, "a.txt", {"version": "2"})
+
+        assert (result["added"], result["unchanged"], result["updated"]) == (0, 0, 1)
+        assert embedder.calls == calls
+        matches = await service.search_knowledge_base("probe supply", filters={"version": "2"})
+        assert [m["source"] for m in matches] == ["a.txt"]
+        assert await service.search_knowledge_base("probe supply", filters={"version": "1"}) == []
+        # Keys dropped from the metadata are gone too
+        assert await service.search_knowledge_base("probe supply", filters={"draft": True}) == []
+        # Lexical fast path reads its own payload copy
+        assert service.lexical_index.search("HMP155", filters={"version": "1"}) == []
+        assert len(service.lexical_index.search("HMP155", filters={"version": "2"})) == 1
+
+        # Batch ingestion takes the same path; unchanged metadata stays unchanged
+        summary = await service.process_batch([(text, "a.txt", {"version": "3"})])
+        assert summary["totals"]["updated"] == 1
+        summary = await service.process_batch([(text, "a.txt", {"version": "3"})])
+        assert (summary["totals"]["unchanged"], summary["totals"]["updated"]) == (1, 0)
+        assert len(await service.search_knowledge_base("probe supply", filters={"version": "3"})) == 1
+        await service.close()
+
+
+class TestStreamingPdfIngestion:
+    """Targeting IngestionService.process_pdf"""
+
+    @pytest.mark.asyncio
+    async def test_pages_are_streamed_in_rolling_batches(self, mock_external_deps, monkeypatch):
+        monkeypatch.setattr(settings, "INGEST_BATCH_SIZE", 2)
+        pages = []
+        for i in range(5):
+            page = MagicMock()
+            page.extract_text.return_value = f"Page {i + 1} wiring details."
+            pages.append(page)
+        mock_external_deps["pdf"].return_value.pages = pages
+
+        service = IngestionService()
+        upload = UploadFile(file=io.BytesIO(b"%PDF-1.4 fake"), filename="streamed.pdf")
+        result = await service.process_pdf(upload)
+
+        assert result["chunks_processed"] == 5
+        upserts = mock_external_deps["qdrant"].upsert.call_args_list
+        # 5 chunks with a batch size of 2 -> 3 rolling upserts
+        assert [len(c.kwargs["points"]) for c in upserts] == [2, 2, 1]
+        page_numbers = [p.payload["page"] for c in upserts for p in c.kwargs["points"]]
+        assert page_numbers == [1, 2, 3, 4, 5]
+
+    @pytest.mark.asyncio
+    async def test_inserted_page_renumbers_unchanged_chunks(self, mock_external_deps, tmp_path, monkeypatch):
+        service = local_ingestion_service(tmp_path, monkeypatch)
+
+        def upload(texts):
+            pages = []
+            for text in texts:
+                page = MagicMock()
+                page.extract_text.return_value = text
+                pages.append(page)
+            mock_external_deps["pdf"].return_value.pages = pages
+            return UploadFile(file=io.BytesIO(b"%PDF-1.4 fake"), filename="manual.pdf")
+
+        await service.process_pdf(upload(["Mounting the HMP155 probe.", "Wiring the PTU300 terminals."]))
+        result = await service.process_pdf(upload([
+            "Revision history.", "Mounting the HMP155 probe.", "Wiring the PTU300 terminals."
+        ]))
+
+        assert (result["added"], result["updated"]) == (1, 2)
+        for query, page in (("HMP155", 2), ("PTU300", 3)):
+            hits = service.lexical_index.search(query)
+            assert [payload["page"] for _, _, payload in hits] == [page]
+            points = await service.vector_db.search(await service.embed_query(query), limit=3)
+            assert [p.payload["page"] for p in points if query in p.payload["content"]] == [page]
+        await service.close()
+
+
+class TestPdfExtractor:
+    """Targeting app/services/pdf_extraction.py"""
+
+    @pytest.mark.asyncio
+    async def test_ranges_are_reassembled_in_order(self, mock_external_deps):
+        pages = []
+        for i in range(10):
+            page = MagicMock()
+            page.extract_text.return_value = f"text {i + 1}"
+            pages.append(page)
+        mock_external_deps["pdf"].return_value.pages = pages
+
+        extractor = PdfExtractor(workers=0, pages_per_task=3)
+        result = [item async for item in extractor.iter_pages("unused.pdf")]
+
+        assert result == [(i, f"text {i}") for i in range(1, 11)]
+
+    @pytest.mark.asyncio
+    async def test_process_pool_extracts_bundled_manual(self, monkeypatch):
+        # Undo the autouse pypdf mock; workers import the real module anyway
+        monkeypatch.setattr(pypdf, "PdfReader", RealPdfReader)
+        manual = str(Path(__file__).resolve().parents[2] / "HMP-X_Manual.pdf")
+
+        extractor = PdfExtractor(workers=2, pages_per_task=1)
+        try:
+            pooled = [item async for item in extractor.iter_pages(manual)]
+        finally:
+            extractor.shutdown()
+
+        assert pooled == list(iter_pdf_pages(manual))
+
+
+class TestJobManager:
+    """Targeting app/services/jobs.py"""
+
+    @pytest.mark.asyncio
+    async def test_job_runs_and_reports_progress(self):
+        manager = JobManager(InMemoryJobQueue(), workers=1)
+
+        async def handler(payload, report):
+            await report({"stage": "drafter", "revision": 1})
+            return {"echo": payload["topic"]}
+
+        manager.register("generate", handler)
+        manager.start()
+        try:
+            job = await manager.submit("generate", {"topic": "HMP155"})
+            for _ in range(50):
+                if (await manager.get(job.job_id)).status == "succeeded":
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await manager.stop()
+
+        record = await manager.get(job.job_id)
+        assert record.status == "succeeded"
+        assert record.result == {"echo": "HMP155"}
+        assert record.progress == {"stage": "drafter", "revision": 1}
+
+    @pytest.mark.asyncio
+    async def test_failed_job_records_error(self):
+        manager = JobManager(InMemoryJobQueue(), workers=1)
+
+        async def handler(payload, report):
+            raise RuntimeError("LLM unavailable")
+
+        manager.register("generate", handler)
+        job = await manager.submit("generate", {})
+        await manager._run(await manager.queue.dequeue())
+
+        record = await manager.get(job.job_id)
+        assert record.status == "failed"
+        assert record.error == "LLM unavailable"
+
+    @pytest.mark.asyncio
+    async def test_finished_jobs_are_trimmed_first(self):
+        queue = InMemoryJobQueue(max_retained=2)
+        done = JobRecord(job_id="done", kind="generate", status="succeeded")
+        await queue.save(done)
+        await queue.save(JobRecord(job_id="queued-1", kind="generate"))
+        await queue.save(JobRecord(job_id="queued-2", kind="generate"))
+
+        assert await queue.load("done") is None
+        assert await queue.load("queued-1") is not None
+
+
+class TestSSE:
+    """Targeting app/core/sse.py"""
+
+    @pytest.mark.asyncio
+    async def test_heartbeat_while_idle(self):
+        async def slow_events():
+            await asyncio.sleep(0.05)
+            yield "done", {"ok": True}
+
+        frames = [frame async for frame in sse_stream(slow_events(), heartbeat_interval=0.01)]
+
+        assert frames[0] == ": keep-alive\n\n"
+        assert frames[-1] == 'event: done\ndata: {"ok": true}\n\n'
+
+
+class TestSharedHttpClient:
+    """Targeting app/core/http.py"""
+
+    def test_clients_are_shared_and_tuned(self, mock_external_deps):
+        client = get_async_http_client()
+        assert client is get_async_http_client()
+        assert client.timeout.connect == settings.HTTP_CONNECT_TIMEOUT
+        assert client.timeout.read == settings.HTTP_READ_TIMEOUT
+
+        # The embeddings client is built lazily, on the same pool
+        service = IngestionService()
+        mock_external_deps["embed"].assert_not_called()
+        service.embedding_pipeline.embedder.embeddings_model
+        kwargs = mock_external_deps["embed"].call_args.kwargs
+        assert kwargs["http_async_client"] is client
+        assert kwargs["http_client"] is get_http_client()
+
+
+class TestAsyncVectorDB:
+    """Targeting AsyncVectorDBService and CollectionConfig in app/services/vector_db.py"""
+
+    def test_collection_config_applies_tuning(self):
+        config = CollectionConfig(hnsw_m=32, hnsw_ef_construct=256, on_disk_vectors=True,
+                                  quantization="int8", search_ef=64, oversampling=3.0)
+        params = config.create_params()
+
+        assert params["hnsw_config"].m == 32
+        assert params["vectors_config"].on_disk is True
+        assert params["quantization_config"].scalar.type == "int8"
+        search = config.search_params()
+        assert search.hnsw_ef == 64
+        assert search.quantization.rescore is True
+        assert search.quantization.oversampling == 3.0
+
+    def test_default_config_has_no_quantization(self):
+        config = CollectionConfig()
+        assert config.name == "vaisala_docs"
+        assert "quantization_config" not in config.create_params()
+        assert config.search_params().quantization is None
+
+    @pytest.mark.asyncio
+    async def test_roundtrip_against_local_qdrant(self):
+        db = AsyncVectorDBService(
+            config=CollectionConfig(name="roundtrip", vector_size=3),
+            client=RealAsyncQdrantClient(location=":memory:")
+        )
+        ids = [chunk_point_id("a.pdf", "x"), chunk_point_id("a.pdf", "y")]
+        await db.upsert_vectors([[1, 0, 0], [0, 1, 0]], [{"content": "x"}, {"content": "y"}], ids=ids)
+
+        results = await db.search([0.9, 0.1, 0], limit=1)
+        assert results[0].payload["content"] == "x"
+        assert await db.existing_ids(ids) == set(ids)
+
+        batched = await db.search_batch([[0.9, 0.1, 0], [0.1, 0.9, 0]], limit=1)
+        assert [points[0].payload["content"] for points in batched] == ["x", "y"]
+
+        await db.set_payloads({ids[0]: {"references": [{"source": "b.pdf"}]}})
+        results = await db.search([0.9, 0.1, 0], limit=1)
+        assert results[0].payload == {"content": "x", "references": [{"source": "b.pdf"}]}
+        await db.set_payloads({ids[0]: {"content": "x", "version": "2"}}, overwrite=True)
+        results = await db.search([0.9, 0.1, 0], limit=1)
+        assert results[0].payload == {"content": "x", "version": "2"}
+
+        await db.delete_points(ids[:1])
+        assert await db.existing_ids(ids) == {ids[1]}
+        await db.close()
+
+
+class TestMmapVectorIndex:
+    """Targeting app/services/vector_index.py"""
+
+    def _index(self, path, **kwargs):
+        return MmapVectorIndex(str(path), config=CollectionConfig(vector_size=4), **kwargs)
+
+    @pytest.mark.asyncio
+    async def test_upsert_search_delete(self, tmp_path):
+        index = self._index(tmp_path)
+        await index.upsert_vectors(
+            [[1, 0, 0, 0], [0, 1, 0, 0], [0.7, 0.7, 0, 0]],
+            [{"content": "a"}, {"content": "b"}, {"content": "ab"}],
+            ids=["id-a", "id-b", "id-ab"]
+        )
+
+        results = await index.search([1, 0.1, 0, 0], limit=2)
+        assert [r.payload["content"] for r in results] == ["a", "ab"]
+        assert results[0].score > results[1].score
+
+        await index.delete_points(["id-a"])
+        assert await index.existing_ids(["id-a", "id-b"]) == {"id-b"}
+        results = await index.search([1, 0.1, 0, 0], limit=2)
+        assert [r.payload["content"] for r in results] == ["ab", "b"]
+
+    @pytest.mark.asyncio
+    async def test_search_batch_matches_single_searches(self, tmp_path):
+        index = self._index(tmp_path, quantization="int8")
+        await index.upsert_vectors(
+            [[1, 0, 0, 0], [0, 1, 0, 0], [0.7, 0.7, 0, 0], [0, 0, 1, 0]],
+            [{"content": c, "type": t} for c, t in [("a", "x"), ("b", "y"), ("ab", "x"), ("c", "y")]],
+            ids=["id-a", "id-b", "id-ab", "id-c"]
+        )
+        queries = [[1, 0.1, 0, 0], [0, 0, 1, 0.2], [0.1, 1, 0, 0]]
+
+        for filters in (None, {"type": "y"}):
+            batched = await index.search_batch(queries, limit=2, filters=filters)
+            single = [await index.search(q, limit=2, filters=filters) for q in queries]
+            assert [[r.id for r in rs] for rs in batched] == [[r.id for r in rs] for rs in single]
+
+    @pytest.mark.asyncio
+    async def test_upsert_same_id_overwrites(self, tmp_path):
+        index = self._index(tmp_path)
+        await index.upsert_vectors([[1, 0, 0, 0]], [{"content": "old"}], ids=["x"])
+        await index.upsert_vectors([[0, 1, 0, 0]], [{"content": "new"}], ids=["x"])
+
+        assert len(index) == 1
+        results = await index.search([0, 1, 0, 0], limit=5)
+        assert [r.payload["content"] for r in results] == ["new"]
+
+    @pytest.mark.asyncio
+    async def test_persists_and_grows(self, tmp_path):
+        index = self._index(tmp_path, quantization="int8")
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(1500, 4)).tolist()  # Forces the 1024-row file to grow
+        await index.upsert_vectors(vectors, [{"n": i} for i in range(1500)], ids=[f"p{i}" for i in range(1500)])
+        await index.delete_points(["p7"])
+        await index.close()
+
+        reopened = MmapVectorIndex(str(tmp_path))
+        assert reopened.quantization == "int8"
+        assert len(reopened) == 1499
+        results = await reopened.search(vectors[42], limit=1)
+        assert results[0].id == "p42"
+        assert await reopened.existing_ids(["p7"]) == set()
+
+    def test_backend_switch(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "VECTOR_BACKEND", "mmap")
+        monkeypatch.setattr(settings, "VECTOR_INDEX_PATH", str(tmp_path / "index"))
+        assert isinstance(create_vector_store(), MmapVectorIndex)
+
+
+class TestLexicalIndex:
+    """Targeting app/services/lexical_index.py and the lexical search paths"""
+
+    def test_identifier_queries(self):
+        assert is_identifier_query("HMP155")
+        assert is_identifier_query("PTU300 supply voltage")
+        assert not is_identifier_query("how do I calibrate a humidity probe")
+        assert not is_identifier_query("what is the recommended mounting height for the HMP155 in a radiation shield")
+
+    def test_rrf_rewards_agreement(self):
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+        assert [item_id for item_id, _ in fused] == ["a", "c", "b"]
+
+    def test_bm25_search_and_delete(self):
+        index = LexicalIndex(":memory:")
+        index.add(
+            ["p1", "p2", "p3"],
+            [
+                {"content": "HMP155 humidity probe, supply voltage 7-28 V", "source": "hmp.pdf"},
+                {"content": "PTU300 barometer supply voltage 10-35 V", "source": "ptu.pdf"},
+                {"content": "General calibration guidance", "source": "cal.pdf"},
+            ]
+        )
+        # Re-adding a known point is a no-op
+        assert index.add(["p1"], [{"content": "HMP155"}]) == 0
+
+        hits = index.search("PTU300 supply voltage", limit=5, required=["ptu300"])
+        assert [point_id for point_id, _, _ in hits] == ["p2"]
+        hits = index.search("supply voltage", limit=5)
+        assert {point_id for point_id, _, _ in hits} == {"p1", "p2"}
+
+        index.delete(["p2"])
+        assert index.search("PTU300", limit=5) == []
+        assert len(index) == 2
+
+    @pytest.mark.asyncio
+    async def test_identifier_query_skips_embedding(self, mock_external_deps, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "LEXICAL_INDEX_PATH", str(tmp_path / "lexical.sqlite3"))
+        service = IngestionService()
+        await service.process_document("The HMP155 probe needs a 7-28 V supply.", "hmp.txt", {})
+        embed_calls = mock_external_deps["embed"].return_value.aembed_documents.call_count
+
+        results = await service.search_knowledge_base("HMP155", limit=3)
+
+        assert [r["source"] for r in results] == ["hmp.txt"]
+        assert mock_external_deps["embed"].return_value.aembed_documents.call_count == embed_calls
+        mock_external_deps["qdrant"].query_points.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_hybrid_mode_fuses_rankings(self, mock_external_deps, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "LEXICAL_INDEX_PATH", str(tmp_path / "lexical.sqlite3"))
+        monkeypatch.setattr(settings, "SEARCH_MODE", "hybrid")
+        service = IngestionService()
+        await service.process_document("Sensor drift is corrected by field calibration.", "drift.txt", {})
+
+        dense_only = MagicMock(id="dense-1", payload={"content": "Probe housing", "source": "housing.txt"}, score=0.8)
+        mock_external_deps["qdrant"].query_points.return_value.points = [dense_only]
+
+        results = await service.search_knowledge_base("calibration drift", limit=2)
+
+        assert {r["source"] for r in results} == {"drift.txt", "housing.txt"}
+        mock_external_deps["qdrant"].query_points.assert_called_once()
+
+
+class TestMetadataFilters:
+    """Targeting app/services/filters.py and filtered search in every backend"""
+
+    def test_filters_are_validated_and_translated(self):
+        with pytest.raises(ValueError):
+            normalize_filters({"bad key'": "x"})
+        with pytest.raises(ValueError):
+            normalize_filters({"version": 1.5})
+
+        query_filter = qdrant_filter({"source": "a.pdf", "type": ["pdf_upload", "text"]})
+        # Sources also match chunks stored once for several near-duplicate documents
+        assert [c.key for c in query_filter.must[0].should] == ["source", "reference_sources"]
+        assert query_filter.must[0].should[1].match.value == "a.pdf"
+        assert query_filter.must[1].key == "type"
+        assert query_filter.must[1].match.any == ["pdf_upload", "text"]
+        assert qdrant_filter(None) is None
+
+    @pytest.mark.asyncio
+    async def test_filtered_search_creates_payload_index_once(self, mock_external_deps):
+        qdrant = mock_external_deps["qdrant"]
+        db = AsyncVectorDBService()
+
+        await db.search([0.1] * 3, limit=2, filters={"version": 2})
+        await db.search([0.1] * 3, limit=2, filters={"version": 3})
+
+        indexed = [c.kwargs["field_name"] for c in qdrant.create_payload_index.call_args_list]
+        # Defaults up front, then the filtered field exactly once
+        assert indexed == ["source", "reference_sources", "type", "version"]
+        assert qdrant.create_payload_index.call_args.kwargs["field_schema"] == "integer"
+        assert qdrant.query_points.call_args.kwargs["query_filter"].must[0].key == "version"
+
+    @pytest.mark.asyncio
+    async def test_mmap_index_filters(self, tmp_path):
+        index = MmapVectorIndex(str(tmp_path), config=CollectionConfig(vector_size=2))
+        await index.upsert_vectors(
+            [[1, 0], [0.9, 0.1], [0, 1]],
+            [{"content": "a", "source": "a.pdf"}, {"content": "b", "source": "b.pdf"},
+             {"content": "c", "source": "b.pdf", "draft": True}],
+            ids=["a", "b", "c"]
+        )
+
+        results = await index.search([1, 0], limit=2, filters={"source": "b.pdf"})
+        assert [r.id for r in results] == ["b", "c"]
+        results = await index.search([1, 0], limit=2, filters={"draft": True})
+        assert [r.id for r in results] == ["c"]
+
+    def test_lexical_index_filters(self):
+        index = LexicalIndex(":memory:")
+        index.add(["p1", "p2"], [
+            {"content": "HMP155 supply voltage", "source": "hmp.pdf", "version": 1},
+            {"content": "HMP155 supply voltage", "source": "hmp.pdf", "version": 2},
+        ])
+        hits = index.search("HMP155", limit=5, filters={"version": 2})
+        assert [point_id for point_id, _, _ in hits] == ["p2"]
+
+
+class TestPreCritic:
+    """Targeting app/agents/rules.py"""
+
+    def test_flags_mechanical_violations(self):
+        rules = [v.rule for v in check_draft(
+            "The cover was removed. This revolutionary probe runs on 230 VAC mains."
+        )]
+        assert rules == ["passive_voice", "marketing_fluff", "missing_safety_warning"]
+
+    def test_clean_draft_passes(self):
+        draft = (
+            "CAUTION: Disconnect the 24 V supply before wiring. "
+            "Remove the cover. The probe is rated for -40 to +80 °C."
+        )
+        assert check_draft(draft) == []
+
+    def test_states_adverbs_and_low_voltage_are_not_flagged(self):
+        draft = (
+            "Readings are indeed stable once the valve is closed. "
+            "Connect the 24 V supply; the 4-20 mA loop runs on 12 VDC."
+        )
+        assert check_draft(draft) == []
+        # Above extra-low voltage a warning is still required
+        assert [v.rule for v in check_draft("Connect the 150 VDC rail.")] == ["missing_safety_warning"]
+        assert [v.rule for v in check_draft("The filter was replaced.")] == ["passive_voice"]
+
+
+class TestOffsetChunker:
+    """Targeting app/services/chunker.py"""
+
+    def test_matches_recursive_splitter_on_manual(self):
+        manual = Path(__file__).resolve().parents[2] / "HMP-X_Manual.pdf"
+        text = "\n\n".join(page.extract_text() for page in RealPdfReader(manual).pages)
+        recursive = RecursiveCharacterTextSplitter(
+            chunk_size=1000, chunk_overlap=200, separators=["\n\n", "\n", " ", ""]
+        )
+        assert OffsetChunker(chunk_size=1000, chunk_overlap=200).split_text(text) == recursive.split_text(text)
+
+    def test_spans_respect_size_and_overlap(self):
+        words = ["HMP155", "probe", "wiring", "terminal", "supply", "x" * 40]
+        separators = ["\n\n" if i % 97 == 0 else "\n" if i % 13 == 0 else " " for i in range(3000)]
+        text = "".join(words[i % len(words)] + separators[i] for i in range(3000))
+        chunker = OffsetChunker(chunk_size=300, chunk_overlap=60)
+        spans = list(chunker.spans(text))
+
+        assert all(end - start <= 300 for start, end in spans)
+        for (start, end), (next_start, next_end) in zip(spans, spans[1:]):
+            assert start < next_start and end < next_end
+            # Overlap within budget, or only whitespace between chunks
+            assert end - next_start <= 60
+            assert next_start <= end or not text[end:next_start].strip()
+        assert spans[0][0] == 0 and spans[-1][1] == len(text.rstrip())
+
+    def test_unbroken_text_is_hard_cut_with_overlap(self):
+        spans = list(OffsetChunker(chunk_size=100, chunk_overlap=20).spans("a" * 250))
+        assert spans == [(0, 100), (80, 180), (160, 250)]
+
+    def test_whitespace_only_text_has_no_chunks(self):
+        assert OffsetChunker().split_text(" \n\n \t ") == []
+
+
+class TestSections:
+    """Targeting app/agents/sections.py"""
+
+    DRAFT = "Wiring\nConnect the brown wire.\n\n\nPower\nUse 24 V.\n  \nOutputs\nScale 4-20 mA.\n"
+
+    def test_split_and_splice(self):
+        sections = split_sections(self.DRAFT)
+        assert sections == ["Wiring\nConnect the brown wire.", "Power\nUse 24 V.", "Outputs\nScale 4-20 mA."]
+        assert section_at(self.DRAFT, self.DRAFT.index("24 V")) == 2
+
+        revised = splice(sections, {2: "Power\nUse 7-28 V.", 3: ""})
+        assert revised == "Wiring\nConnect the brown wire.\n\nPower\nUse 7-28 V."
+
+    def test_parse_critique(self):
+        reply = '```json\n{"verdict": "revise", "issues": [{"section": 2, "issue": "Range is 7-28 V."}, {"section": 9, "issue": "x"}]}\n```'
+        assert parse_critique(reply, 3) == (False, [{"section": 2, "issue": "Range is 7-28 V."}])
+        assert parse_critique('{"verdict": "approve"}', 3) == (True, [])
+        # Unstructured replies still work
+        assert parse_critique("APPROVE", 3) == (True, [])
+        assert parse_critique("The tone is off.", 3) == (False, [])
+
+    def test_parse_rewrites(self):
+        reply = "[S2]\nPower\nUse 7-28 V.\n[S3]\nUnflagged rewrite"
+        assert parse_rewrites(reply, [2]) == {2: "Power\nUse 7-28 V."}
+        # A single flagged section may come back without its marker
+        assert parse_rewrites("Power\nUse 7-28 V.", [2]) == {2: "Power\nUse 7-28 V."}
+        assert parse_rewrites("Whole new draft", [1, 2]) is None
+
+
+class TestContextPacker:
+    """Targeting app/services/context_packer.py"""
+
+    def test_adjacent_chunks_are_merged(self):
+        text = " ".join(f"Sentence number {i} about the probe." for i in range(60))
+        chunks = OffsetChunker(chunk_size=1000, chunk_overlap=200).split_text(text)
+        assert len(chunks) > 1 and find_overlap(chunks[0], chunks[1]) > 0
+
+        # Retrieval order does not have to follow document order
+        results = [{"content": c, "source": "a.pdf", "score": 0.9 - i / 10} for i, c in enumerate(reversed(chunks))]
+        packed = ContextPacker(max_tokens=10_000).pack(results)
+
+        assert packed == [f"Source (a.pdf): {text}"]
+
+    def test_repeated_sentences_are_dropped(self):
+        results = [
+            {"content": "Supply voltage is 7.5 V. Output is 4-20 mA.", "source": "a.pdf", "score": 0.9},
+            {"content": "Output is 4-20 mA. Weight is 200 g.", "source": "b.pdf", "score": 0.8},
+        ]
+        packed = ContextPacker().pack(results)
+        assert packed == [
+            "Source (a.pdf): Supply voltage is 7.5 V. Output is 4-20 mA.",
+            "Source (b.pdf): Weight is 200 g.",
+        ]
+
+    def test_budget_keeps_best_passages(self):
+        results = [
+            {"content": "low " * 400, "source": "low.pdf", "score": 0.1},
+            {"content": "high " * 300, "source": "high.pdf", "score": 0.9},
+        ]
+        packed = ContextPacker(max_tokens=500).pack(results)
+        assert packed[0].startswith("Source (high.pdf)")
+        assert sum(len(p) for p in packed) // 4 <= 500
+
+
+class TestGenerationCaches:
+    """Targeting app/services/llm_cache.py and its use in nodes/GenerationService"""
+
+    def test_response_cache_lru_and_clear(self):
+        cache = LLMResponseCache(":memory:", max_entries=2)
+        keys = [prompt_key("gpt", 0.2, [f"prompt {i}"]) for i in range(3)]
+        assert prompt_key("gpt", 0.2, ["prompt 0"]) == keys[0]
+        assert prompt_key("gpt", 0.7, ["prompt 0"]) != keys[0]
+
+        cache.set(keys[0], "a")
+        cache.set(keys[1], "b")
+        cache.get(keys[0])
+        cache.set(keys[2], "c")  # Evicts keys[1], the least recently used
+        assert [cache.get(k) for k in keys] == ["a", None, "c"]
+
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_semantic_cache_needs_similar_topic_and_same_context(self):
+        cache = SemanticCache(threshold=0.95)
+        cache.set([1.0, 0.0], "ctx", {"final_document": "doc"})
+
+        assert cache.get([0.99, 0.05], "ctx") == {"final_document": "doc"}
+        assert cache.get([0.99, 0.05], "other-ctx") is None
+        assert cache.get([0.5, 0.5], "ctx") is None
+
+    @pytest.mark.asyncio
+    async def test_nodes_reuse_cached_responses(self, mock_external_deps, monkeypatch):
+        monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", True)
+        monkeypatch.setattr(llm_cache_module, "_llm_cache", LLMResponseCache(":memory:"))
+        state = {"query": "HMP155", "context": ["Source (a.pdf): 24 V"], "draft": None,
+                 "critique": None, "revision_count": 0, "final_doc": None}
+
+        first = await nodes.drafter_node(state)
+        second = await nodes.drafter_node(state)
+
+        assert first["draft"] == second["draft"] == "Mocked LLM Response"
+        assert mock_external_deps["llm"].ainvoke.call_count == 1
+        assert second["prompt_tokens"][0]["response_cache_hit"] is True
+
+    @pytest.mark.asyncio
+    async def test_semantic_cache_is_invalidated_by_ingestion(self, mock_external_deps, monkeypatch):
+        monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", True)
+        ingestion = IngestionService()
+        service = GenerationService(ingestion, agent_workflow)
+        llm = mock_external_deps["llm"]
+
+        first = await service.run("HMP155 power requirements")
+        calls = llm.ainvoke.call_count
+        second = await service.run("HMP155 power requirements")
+
+        assert second["cached"] is True and first["cached"] is False
+        assert second["final_document"] == first["final_document"]
+        assert llm.ainvoke.call_count == calls
+
+        await ingestion.process_document("New power spec.", "power.txt", {})
+        third = await service.run("HMP155 power requirements")
+        assert third["cached"] is False
+        assert llm.ainvoke.call_count > calls
+
+
+class TestMetrics:
+    @staticmethod
+    def stage_count(stage):
+        return REGISTRY.get_sample_value("docuforge_stage_seconds_count", {"stage": stage}) or 0
+
+    def test_timed_records_histogram_and_request_timings(self):
+        before = self.stage_count("unit_test")
+        timings = {}
+        token = metrics._request_timings.set(timings)
+        try:
+            with metrics.timed("unit_test"):
+                pass
+            with metrics.timed("unit_test"):
+                pass
+        finally:
+            metrics._request_timings.reset(token)
+
+        assert self.stage_count("unit_test") == before + 2
+        assert set(timings) == {"unit_test"}
+
+    def test_timed_records_when_block_raises(self):
+        with pytest.raises(ValueError):
+            with metrics.timed("unit_test_error"):
+                raise ValueError("boom")
+        assert self.stage_count("unit_test_error") == 1
+
+    def test_server_timing_header_format(self):
+        header = metrics.server_timing_header({"embed": 0.0125, "upsert": 0.002}, 0.05)
+        assert header == "embed;dur=12.5, upsert;dur=2.0, total;dur=50.0"
+
+
+class TestStartup:
+    def test_import_does_not_load_heavy_clients(self):
+        # The OpenAI SDK and langgraph load on first use, not at import
+        code = "import sys, main; print(sorted(m for m in ('openai', 'langchain_openai', 'langgraph') if m in sys.modules))"
+        backend = Path(__file__).resolve().parents[1]
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=backend, capture_output=True, text=True,
+            env={**os.environ, "OPENAI_API_KEY": "sk-test"}, check=True
+        ).stdout
+        assert output.strip().splitlines()[-1] == "[]"
+
+    @pytest.mark.asyncio
+    async def test_failed_check_is_retried_on_next_probe(self):
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise ConnectionError("not yet")
+
+        tracker = ReadinessTracker()
+        tracker.register("vector_store", flaky)
+        ready, components = await tracker.check()
+        assert not ready and components == {"vector_store": "failed: not yet"}
+
+        ready, components = await tracker.check()
+        assert ready and components == {"vector_store": "ready"}
+
+        # Ready components are not checked again
+        await tracker.check()
+        assert len(attempts) == 2
+
+
+class TestBatchGeneration:
+    """Targeting GenerationService.run_batch and the global LLM limit"""
+
+    @pytest.mark.asyncio
+    async def test_topics_share_retrieval_and_respect_llm_limit(self, mock_external_deps, monkeypatch):
+        monkeypatch.setattr(settings, "LLM_MAX_CONCURRENCY", 2)
+        # The chat limiter takes its concurrency ceiling from the settings
+        monkeypatch.setattr(rate_limit, "_limiters", {})
+        active, peak = 0, 0
+
+        async def slow_llm(messages):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return AIMessage(content="APPROVE")
+
+        mock_external_deps["llm"].ainvoke = AsyncMock(side_effect=slow_llm)
+        service = GenerationService(IngestionService(), agent_workflow)
+        topics = [f"Section {i} wiring" for i in range(6)]
+
+        finished = [index async for index, _ in service.run_batch(topics)]
+
+        assert sorted(finished) == list(range(6))
+        assert peak == 2
+        # One embedding call and one batched vector query for all topics
+        assert mock_external_deps["embed"].return_value.aembed_documents.call_count == 1
+        assert mock_external_deps["qdrant"].query_batch_points.call_count == 1
+        assert mock_external_deps["qdrant"].query_points.call_count == 0
+
+    @pytest.mark.asyncio
+    async def test_failed_topic_does_not_stop_the_batch(self, mock_external_deps):
+        async def flaky(messages):
+            if "Broken" in messages[0].content:
+                raise RuntimeError("provider error")
+            return AIMessage(content="APPROVE")
+
+        mock_external_deps["llm"].ainvoke = AsyncMock(side_effect=flaky)
+        service = GenerationService(IngestionService(), agent_workflow)
+
+        results = dict([item async for item in service.run_batch(["Wiring", "Broken topic"])])
+
+        assert results[0]["final_document"] == "APPROVE"
+        assert results[1] == {"topic": "Broken topic", "error": "provider error"}
+
+
+class TestRateLimiter:
+    """Targeting app/core/rate_limit.py (shared OpenAI limiter)"""
+
+    @staticmethod
+    def throttle_error(retry_after_ms=None):
+        headers = {"retry-after-ms": str(retry_after_ms)} if retry_after_ms is not None else {}
+        response = httpx.Response(429, headers=headers, request=httpx.Request("POST", "http://test/v1/embeddings"))
+        return httpx.HTTPStatusError("429 Too Many Requests", request=response.request, response=response)
+
+    def test_token_bucket_refills_per_minute(self):
+        now = [0.0]
+        bucket = TokenBucket(per_minute=60, clock=lambda: now[0])
+        bucket.adjust(-60)
+        assert bucket.wait_time(2) == pytest.approx(2.0)
+        now[0] = 2.0
+        assert bucket.wait_time(2) == 0
+        # Larger than the bucket: waits for a full bucket only
+        assert bucket.wait_time(500) == pytest.approx(58.0)
+
+    def test_error_classification(self):
+        error = self.throttle_error(retry_after_ms=1500)
+        assert classify_error(error) == rate_limit.THROTTLED
+        assert retry_after(error) == pytest.approx(1.5)
+        assert classify_error(httpx.ConnectError("refused")) == rate_limit.TRANSIENT
+        assert classify_error(ValueError("bad input")) is None
+
+        quota = self.throttle_error()
+        quota.code = "insufficient_quota"
+        assert classify_error(quota) is None
+
+    @pytest.mark.asyncio
+    async def test_waiting_callers_are_served_by_priority(self):
+        limiter = RateLimiter("test", requests_per_minute=1000, tokens_per_minute=100000, max_concurrency=1)
+        release = asyncio.Event()
+        order = []
+
+        async def call(name):
+            order.append(name)
+            if name == "first":
+                await release.wait()
+
+        first = asyncio.create_task(limiter.run(lambda: call("first")))
+        await asyncio.sleep(0)
+        waiting = [
+            asyncio.create_task(limiter.run(lambda: call("ingest"), priority=Priority.BULK)),
+            asyncio.create_task(limiter.run(lambda: call("generate"), priority=Priority.STANDARD)),
+        ]
+        with priority_scope(Priority.INTERACTIVE):
+            waiting.append(asyncio.create_task(limiter.run(lambda: call("search"))))
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(first, *waiting)
+
+        assert order == ["first", "search", "generate", "ingest"]
+
+    @pytest.mark.asyncio
+    async def test_throttling_halves_concurrency_and_successes_restore_it(self, monkeypatch):
+        monkeypatch.setattr(rate_limit, "DECREASE_COOLDOWN", 0.0)
+        limiter = RateLimiter(
+            "test", requests_per_minute=10000, tokens_per_minute=10**6,
+            max_concurrency=8, backoff_base=0.001, backoff_max=0.01
+        )
+        failures = [self.throttle_error(), self.throttle_error()]
+
+        async def call():
+            if failures:
+                raise failures.pop()
+            return "ok"
+
+        assert await limiter.run(call) == "ok"
+        assert 2 <= limiter.limit < 4
+        for _ in range(40):
+            await limiter.run(call)
+        assert limiter.limit == 8 and limiter.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_retries(self):
+        limiter = RateLimiter(
+            "test", requests_per_minute=10000, tokens_per_minute=10**6,
+            max_concurrency=4, max_retries=2, backoff_base=0.001
+        )
+        calls = 0
+
+        async def call():
+            nonlocal calls
+            calls += 1
+            raise self.throttle_error()
+
+        with pytest.raises(httpx.HTTPStatusError):
+            await limiter.run(call)
+        assert calls == 3 and limiter.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_embeddings_survive_429_storm_from_fake_api(self, fake_openai_server):
+        # Real OpenAI client against a local server that throttles above 2 concurrent requests
+        from langchain_openai.embeddings.base import OpenAIEmbeddings
+        from app.services.embeddings import LangChainEmbedder
+
+        fake_openai_server.max_active = 2
+        fake_openai_server.latency = 0.02
+        client = OpenAIEmbeddings(
+            api_key="sk-fake-key", base_url=fake_openai_server.base_url, max_retries=0,
+            check_embedding_ctx_length=False, http_async_client=httpx.AsyncClient(trust_env=False)
+        )
+        limiter = RateLimiter(
+            "embeddings-test", requests_per_minute=10000, tokens_per_minute=10**6,
+            max_concurrency=8, backoff_base=0.01, backoff_max=0.1, max_retries=20
+        )
+        pipeline = EmbeddingPipeline(
+            LangChainEmbedder(client, model_name="text-embedding-3-small"),
+            max_batch_size=1, max_concurrency=8, limiter=limiter
+        )
+
+        vectors = await pipeline.embed_documents([f"chunk {i}" for i in range(16)])
+
+        assert len(vectors) == 16 and all(vector == [0.1, 0.2, 0.3] for vector in vectors)
+        assert fake_openai_server.throttled > 0
+        assert limiter.limit < 8 and limiter.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_chat_calls_retry_through_shared_limiter(self, fake_openai_server, monkeypatch):
+        from langchain_openai.chat_models.base import ChatOpenAI
+        from langchain_core.messages import HumanMessage
+
+        fake_openai_server.throttle_first = 2
+        monkeypatch.setattr(settings, "OPENAI_BACKOFF_BASE", 0.01)
+        monkeypatch.setattr(rate_limit, "_limiters", {})
+        model = ChatOpenAI(
+            api_key="sk-fake-key", base_url=fake_openai_server.base_url, max_retries=0,
+            http_async_client=httpx.AsyncClient(trust_env=False)
+        )
+
+        response = await nodes.call_llm(model, [HumanMessage(content="Review this draft.")])
+
+        assert response.content == "APPROVE"
+        assert fake_openai_server.requests == 3
+        limiter = rate_limit.get_rate_limiter("chat")
+        assert limiter.in_flight == 0 and limiter.limit < settings.LLM_MAX_CONCURRENCY
+        assert REGISTRY.get_sample_value(
+            "docuforge_openai_retries_total", {"limiter": "chat", "reason": "throttled"}
+        ) >= 2
+
+
+SAFETY_NOTICE = (
+    "WARNING: Read these instructions before installing the HMP155 probe. Only qualified "
+    "personnel may install, connect or service the equipment, following local electrical "
+    "codes and the safety rules of the site. Disconnect all power sources before opening the "
+    "enclosure and make sure the supply cannot be switched on accidentally while you work. "
+    "Do not modify the device; unauthorized changes void the warranty and can create hazards "
+    "that the manufacturer is not liable for. Handle the sensor head with care, avoid touching "
+    "the filter with bare hands, and keep the cable away from sharp edges, heat sources and "
+    "moving machinery. Dispose of packaging and worn parts according to applicable regulations."
+)
+
+
+class TestNearDuplicates:
+    """Targeting app/services/dedup.py and near-duplicate skipping at ingest"""
+
+    def test_minhash_tracks_similarity_and_numbers(self):
+        hasher = MinHasher()
+        variant = SAFETY_NOTICE.replace("HMP155", "HMP110")
+        assert similarity(hasher.signature(SAFETY_NOTICE), hasher.signature(variant)) >= 0.9
+        assert similarity(hasher.signature(SAFETY_NOTICE), hasher.signature("Calibrate the dewpoint sensor yearly.")) < 0.2
+        # Model names are not values; changed specs are
+        assert number_key(SAFETY_NOTICE) == number_key(variant)
+        assert number_key("Supply 24 V, output 4-20 mA") != number_key("Supply 12 V, output 4-20 mA")
+
+    def test_index_matches_persisted_and_pending_chunks(self, tmp_path):
+        path = str(tmp_path / "dedup.sqlite3")
+        index = NearDuplicateIndex(path)
+        index.add(["a1"], [index.fingerprint(SAFETY_NOTICE)])
+        index.close()
+
+        index = NearDuplicateIndex(path)
+        texts = [
+            SAFETY_NOTICE.replace("HMP155", "PTU300"),
+            "Calibrate the dewpoint sensor yearly against a reference.",
+            "Calibrate the dewpoint sensor yearly against a reference!",
+            SAFETY_NOTICE + " Rated 24 V.",
+        ]
+        matches = index.match(["b1", "b2", "b3", "b4"], index.fingerprint_many(texts))
+        # Stored copy, unique, earlier chunk of the same call, different numbers
+        assert matches == ["a1", None, "b2", None]
+        # A chunk is never a duplicate of its own point
+        assert index.match(["a1"], [index.fingerprint(SAFETY_NOTICE)]) == [None]
+
+    def test_referenced_points_are_retained_until_the_last_reference(self, tmp_path):
+        index = NearDuplicateIndex(str(tmp_path / "dedup.sqlite3"))
+        index.add(["a1"], [index.fingerprint(SAFETY_NOTICE)])
+        index.add_references([("b1", "a1", {"source": "b.txt"})])
+        assert index.references(["a1"]) == {"a1": [{"source": "b.txt"}]}
+
+        # The owner drops it, but b.txt still needs it
+        assert index.release(["a1", "a2"]) == (["a2"], set())
+        assert index.stats()["retained_chunks"] == 1
+        # Last reference gone: the retained point goes too
+        assert index.release(["b1"]) == (["b1", "a1"], set())
+        assert index.stats() == {"indexed_chunks": 0, "duplicate_references": 0, "retained_chunks": 0}
+
+    @pytest.mark.asyncio
+    async def test_ingest_skips_near_duplicates_and_references_them(self, tmp_path, monkeypatch):
+        service = local_ingestion_service(tmp_path, monkeypatch)
+        store = service.vector_db
+        embedder = service.embedding_pipeline.embedder
+        wiring = "Connect the brown wire to terminal 1 and the white wire to terminal 2. " * 8
+
+        await service.process_document(SAFETY_NOTICE + "\n\n" + wiring, "hmp155.txt", {})
+        calls = embedder.calls
+        result = await service.process_document(
+            SAFETY_NOTICE.replace("HMP155", "HMP110") + "\n\n" + wiring.replace("brown", "green"),
+            "hmp110.txt", {"type": "text"}
+        )
+
+        assert result["added"] == 1 and result["duplicates"] == 1
+        assert embedder.calls == calls + 1 and len(store) == 3
+        matches = await service.search_knowledge_base(SAFETY_NOTICE, limit=1)
+        assert matches[0]["source"] == "hmp155.txt" and matches[0]["references"] == ["hmp110.txt"]
+
+        # Filtering on the duplicate's source finds the shared chunk on every path
+        only_hmp110 = {"source": "hmp110.txt"}
+        matches = await service.search_knowledge_base("qualified personnel safety rules", limit=5, filters=only_hmp110)
+        assert SAFETY_NOTICE in [m["content"] for m in matches]
+        [batched] = await service.search_many(["qualified personnel safety rules"], limit=5, filters=only_hmp110)
+        assert SAFETY_NOTICE in [m["content"] for m in batched]
+        hits = service.lexical_index.search("qualified personnel", limit=5, filters=only_hmp110)
+        assert [payload["content"] for _, _, payload in hits] == [SAFETY_NOTICE]
+
+        # The owner drops the notice: kept while hmp110.txt references it
+        result = await service.process_document(wiring, "hmp155.txt", {})
+        assert result["removed"] == 0 and len(store) == 3
+        assert service.lexical_index.search("qualified personnel", filters={"source": "hmp110.txt"})
+        await service.process_document(wiring.replace("brown", "green"), "hmp110.txt", {"type": "text"})
+        assert len(store) == 2
+        await service.close()
+
+    @pytest.mark.asyncio
+    async def test_edited_chunk_replaces_its_own_previous_version(self, tmp_path, monkeypatch):
+        service = local_ingestion_service(tmp_path, monkeypatch)
+        edited = SAFETY_NOTICE.replace("avoid touching", "try touching")
+
+        await service.process_document(SAFETY_NOTICE, "manual.txt", {})
+        result = await service.process_document(edited, "manual.txt", {})
+
+        # Near-identical to the old version, but that one is being replaced
+        assert result["added"] == 1 and result["duplicates"] == 0 and result["removed"] == 1
+        assert len(service.vector_db) == 1
+        matches = await service.search_knowledge_base("try touching the sensor head", limit=1)
+        assert matches[0]["content"] == edited
+        hits = service.lexical_index.search("sensor head", limit=5)
+        assert [payload["content"] for _, _, payload in hits] == [edited]
+
+        # Same through the batch path
+        edited_again = edited.replace("with care", "gently")
+        summary = await service.process_batch([(edited_again, "manual.txt", {})])
+        assert summary["totals"]["added"] == 1 and summary["totals"]["removed"] == 1
+        matches = await service.search_knowledge_base("try touching the sensor head", limit=5)
+        assert [m["content"] for m in matches] == [edited_again]
+        await service.close()